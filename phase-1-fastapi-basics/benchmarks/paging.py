@@ -0,0 +1,84 @@
+"""Latency and peak memory of listing students: everything at once, pages and the NDJSON stream.
+
+    python -m benchmarks.paging [--sizes 10000,100000,500000] [--limit 100]
+
+Measures the store and JSON encoding work behind /get-all-students, without HTTP. "all" is
+the unpaged response; "page" columns are one page at the start, at a deep offset, and via
+the `after` cursor near the end; "stream" is the time to the first NDJSON chunk and the
+peak memory while streaming everything. Peak memory comes from tracemalloc, so the timed
+runs are separate from the traced ones.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks.store import generate
+from store import StudentStore
+
+
+def legacy(store):
+    return json.dumps({"total": len(store), "students": store.all()})
+
+
+def page(store, **kwargs):
+    students, next_after = store.page(**kwargs)
+    return json.dumps({"total": len(store), "students": students, "next_after": next_after})
+
+
+def stream(store):
+    # The same batching as the ndjson branch of get_all_students
+    batch = []
+    for student in store.iter_all():
+        batch.append(json.dumps(student))
+        if len(batch) == 1000:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+
+def timed(operation):
+    started = time.perf_counter()
+    operation()
+    return (time.perf_counter() - started) * 1000
+
+
+def peak_mb(operation):
+    tracemalloc.start()
+    try:
+        operation()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.paging")
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    print(f"{'students':>9}{'all ms':>10}{'all MB':>9}{'page ms':>9}{'deep ms':>9}{'cursor ms':>11}"
+          f"{'1st chunk ms':>14}{'stream ms':>11}{'stream MB':>11}")
+    for size in [int(part) for part in args.sizes.split(",")]:
+        store = StudentStore()
+        for record in generate(size):
+            store.create(record["id"], record)
+        deep = size - args.limit * 2
+        all_ms = timed(lambda: legacy(store))
+        all_mb = peak_mb(lambda: legacy(store))
+        first = timed(lambda: page(store, limit=args.limit))
+        deep_ms = timed(lambda: page(store, offset=deep, limit=args.limit))
+        cursor = timed(lambda: page(store, after=deep, limit=args.limit))
+        first_chunk = timed(lambda: next(stream(store)))
+        stream_ms = timed(lambda: sum(len(chunk) for chunk in stream(store)))
+        stream_mb = peak_mb(lambda: sum(len(chunk) for chunk in stream(store)))
+        print(f"{size:>9,}{all_ms:>10.0f}{all_mb:>9.0f}{first:>9.2f}{deep_ms:>9.2f}{cursor:>11.2f}"
+              f"{first_chunk:>14.2f}{stream_ms:>11.0f}{stream_mb:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,102 @@
+"""Write overhead of each durability mode and restart time with a million students.
+
+    python -m benchmarks.persistence [--writes N] [--threads 1,8] [--students N] [--tail N] [--dir PATH]
+
+Writes: creates per second in a plain in-memory store and in journaled stores per
+durability mode, from 1 and several threads. "batch" gains the most from concurrency:
+writers that arrive during an fsync share the next one.
+
+Restart: writes a snapshot of `--students` students plus `--tail` logged writes after it,
+abandons the store without a final snapshot (like a crash), then times recovery: until reads
+by ID are served, and until the name and email indexes are built behind them. Use a
+directory on the disk the service would use; fsync cost depends entirely on it.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.store import generate
+from persistence import DURABILITY_MODES, PersistentStore, write_snapshot
+from store import StudentStore
+
+
+def abandon(persistent):
+    # Stop the background threads and release the files without the snapshot close() takes
+    persistent.stopping.set()
+    persistent.thread.join()
+    persistent.journal.close()
+    persistent.lock_file.close()
+
+
+def report(label, persistent):
+    persistent.indexer.join()
+    print(
+        f"{label}: serving reads by ID after {persistent.recovery_seconds:.2f}s, "
+        f"indexed after {persistent.indexed_seconds:.2f}s ({len(persistent.store):,} students)"
+    )
+
+
+def write_rate(store, writes, threads):
+    def worker(start):
+        for student_id in range(start, start + writes // threads):
+            store.create(student_id, {"name": f"Student {student_id}", "age": 20, "email": f"s{student_id}@example.com"})
+
+    pool = [threading.Thread(target=worker, args=(1 + index * writes,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return (writes // threads * threads) / (time.perf_counter() - started)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.persistence")
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--threads", default="1,8")
+    parser.add_argument("--students", type=int, default=1000000)
+    parser.add_argument("--tail", type=int, default=10000)
+    parser.add_argument("--dir", default=None)
+    args = parser.parse_args(argv)
+    base = args.dir or tempfile.mkdtemp(prefix="students-")
+    thread_counts = [int(part) for part in args.threads.split(",")]
+
+    print(f"{'writes/s':<12}" + "".join(f"{f'{count} thread(s)':>14}" for count in thread_counts))
+    rates = [write_rate(StudentStore(), args.writes, count) for count in thread_counts]
+    print(f"{'memory':<12}" + "".join(f"{rate:>14,.0f}" for rate in rates))
+    for mode in DURABILITY_MODES:
+        rates = []
+        for count in thread_counts:
+            directory = os.path.join(base, f"{mode}-{count}")
+            persistent = PersistentStore(directory, durability=mode, snapshot_every=10 ** 9)
+            rates.append(write_rate(persistent.store, args.writes, count))
+            abandon(persistent)
+            shutil.rmtree(directory)
+        print(f"{mode:<12}" + "".join(f"{rate:>14,.0f}" for rate in rates))
+
+    directory = os.path.join(base, "restart")
+    os.makedirs(directory, exist_ok=True)
+    rows = list(generate(args.students))
+    started = time.perf_counter()
+    path = write_snapshot(directory, 0, rows)
+    print(f"\nsnapshot of {args.students:,} students: {time.perf_counter() - started:.2f}s, {os.path.getsize(path) / 1e6:.0f} MB")
+    del rows
+    persistent = PersistentStore(directory, durability="none", snapshot_every=10 ** 9, freeze_gc=True)
+    report("recovery from the snapshot alone", persistent)
+    for student_id in range(args.students + 1, args.students + 1 + args.tail):
+        persistent.store.create(student_id, {"name": f"Student {student_id}", "age": 20, "email": f"s{student_id}@example.com"})
+    abandon(persistent)
+    persistent = PersistentStore(directory, durability="none", snapshot_every=10 ** 9, freeze_gc=True)
+    report(f"recovery with {args.tail:,} logged writes after it", persistent)
+    abandon(persistent)
+    if args.dir is None:
+        shutil.rmtree(base)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,81 @@
+"""Name lookups in the indexed StudentStore vs the linear scan it replaced.
+
+    python -m benchmarks.store [--sizes 1000,10000,100000,1000000] [--lookups N]
+
+For each size the store is filled with generated students (about one name in five is shared
+by several students) and the script reports insert, lookup, update and delete times. The
+"scan" column is what get_by_name used to do: lowercase every record on every call.
+"matches" is the average number of students a name lookup returns; with a fifth of the
+students on 90 shared names it grows with the store, and so does the cost of building the
+result, while finding the matches stays one dict access.
+"""
+import argparse
+import random
+import sys
+import time
+
+from store import StudentStore
+
+FIRST = ["John", "Jane", "Bob", "Alice", "Maria", "Wei", "Priya", "Omar", "Lena", "Kofi"]
+LAST = ["Doe", "Smith", "Johnson", "Garcia", "Chen", "Patel", "Haddad", "Berg", "Mensah"]
+
+
+def generate(count, seed=1):
+    rng = random.Random(seed)
+    for student_id in range(1, count + 1):
+        # A shared first/last pair for a fifth of the students, a unique name for the rest
+        name = f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+        if rng.random() > 0.2:
+            name = f"{name} {student_id}"
+        yield {"id": student_id, "name": name, "age": rng.randint(17, 70), "email": f"student{student_id}@example.com"}
+
+
+def scan_by_name(records, name):
+    # The pre-index get_by_name, extended to collect every match
+    return [student for student in records.values() if student["name"].lower() == name.lower()]
+
+
+def timed(operation, arguments):
+    started = time.perf_counter()
+    for argument in arguments:
+        operation(argument)
+    return (time.perf_counter() - started) / len(arguments)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.store")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    print(f"{'students':>9}{'insert us':>11}{'matches':>9}{'name us':>10}{'scan us':>12}{'email us':>10}{'update us':>11}{'delete us':>11}")
+    for size in [int(part) for part in args.sizes.split(",")]:
+        records = list(generate(size))
+        store = StudentStore()
+        started = time.perf_counter()
+        for record in records:
+            store.create(record["id"], record)
+        insert = (time.perf_counter() - started) / size
+
+        rng = random.Random(2)
+        sample = [rng.choice(records) for _ in range(args.lookups)]
+        names = [record["name"].upper() for record in sample]
+        for name in names[:100]:
+            if store.find_by_name(name) != scan_by_name(store.records, name):
+                raise SystemExit(f"Index and scan disagree for {name!r}")
+        matches = sum(len(store.find_by_name(name)) for name in names) / len(names)
+        name_lookup = timed(store.find_by_name, names)
+        # The scan is O(n); a handful of calls is enough to time it
+        scan = timed(lambda name: scan_by_name(store.records, name), names[:max(1, 1000000 // size)][:100])
+        email = timed(store.find_by_email, [record["email"].upper() for record in sample])
+        update = timed(lambda record: store.update(record["id"], {"name": record["name"] + " Jr"}), sample[:1000])
+        delete = timed(lambda record: store.delete(record["id"]), list({r["id"]: r for r in sample[:1000]}.values()))
+        print(
+            f"{size:>9,}{insert * 1e6:>11.2f}{matches:>9.1f}{name_lookup * 1e6:>10.2f}{scan * 1e6:>12,.0f}"
+            f"{email * 1e6:>10.2f}{update * 1e6:>11.2f}{delete * 1e6:>11.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,9 +1,14 @@
 # FastAPI Student Management API
-from fastapi import FastAPI, Path, HTTPException
+import os
+from contextlib import asynccontextmanager
+import json
+from fastapi import FastAPI, Path, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from pydantic import BaseModel
 
-app = FastAPI()
+from persistence import PersistentStore
+from store import EmailTaken, StudentExists, StudentStore
 
 # ==================== DATA MODELS ====================
 
@@ -21,12 +26,39 @@ class UpdateStudent(BaseModel):
 
 # ==================== DATABASE ====================
 
-# In-memory student storage (simulates a database)
-students = {
-    1: {"id": 1, "name": "John Doe", "age": 20, "email": "john@example.com"},
-    2: {"id": 2, "name": "Jane Smith", "age": 21, "email": "jane@example.com"},
-    3: {"id": 3, "name": "Bob Johnson", "age": 19, "email": "bob@example.com"}
-}
+# Sample students, loaded into a new store
+SAMPLE_STUDENTS = [
+    {"id": 1, "name": "John Doe", "age": 20, "email": "john@example.com"},
+    {"id": 2, "name": "Jane Smith", "age": 21, "email": "jane@example.com"},
+    {"id": 3, "name": "Bob Johnson", "age": 19, "email": "bob@example.com"}
+]
+
+# Set STUDENT_DATA_DIR to keep students across restarts (see "Persistence" in the README)
+DATA_DIR = os.getenv("STUDENT_DATA_DIR")
+
+if DATA_DIR:
+    persistent = PersistentStore(
+        DATA_DIR,
+        durability=os.getenv("STUDENT_DURABILITY", "batch"),
+        fsync_interval=float(os.getenv("STUDENT_FSYNC_INTERVAL_MS", "100")) / 1000,
+        snapshot_every=int(os.getenv("STUDENT_SNAPSHOT_EVERY", "100000")),
+        seed=SAMPLE_STUDENTS,
+        # The service owns the process, and the recovered students live as long as it does
+        freeze_gc=True,
+    )
+    students = persistent.store
+else:
+    # In-memory student storage (simulates a database), indexed by name and email
+    persistent = None
+    students = StudentStore(SAMPLE_STUDENTS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if persistent is not None:
+        persistent.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # ==================== ENDPOINTS ====================
 
@@ -36,36 +68,64 @@ def index():
     return {"message": "Student Management API"}
 
 @app.get("/get-all-students")
-def get_all_students():
-    """Retrieve all students with total count"""
-    return {"total": len(students), "students": students}
+def get_all_students(
+    offset: Optional[int] = Query(None, ge=0, description="Students to skip (after the cursor, if given)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size, 100 by default"),
+    after: Optional[int] = Query(None, description="Cursor: return students with a higher ID than this"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams every student, one per line"),
+):
+    """
+    Retrieve students in ID order, a page at a time.
+    Without paging parameters, returns every student keyed by ID (slow for large stores).
+    """
+    if format == "ndjson":
+        # Students are read a batch at a time while the response is sent, so memory stays flat
+        def lines():
+            batch = []
+            for student in students.iter_all():
+                batch.append(json.dumps(student))
+                if len(batch) == 1000:
+                    yield "\n".join(batch) + "\n"
+                    batch = []
+            if batch:
+                yield "\n".join(batch) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    if offset is None and limit is None and after is None:
+        return {"total": len(students), "students": students.all()}
+    
+    page, next_after = students.page(offset=offset or 0, limit=limit or 100, after=after)
+    return {"total": len(students), "students": page, "next_after": next_after}
 
 @app.get("/get-student/{student_id}")
 def get_student(student_id: int = Path(..., description="Student ID")):
     """Get a specific student by ID"""
-    if student_id in students:
-        return students[student_id]
+    student = students.get(student_id)
+    if student is not None:
+        return student
     raise HTTPException(status_code=404, detail="Student not found")
 
 @app.get("/get-by-name/")
 def get_by_name(name: Optional[str] = None):
-    """Search student by name (case-insensitive)"""
+    """Search students by name (case-insensitive), returns every student with that name"""
     if not name:
         raise HTTPException(status_code=400, detail="Name parameter is required")
     
-    for student in students.values():
-        if student["name"].lower() == name.lower():
-            return student
-    raise HTTPException(status_code=404, detail="Student not found")
+    matches = students.find_by_name(name)
+    if not matches:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return matches
 
 @app.post("/create-student/{student_id}")
 def create_student(student: Student, student_id: int = Path(..., description="Student ID")):
     """Create a new student"""
-    if student_id in students:
+    try:
+        created = students.create(student_id, student.model_dump())
+    except StudentExists:
         raise HTTPException(status_code=409, detail="Student with this ID already exists")
-    
-    students[student_id] = student
-    return {"message": "Student created successfully", "student": students[student_id]}
+    except EmailTaken:
+        raise HTTPException(status_code=409, detail="Student with this email already exists")
+    return {"message": "Student created successfully", "student": created}
 
 @app.put("/update-student/{student_id}")
 def update_student(student: UpdateStudent, student_id: int = Path(..., description="Student ID")):
@@ -73,24 +133,23 @@ def update_student(student: UpdateStudent, student_id: int = Path(..., descripti
     Update student with partial fields (only provided fields are updated).
     Example: {"name": "Alice"} updates only the name field.
     """
-    if student_id not in students:
-        raise HTTPException(status_code=404, detail="Student not found")
-    
     # Using model_dump(exclude_none=True) - recommended method in Pydantic v2
     # (replaces deprecated .dict() method for better compatibility)
-    existing = students[student_id]
     update_data = student.model_dump(exclude_none=True)
-    existing.update(update_data)
-    students[student_id] = existing
+    try:
+        updated = students.update(student_id, update_data)
+    except EmailTaken:
+        raise HTTPException(status_code=409, detail="Student with this email already exists")
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Student not found")
     
-    return {"message": "Student updated successfully", "student": students[student_id]}
+    return {"message": "Student updated successfully", "student": updated}
 
 @app.delete("/delete-student/{student_id}")
 def delete_student(student_id: int = Path(..., description="Student ID")):
     """Delete a student by ID"""
-    if student_id not in students:
+    deleted_student = students.delete(student_id)
+    if deleted_student is None:
         raise HTTPException(status_code=404, detail="Student not found")
-    
-    deleted_student = students.pop(student_id)
     return {"message": "Student deleted successfully", "student": deleted_student}
 
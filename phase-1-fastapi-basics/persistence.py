@@ -0,0 +1,329 @@
+# Optional persistence for StudentStore: an append-only operation log plus periodic snapshots
+#
+# Files in the data directory:
+#   log-<first seq>.jsonl       one line per write: "<crc32> [seq, op, id, record]"
+#   snapshot-<last seq>.pickle  every student as of that log position
+# Recovery loads the newest snapshot and replays the log entries after it. A snapshot rotates
+# the log to a new file first, so older log files can be deleted once the snapshot is on disk.
+import gc
+import json
+import os
+import pickle
+import threading
+import time
+import zlib
+
+from store import StudentStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, so run a single process per directory
+    fcntl = None
+
+# always:   fsync before every write returns (safest, slowest)
+# batch:    writes wait for a shared fsync, one per batch of concurrent writes (safe, fast)
+# interval: fsync every fsync_interval seconds; a power loss can lose that much
+# none:     never fsync; survives a process crash, not a power loss
+DURABILITY_MODES = ("always", "batch", "interval", "none")
+SNAPSHOT_FORMAT = 1
+
+
+class CorruptLog(Exception):
+    """The log or snapshot cannot be replayed without losing acknowledged writes"""
+
+
+def _path(directory, prefix, seq, suffix):
+    return os.path.join(directory, f"{prefix}-{seq:020d}{suffix}")
+
+
+def _files(directory, prefix, suffix):
+    """(seq, path) of the matching files, oldest first"""
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix + "-") and name.endswith(suffix):
+            found.append((int(name[len(prefix) + 1:-len(suffix)]), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def _fsync_directory(directory):
+    # Makes a rename or a new file itself durable, not only its contents
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class Journal:
+    """Append-only log of store writes with configurable fsync behaviour"""
+
+    def __init__(self, directory, durability="batch", fsync_interval=0.1, next_seq=1):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_MODES)}")
+        self.directory = directory
+        self.durability = durability
+        self.fsync_interval = fsync_interval
+        self.seq = next_seq - 1
+        self.synced = self.seq
+        self.since_rotate = 0
+        self.fd = None
+        # Log files replaced by rotate() that still need an fsync before they are closed
+        self.retired = []
+        self.lock = threading.Lock()
+        self.synced_cond = threading.Condition(threading.Lock())
+        self.stopping = threading.Event()
+        self.flusher = None
+
+    def open(self, path):
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        _fsync_directory(self.directory)
+        if self.durability in ("batch", "interval"):
+            self.flusher = threading.Thread(target=self._flush_loop, name="journal-fsync", daemon=True)
+            self.flusher.start()
+
+    def append(self, op, student_id, record):
+        """Write one entry and return its sequence number; the caller holds the store lock"""
+        seq = self.seq + 1
+        payload = json.dumps([seq, op, student_id, record], separators=(",", ":")).encode()
+        line = b"%08x %s\n" % (zlib.crc32(payload), payload)
+        with self.lock:
+            # One write() per entry, so a process crash never loses an acknowledged write
+            os.write(self.fd, line)
+            if self.durability == "always":
+                os.fsync(self.fd)
+            self.seq = seq
+            self.since_rotate += 1
+        if self.durability == "batch":
+            with self.synced_cond:
+                self.synced_cond.notify_all()
+        return seq
+
+    def wait(self, seq):
+        """Block until entry `seq` is as durable as the mode promises"""
+        if self.durability != "batch":
+            return
+        with self.synced_cond:
+            while self.synced < seq and self.flusher is not None:
+                self.synced_cond.wait()
+
+    def _flush_loop(self):
+        while True:
+            if self.durability == "interval":
+                stopping = self.stopping.wait(self.fsync_interval)
+            else:
+                with self.synced_cond:
+                    while self.synced >= self.seq and not self.stopping.is_set():
+                        self.synced_cond.wait()
+                stopping = self.stopping.is_set()
+            self.sync()
+            if stopping:
+                return
+
+    def sync(self):
+        """fsync everything appended so far; concurrent writers share the one fsync (group commit)"""
+        with self.lock:
+            target, fd, retired, self.retired = self.seq, self.fd, self.retired, []
+        for old in retired:
+            os.fsync(old)
+            os.close(old)
+        if target > self.synced:
+            os.fsync(fd)
+        with self.synced_cond:
+            self.synced = max(self.synced, target)
+            self.synced_cond.notify_all()
+
+    def rotate(self):
+        """Continue in a new log file; returns the last sequence number in the old ones"""
+        with self.lock:
+            last = self.seq
+            old, self.fd = self.fd, os.open(
+                _path(self.directory, "log", last + 1, ".jsonl"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644,
+            )
+            self.since_rotate = 0
+            if self.flusher is None:
+                if self.durability != "none":
+                    os.fsync(old)
+                os.close(old)
+            else:
+                self.retired.append(old)
+        _fsync_directory(self.directory)
+        return last
+
+    def close(self):
+        self.stopping.set()
+        if self.flusher is not None:
+            with self.synced_cond:
+                self.synced_cond.notify_all()
+            self.flusher.join()
+            self.flusher = None
+        elif self.durability != "none":
+            self.sync()
+        os.close(self.fd)
+
+
+def read_log(path, after_seq, is_last):
+    """Entries after `after_seq`; a torn last entry of the newest file (a crash mid-write) is cut off"""
+    entries = []
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        end = data.find(b"\n", offset)
+        line = data[offset:end] if end != -1 else data[offset:]
+        try:
+            if end == -1:
+                raise ValueError("unterminated entry")
+            crc, payload = line.split(b" ", 1)
+            if int(crc, 16) != zlib.crc32(payload):
+                raise ValueError("checksum mismatch")
+            entry = json.loads(payload)
+        except ValueError as exc:
+            if not is_last or end not in (-1, len(data) - 1):
+                raise CorruptLog(f"{path} at byte {offset}: {exc}")
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+                os.fsync(f.fileno())
+            break
+        if entry[0] > after_seq:
+            entries.append(entry)
+        offset = end + 1
+    return entries
+
+
+def write_snapshot(directory, seq, rows):
+    """Write the records in `rows` as the snapshot at log position `seq`, atomically"""
+    columns = (
+        [row["id"] for row in rows], [row["name"] for row in rows],
+        [row["age"] for row in rows], [row["email"] for row in rows],
+    )
+    path = _path(directory, "snapshot", seq, ".pickle")
+    partial = path + ".tmp"
+    with open(partial, "wb") as f:
+        pickle.dump((SNAPSHOT_FORMAT, seq, columns), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+    _fsync_directory(directory)
+    return path
+
+
+def recover(directory):
+    """
+    Build a store from the newest snapshot and the log after it; returns (store, last seq, log files).
+    The store's name and email indexes are still pending (see StudentStore.build_indexes).
+    """
+    store = StudentStore()
+    snapshot_seq = 0
+    snapshots = _files(directory, "snapshot", ".pickle")
+    # Millions of new dicts would otherwise trigger many pointless full collections
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        columns = ([], [], [], [])
+        if snapshots:
+            with open(snapshots[-1][1], "rb") as f:
+                version, snapshot_seq, columns = pickle.load(f)
+            if version != SNAPSHOT_FORMAT:
+                raise CorruptLog(f"{snapshots[-1][1]} has unknown format {version}")
+        store.restore(*columns)
+        logs = _files(directory, "log", ".jsonl")
+        seq = snapshot_seq
+        for index, (_, path) in enumerate(logs):
+            for entry_seq, op, student_id, record in read_log(path, snapshot_seq, index == len(logs) - 1):
+                if entry_seq != seq + 1:
+                    raise CorruptLog(f"{path}: expected entry {seq + 1}, found {entry_seq}")
+                store.replay(op, student_id, record)
+                seq = entry_seq
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return store, seq, logs
+
+
+class PersistentStore:
+    """
+    Opens (or creates) a data directory and returns a recovered StudentStore whose writes are
+    journaled; a background thread snapshots it every `snapshot_every` writes.
+    The store serves reads by ID as soon as the records are loaded (`recovery_seconds`); its
+    name and email indexes are built in another thread (`indexed_seconds`, once `store.indexed` is set).
+    With `freeze_gc`, gc.freeze() runs after each step, so collections skip the recovered objects
+    (it affects the whole process, so the application opts in).
+    """
+
+    def __init__(self, directory, durability="batch", fsync_interval=0.1, snapshot_every=100000, seed=(), freeze_gc=False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.lock_file = open(os.path.join(directory, "LOCK"), "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.lock_file.close()
+                raise RuntimeError(f"{directory} is in use by another process")
+
+        started = time.perf_counter()
+        self.store, last_seq, logs = recover(directory)
+        self.recovery_seconds = time.perf_counter() - started
+        self.indexed_seconds = None
+        self.freeze_gc = freeze_gc
+        if freeze_gc:
+            gc.freeze()
+        self.indexer = threading.Thread(target=self._build_indexes, args=(started,), name="indexer", daemon=True)
+        self.indexer.start()
+
+        self.journal = Journal(directory, durability, fsync_interval, next_seq=last_seq + 1)
+        # Keep appending to the newest log file; its torn tail, if any, was cut off during recovery
+        self.journal.open(logs[-1][1] if logs else _path(directory, "log", last_seq + 1, ".jsonl"))
+        self.journal.since_rotate = last_seq - (logs[-1][0] - 1 if logs else last_seq)
+        self.store.journal = self.journal
+        if not logs and not _files(directory, "snapshot", ".pickle"):
+            for record in seed:
+                self.store.create(record["id"], record)
+
+        self.snapshot_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="snapshotter", daemon=True)
+        self.thread.start()
+
+    def snapshot(self):
+        """Write a snapshot of the current state and delete the files it makes redundant"""
+        with self.snapshot_lock:
+            with self.store.lock:
+                seq = self.journal.rotate()
+                # Records are never changed in place, so this shallow copy is a consistent view
+                rows = list(self.store.records.values())
+            path = write_snapshot(self.directory, seq, rows)
+            for old_seq, old_path in _files(self.directory, "snapshot", ".pickle"):
+                if old_seq < seq:
+                    os.remove(old_path)
+            for first_seq, old_path in _files(self.directory, "log", ".jsonl"):
+                if first_seq <= seq:
+                    os.remove(old_path)
+            return path
+
+    def _build_indexes(self, started):
+        self.store.build_indexes()
+        self.indexed_seconds = time.perf_counter() - started
+        if self.freeze_gc:
+            gc.freeze()
+
+    def _run(self):
+        while not self.stopping.wait(1.0):
+            if self.journal.since_rotate >= self.snapshot_every:
+                try:
+                    self.snapshot()
+                except OSError:
+                    # The log still has everything; try again after the next interval
+                    pass
+
+    def close(self):
+        self.stopping.set()
+        self.thread.join()
+        # A final snapshot leaves no log to replay, so the next start only loads it
+        if self.journal.since_rotate:
+            self.snapshot()
+        self.store.journal = None
+        self.journal.close()
+        self.lock_file.close()
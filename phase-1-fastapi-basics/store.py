@@ -0,0 +1,257 @@
+# In-memory student store with case-insensitive name and email indexes
+import bisect
+import threading
+
+
+class StudentExists(Exception):
+    """A student with this ID is already stored"""
+
+
+class EmailTaken(Exception):
+    """Another student already uses this email"""
+
+
+def fold(value):
+    """Index key for case-insensitive matching ("John", "JOHN" and "john" share one key)"""
+    return value.casefold()
+
+
+class StudentStore:
+    """
+    Students by ID, plus two secondary indexes kept in step on every write:
+    - by_name:  folded name  -> ID, or a set of IDs once several students share the name
+    - by_email: folded email -> ID (emails are unique)
+    - ids:      every ID in ascending order, the stable order pages and streams walk in
+    Every lookup is a dict access, so it costs the same with 3 or 1,000,000 students.
+    Most names are unique, and a bare ID takes a fraction of the memory and build time of a set.
+
+    Records are never modified in place (updates store a new dict), so a copy of `records`
+    taken under the lock stays consistent after the lock is released.
+    With a `journal` set, every write is logged before it is applied (see persistence.py).
+    After restore() the indexes are built separately, so a large snapshot serves reads by ID sooner.
+    """
+
+    def __init__(self, records=()):
+        self.records = {}
+        self.by_name = {}
+        self.by_email = {}
+        self.ids = []
+        self.journal = None
+        # FastAPI runs sync endpoints in a thread pool; the lock keeps records and indexes in step
+        self.lock = threading.RLock()
+        # Cleared while the indexes of restore() are pending; lookups and writes wait for it
+        self.indexed = threading.Event()
+        self.indexed.set()
+        self.pending = None
+        for record in records:
+            self.create(record["id"], record)
+
+    def restore(self, ids, names, ages, emails):
+        """
+        Replace the contents with the given columns, skipping per-record checks (used for snapshots).
+        Reads by ID and pages work on return. The name and email indexes are left to
+        build_indexes(), which may run in another thread; until it is done, calls that need
+        them wait. replay() applies logged writes in the meantime.
+        """
+        records = {
+            student_id: {"id": student_id, "name": name, "age": age, "email": email}
+            for student_id, name, age, email in zip(ids, names, ages, emails)
+        }
+        # Snapshots are mostly in ID order already, which sorted() handles in linear time
+        ordered = sorted(ids)
+        with self.lock:
+            self.indexed.clear()
+            self.records, self.ids, self.by_name, self.by_email = records, ordered, {}, {}
+            # The columns to index, and the snapshot record of each ID replay() changed (None if new)
+            self.pending = (ids, names, emails, {})
+
+    def replay(self, op, student_id, record=None):
+        """Apply a write from the log without checks or indexing, before build_indexes() runs"""
+        with self.lock:
+            changed = self.pending[3]
+            existing = self.records.get(student_id)
+            if op == "create" and existing is not None:
+                raise StudentExists(student_id)
+            if student_id not in changed:
+                changed[student_id] = existing
+            if op == "create":
+                self.records[student_id] = record
+                self._insert_id(student_id)
+            elif existing is None:
+                return
+            elif op == "update":
+                self.records[student_id] = {**existing, **record, "id": student_id}
+            else:
+                del self.records[student_id]
+                del self.ids[bisect.bisect_left(self.ids, student_id)]
+
+    def build_indexes(self):
+        """Build the indexes restore() left pending, then let the calls waiting for them through"""
+        with self.lock:
+            if self.pending is None:
+                return
+            ids, names, emails, changed = self.pending
+        # Outside the lock: readers by ID and pages carry on meanwhile, nothing else can write
+        by_email = dict(zip([fold(email) for email in emails], ids))
+        by_name = {}
+        for key, student_id in zip([fold(name) for name in names], ids):
+            current = by_name.get(key)
+            if current is None:
+                by_name[key] = student_id
+            elif isinstance(current, set):
+                current.add(student_id)
+            else:
+                by_name[key] = {current, student_id}
+        with self.lock:
+            self.by_name, self.by_email = by_name, by_email
+            for student_id, original in changed.items():
+                if original is not None:
+                    self._unindex(original)
+                current = self.records.get(student_id)
+                if current is not None:
+                    self._index(current)
+            self.pending = None
+            self.indexed.set()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, student_id):
+        return student_id in self.records
+
+    def get(self, student_id):
+        return self.records.get(student_id)
+
+    def all(self):
+        with self.lock:
+            return dict(self.records)
+
+    def page(self, offset=0, limit=100, after=None):
+        """
+        Up to `limit` students in ID order, starting `offset` places after the ID `after`
+        (or after the start). Returns the students and the cursor for the next page, or None
+        on the last page. The cost depends on `limit`, not on the offset or the store size.
+        """
+        with self.lock:
+            start = offset if after is None else bisect.bisect_right(self.ids, after) + offset
+            ids = self.ids[start:start + limit]
+            more = start + limit < len(self.ids)
+            return [self.records[student_id] for student_id in ids], (ids[-1] if more and ids else None)
+
+    def iter_all(self, batch_size=1000):
+        """Every student in ID order, fetched a batch at a time so writers are never blocked for long"""
+        after = None
+        while True:
+            batch, after = self.page(limit=batch_size, after=after)
+            yield from batch
+            if after is None:
+                return
+
+    def find_by_name(self, name):
+        """All students with this name, in ID order"""
+        self._wait_indexed()
+        with self.lock:
+            ids = self.by_name.get(fold(name))
+            if ids is None:
+                return []
+            ids = sorted(ids) if isinstance(ids, set) else [ids]
+            return [self.records[student_id] for student_id in ids]
+
+    def find_by_email(self, email):
+        self._wait_indexed()
+        with self.lock:
+            student_id = self.by_email.get(fold(email))
+            return None if student_id is None else self.records[student_id]
+
+    def create(self, student_id, data):
+        """Store a new student and return its record"""
+        record = {"id": student_id, "name": data["name"], "age": data["age"], "email": data["email"]}
+        self._wait_indexed()
+        with self.lock:
+            if student_id in self.records:
+                raise StudentExists(student_id)
+            self._check_email(record["email"], student_id)
+            seq = self._log("create", student_id, record)
+            self.records[student_id] = record
+            self._index(record)
+            self._insert_id(student_id)
+        self._wait(seq)
+        return record
+
+    def update(self, student_id, changes):
+        """Apply a partial update; returns the updated record, or None if there is no such student"""
+        self._wait_indexed()
+        with self.lock:
+            existing = self.records.get(student_id)
+            if existing is None:
+                return None
+            if "email" in changes:
+                self._check_email(changes["email"], student_id)
+            updated = {**existing, **changes, "id": student_id}
+            seq = self._log("update", student_id, updated)
+            self._unindex(existing)
+            self.records[student_id] = updated
+            self._index(updated)
+        self._wait(seq)
+        return updated
+
+    def delete(self, student_id):
+        """Remove a student; returns the removed record, or None if there is no such student"""
+        self._wait_indexed()
+        with self.lock:
+            if student_id not in self.records:
+                return None
+            seq = self._log("delete", student_id)
+            record = self.records.pop(student_id)
+            self._unindex(record)
+            del self.ids[bisect.bisect_left(self.ids, student_id)]
+        self._wait(seq)
+        return record
+
+    def _insert_id(self, student_id):
+        # IDs usually grow, so this is normally an append
+        if not self.ids or student_id > self.ids[-1]:
+            self.ids.append(student_id)
+        else:
+            bisect.insort(self.ids, student_id)
+
+    def _wait_indexed(self):
+        # Before taking the lock, which build_indexes() needs to finish
+        if not self.indexed.is_set():
+            self.indexed.wait()
+
+    def _log(self, op, student_id, record=None):
+        # Called under the lock, so the log order is the order writes are applied in
+        return None if self.journal is None else self.journal.append(op, student_id, record)
+
+    def _wait(self, seq):
+        # Outside the lock: waiting for the disk must not block other readers and writers
+        if seq is not None:
+            self.journal.wait(seq)
+
+    def _check_email(self, email, student_id):
+        owner = self.by_email.get(fold(email))
+        if owner is not None and owner != student_id:
+            raise EmailTaken(email)
+
+    def _index(self, record):
+        key = fold(record["name"])
+        current = self.by_name.get(key)
+        if current is None:
+            self.by_name[key] = record["id"]
+        elif isinstance(current, set):
+            current.add(record["id"])
+        else:
+            self.by_name[key] = {current, record["id"]}
+        self.by_email[fold(record["email"])] = record["id"]
+
+    def _unindex(self, record):
+        key = fold(record["name"])
+        current = self.by_name[key]
+        if isinstance(current, set):
+            current.discard(record["id"])
+            if len(current) == 1:
+                self.by_name[key] = current.pop()
+        else:
+            del self.by_name[key]
+        del self.by_email[fold(record["email"])]
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import myapi
+from store import StudentStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    records = [
+        {"id": student_id, "name": f"Student {student_id}", "age": 20, "email": f"s{student_id}@example.com"}
+        for student_id in range(2, 52, 2)
+    ]
+    monkeypatch.setattr(myapi, "students", StudentStore(records))
+    return TestClient(myapi.app)
+
+
+def listing(client, **params):
+    response = client.get("/get-all-students", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def ids(page):
+    return [student["id"] for student in page["students"]]
+
+
+def test_offset_and_limit(client):
+    page = listing(client, offset=3, limit=4)
+    assert ids(page) == [8, 10, 12, 14]
+    assert page["total"] == 25 and page["next_after"] == 14
+    assert ids(listing(client, limit=5)) == [2, 4, 6, 8, 10]
+    assert ids(listing(client, offset=24)) == [50]
+    assert listing(client, offset=24)["next_after"] is None
+    assert listing(client, offset=25)["students"] == []
+
+
+def test_cursor_walks_every_student_once(client):
+    seen, after = [], None
+    while True:
+        page = listing(client, limit=7, **({} if after is None else {"after": after}))
+        seen += ids(page)
+        after = page["next_after"]
+        if after is None:
+            break
+    assert seen == list(range(2, 52, 2))
+
+
+def test_cursor_and_offset_combine(client):
+    assert ids(listing(client, after=10, offset=2, limit=3)) == [16, 18, 20]
+    # A cursor between IDs starts at the next one
+    assert ids(listing(client, after=11, limit=2)) == [12, 14]
+
+
+def test_deletes_between_pages_skip_nothing(client):
+    first = listing(client, limit=5)
+    # The cursor itself and a student on the next page go away
+    client.delete("/delete-student/10")
+    client.delete("/delete-student/14")
+    second = listing(client, limit=5, after=first["next_after"])
+    assert ids(second) == [12, 16, 18, 20, 22]
+    assert second["total"] == 23
+
+
+def test_after_past_the_end(client):
+    page = listing(client, after=1000)
+    assert page["students"] == [] and page["next_after"] is None
+    assert ids(listing(client, after=-5, limit=1)) == [2]
+
+
+def test_ndjson_stream_matches_the_paged_listing(client, monkeypatch):
+    # Batches smaller than the store, so the stream crosses several page boundaries
+    iter_all = myapi.students.iter_all
+    monkeypatch.setattr(myapi.students, "iter_all", lambda: iter_all(batch_size=4))
+    response = client.get("/get-all-students", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    streamed = [json.loads(line) for line in response.text.splitlines()]
+    assert streamed == listing(client, limit=1000)["students"]
+    assert list(listing(client)["students"].values()) == streamed
@@ -0,0 +1,141 @@
+import os
+import threading
+
+import pytest
+
+import persistence
+from persistence import CorruptLog, Journal, PersistentStore, recover, write_snapshot
+
+
+def student(student_id, name="Student", email=None):
+    return {"id": student_id, "name": name, "age": 20, "email": email or f"s{student_id}@example.com"}
+
+
+def write_log(directory, count):
+    journal = Journal(str(directory), durability="none")
+    journal.open(os.path.join(directory, "log-00000000000000000001.jsonl"))
+    for student_id in range(1, count + 1):
+        journal.append("create", student_id, student(student_id))
+    journal.close()
+    return os.path.join(directory, "log-00000000000000000001.jsonl")
+
+
+def abandon(persistent):
+    # Like a crash: no final snapshot
+    persistent.stopping.set()
+    persistent.thread.join()
+    persistent.journal.close()
+    persistent.lock_file.close()
+
+
+def state(store):
+    store.indexed.wait()
+    return store.records, store.by_name, store.by_email, store.ids
+
+
+def test_torn_last_entry_is_cut_off(tmp_path):
+    path = write_log(tmp_path, 3)
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size - 5)
+
+    store, seq, _ = recover(str(tmp_path))
+    assert seq == 2
+    assert sorted(store.records) == [1, 2]
+    with open(path, "rb") as f:
+        assert f.read().endswith(b"\n")
+
+
+def test_last_entry_with_a_bad_checksum_is_cut_off(tmp_path):
+    path = write_log(tmp_path, 3)
+    with open(path, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    lines[-1] = lines[-1].replace(b"s3@", b"s9@")
+    with open(path, "wb") as f:
+        f.writelines(lines)
+
+    store, seq, _ = recover(str(tmp_path))
+    assert seq == 2
+    assert 3 not in store
+
+
+def test_damage_before_the_last_entry_stops_recovery(tmp_path):
+    path = write_log(tmp_path, 3)
+    with open(path, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    lines[1] = lines[1].replace(b"s2@", b"s9@")
+    with open(path, "wb") as f:
+        f.writelines(lines)
+
+    with pytest.raises(CorruptLog):
+        recover(str(tmp_path))
+
+
+def test_snapshot_plus_log_replay_restores_the_store(tmp_path):
+    persistent = PersistentStore(str(tmp_path), durability="none", snapshot_every=10 ** 9)
+    for student_id in range(1, 6):
+        persistent.store.create(student_id, student(student_id, name="Shared" if student_id % 2 else f"Own {student_id}"))
+    persistent.snapshot()
+    persistent.store.update(1, {"name": "Renamed", "email": "NEW@example.com"})
+    persistent.store.delete(3)
+    persistent.store.create(6, student(6, name="shared"))
+    expected = state(persistent.store)
+    abandon(persistent)
+
+    reopened = PersistentStore(str(tmp_path), durability="none", snapshot_every=10 ** 9)
+    assert state(reopened.store) == expected
+    reopened.close()
+
+
+def test_reopen_after_write_snapshot_is_identical(tmp_path):
+    persistent = PersistentStore(str(tmp_path), durability="none", snapshot_every=10 ** 9)
+    for student_id in range(1, 11):
+        persistent.store.create(student_id, student(student_id))
+    expected = state(persistent.store)
+    persistent.close()
+    # close() wrote a final snapshot, so the reopen below only loads it
+    assert any(name.startswith("snapshot-") for name in os.listdir(tmp_path))
+
+    reopened = PersistentStore(str(tmp_path), durability="none", snapshot_every=10 ** 9)
+    assert state(reopened.store) == expected
+    reopened.close()
+
+
+def test_write_snapshot_round_trip(tmp_path):
+    rows = [student(student_id) for student_id in range(1, 4)]
+    write_snapshot(str(tmp_path), 7, rows)
+
+    store, seq, _ = recover(str(tmp_path))
+    assert seq == 7
+    assert list(store.records.values()) == rows
+
+
+def test_batch_mode_shares_fsyncs(tmp_path, monkeypatch):
+    fsyncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(persistence.os, "fsync", lambda fd: (fsyncs.append(fd), real_fsync(fd)))
+    persistent = PersistentStore(str(tmp_path), durability="batch", snapshot_every=10 ** 9)
+
+    def writer(start):
+        for student_id in range(start, start + 50):
+            persistent.store.create(student_id, student(student_id))
+
+    threads = [threading.Thread(target=writer, args=(1 + index * 50,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every acknowledged write is synced, with fewer fsyncs than writes
+    assert persistent.journal.synced == persistent.journal.seq == 400
+    assert len(fsyncs) < 400
+    abandon(persistent)
+
+
+def test_second_process_is_refused(tmp_path):
+    persistent = PersistentStore(str(tmp_path), durability="none")
+    try:
+        with pytest.raises(RuntimeError):
+            PersistentStore(str(tmp_path), durability="none")
+    finally:
+        persistent.close()
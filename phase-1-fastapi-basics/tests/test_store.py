@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import myapi
+from store import EmailTaken, StudentStore, fold
+
+
+def student(student_id, name, email):
+    return {"id": student_id, "name": name, "age": 20, "email": email}
+
+
+def assert_indexes_match_records(store):
+    by_name = {}
+    for record in store.records.values():
+        by_name.setdefault(fold(record["name"]), set()).add(record["id"])
+    assert {key: ids if isinstance(ids, set) else {ids} for key, ids in store.by_name.items()} == by_name
+    assert store.by_email == {fold(record["email"]): record["id"] for record in store.records.values()}
+    assert store.ids == sorted(store.records)
+
+
+@pytest.fixture
+def store():
+    return StudentStore([
+        student(1, "Ann Lee", "ann@example.com"),
+        student(2, "ann lee", "ann2@example.com"),
+        student(3, "Bob", "Bob@Example.com"),
+    ])
+
+
+def test_update_moves_the_name_and_email_keys(store):
+    store.update(2, {"name": "Cleo", "email": "CLEO@example.com"})
+    assert_indexes_match_records(store)
+    assert [s["id"] for s in store.find_by_name("ANN LEE")] == [1]
+    assert store.find_by_name("cleo")[0]["id"] == 2
+    assert store.find_by_email("cleo@EXAMPLE.com")["id"] == 2
+    assert store.find_by_email("ann2@example.com") is None
+    # The freed email can be taken again
+    store.create(4, student(4, "Dee", "ann2@example.com"))
+    assert_indexes_match_records(store)
+
+
+def test_changing_only_the_case_of_an_email_is_not_a_conflict(store):
+    store.update(3, {"email": "bob@example.com"})
+    assert store.find_by_email("BOB@EXAMPLE.COM")["email"] == "bob@example.com"
+    assert_indexes_match_records(store)
+
+
+def test_delete_removes_every_index_entry(store):
+    store.delete(1)
+    assert_indexes_match_records(store)
+    assert [s["id"] for s in store.find_by_name("Ann Lee")] == [2]
+    store.delete(2)
+    assert store.find_by_name("Ann Lee") == []
+    assert store.find_by_email("ann@example.com") is None
+    assert_indexes_match_records(store)
+
+
+def test_ids_stay_sorted_for_out_of_order_creates(store):
+    for student_id in (10, 5, 7):
+        store.create(student_id, student(student_id, f"S{student_id}", f"s{student_id}@example.com"))
+    store.delete(5)
+    assert store.ids == [1, 2, 3, 7, 10]
+    assert_indexes_match_records(store)
+
+
+def test_email_conflicts_ignore_case(store):
+    with pytest.raises(EmailTaken):
+        store.create(4, student(4, "Eve", "ANN@example.com"))
+    with pytest.raises(EmailTaken):
+        store.update(3, {"email": "Ann@Example.com"})
+    assert store.get(3)["email"] == "Bob@Example.com"
+    assert_indexes_match_records(store)
+
+
+def test_duplicate_email_is_a_conflict_through_the_api(monkeypatch):
+    monkeypatch.setattr(myapi, "students", StudentStore(myapi.SAMPLE_STUDENTS))
+    client = TestClient(myapi.app)
+    response = client.post("/create-student/4", json={"name": "Copy", "age": 30, "email": "JOHN@example.com"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Student with this email already exists"
+    assert client.put("/update-student/2", json={"email": "john@example.com"}).status_code == 409
+    assert client.post("/create-student/1", json={"name": "Copy", "age": 30, "email": "new@example.com"}).status_code == 409
+    assert client.get("/get-student/2").json()["email"] == "jane@example.com"
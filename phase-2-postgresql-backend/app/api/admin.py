@@ -0,0 +1,142 @@
+import hmac
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+
+from app.services import explain, memory, profiler
+from app.services.bloom import email_filter
+from app.services.hotkeys import hot_keys
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.post("/profile/continuous/start")
+def start_continuous_profile():
+    profiler.start_continuous()
+    return {"message": "Continuous profiling started"}
+
+@router.post("/profile/continuous/stop")
+def stop_continuous_profile():
+    profiler.stop_continuous()
+    return {"message": "Continuous profiling stopped"}
+
+@router.get("/profile/continuous")
+def read_continuous_profile(format: str = "collapsed"):
+    samples = profiler.continuous_snapshot()
+    if format == "speedscope":
+        return Response(profiler.to_speedscope(samples, "continuous"), media_type="application/json")
+    if format != "collapsed":
+        raise HTTPException(status_code=400, detail="format must be collapsed or speedscope")
+    return PlainTextResponse(profiler.to_collapsed(samples))
+
+@router.get("/explain")
+def read_explain_plans(flagged: bool = False):
+    """Captured plans of slow statements, slowest in total first; `flagged` keeps only sequential scans."""
+    return explain.plans.list(flagged_only=flagged)
+
+@router.get("/explain/{fingerprint}")
+def read_explain_plan(fingerprint: str):
+    entry = explain.plans.get(fingerprint)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No plan captured for this statement")
+    return entry
+
+@router.delete("/explain")
+def clear_explain_plans():
+    explain.plans.clear()
+    return {"message": "Captured plans cleared"}
+
+@router.get("/email-filter")
+def read_email_filter():
+    """Size and false-positive rates of this worker's email Bloom filter."""
+    return email_filter.stats()
+
+@router.post("/email-filter/rebuild")
+def rebuild_email_filter():
+    email_filter.rebuild()
+    return email_filter.stats()
+
+@router.get("/hot-keys")
+def read_hot_keys(limit: int = Query(100, ge=1, le=10000)):
+    """This worker's most read students with their estimated (sampled) read counts."""
+    return [{"student_id": student_id, "count": count} for student_id, count in hot_keys.hottest()[:limit]]
+
+def memory_report(content, name: str, download: bool):
+    """JSON response, saved as a file named after the report, worker and time when `download` is set."""
+    headers = None
+    if download:
+        filename = f"memory-{name}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.json"
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return JSONResponse(content, headers=headers)
+
+def memory_grouping(group_by: str):
+    if group_by not in memory.GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(memory.GROUPINGS)}")
+    return group_by
+
+@router.get("/memory")
+def read_memory_status(objects: bool = False, download: bool = False):
+    """RSS, gc and tracemalloc state of the worker serving this request; `objects` adds live object counts by type."""
+    report = memory.status()
+    if objects:
+        report["objects"] = memory.object_counts()
+    return memory_report(report, "status", download)
+
+@router.post("/memory/tracing/start")
+def start_memory_tracing(frames: int = Query(memory.MEMORY_TRACE_FRAMES, ge=1, le=100)):
+    memory.start(frames)
+    return memory.status()
+
+@router.post("/memory/tracing/stop")
+def stop_memory_tracing():
+    memory.stop()
+    return {"message": "Memory tracing stopped and snapshots discarded"}
+
+@router.post("/memory/snapshots")
+def take_memory_snapshot():
+    try:
+        return memory.take_snapshot()
+    except memory.NotTracing as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+@router.get("/memory/snapshots")
+def read_memory_snapshots():
+    return memory.list_snapshots()
+
+@router.get("/memory/snapshots/{snapshot_id}")
+def read_memory_snapshot(
+    snapshot_id: int, group_by: str = "lineno", limit: int = Query(50, ge=1, le=1000), download: bool = False,
+):
+    try:
+        report = memory.top(snapshot_id, memory_grouping(group_by), limit)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=exc.args[0])
+    return memory_report(report, f"snapshot-{snapshot_id}", download)
+
+@router.delete("/memory/snapshots/{snapshot_id}")
+def delete_memory_snapshot(snapshot_id: int):
+    if not memory.delete_snapshot(snapshot_id):
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {"message": "Snapshot deleted"}
+
+@router.get("/memory/diff")
+def read_memory_diff(
+    base: int, target: int, group_by: str = "lineno", limit: int = Query(50, ge=1, le=1000), download: bool = False,
+):
+    """What grew between snapshot `base` and snapshot `target`, largest change first."""
+    try:
+        report = memory.diff(base, target, memory_grouping(group_by), limit)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=exc.args[0])
+    return memory_report(report, f"diff-{base}-{target}", download)
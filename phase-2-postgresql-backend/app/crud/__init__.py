@@ -1,31 +1,398 @@
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Tuple, Union
+from sqlalchemy import Integer, any_, bindparam, func, literal, select, text, union_all
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 from app import models, schemas
+from app.services import changes, stats
+from app.services.bloom import email_filter
+from app.services.cache import student_cache
+from app.services.tracing import traced
 
+class VersionConflict(Exception):
+    """The student changed since the version the caller based its write on."""
+
+    def __init__(self, student_id: int, current_version: int = None):
+        super().__init__(f"Student {student_id} was modified concurrently")
+        self.student_id = student_id
+        self.current_version = current_version
+
+def _version_matches(current: int, expected: Union[int, Tuple[int, ...]]) -> bool:
+    # `expected` is one version, or several (a multi-tag If-Match) of which any may match
+    if expected is None:
+        return True
+    return current in expected if isinstance(expected, tuple) else current == expected
+
+def _commit_versioned(db: Session, student_id: int):
+    # The ORM issues UPDATE/DELETE ... WHERE id = :id AND version = :read_version;
+    # zero matched rows means another writer got there first.
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        current = get_active_student(db, student_id)
+        raise VersionConflict(student_id, current.version if current else None)
+
+def _flush_versioned(db: Session, student_id: int):
+    # Inside a caller's transaction: leave the rollback (of the savepoint or everything) to it
+    try:
+        db.flush()
+    except StaleDataError:
+        raise VersionConflict(student_id)
+
+def _after_commit(db: Session, commit: bool, *effects):
+    """Run cache, filter and change-feed updates now, or once the caller commits its transaction."""
+    if commit:
+        for effect in effects:
+            effect()
+    else:
+        db.info.setdefault("after_commit", []).extend(effects)
+
+def run_after_commit(db: Session):
+    for effect in db.info.pop("after_commit", []):
+        effect()
+
+def discard_after_commit(db: Session):
+    db.info.pop("after_commit", None)
+
+# Hot statements are built once with bound parameters. Reusing the same construct skips
+# building it and its cache key per request, and the compiled form comes from the engine cache.
+STUDENT_BY_ID = select(models.Student).where(models.Student.id == bindparam("student_id"))
+ARCHIVED_STUDENT_BY_ID = select(models.ArchivedStudent).where(models.ArchivedStudent.id == bindparam("student_id"))
+COUNT_STUDENTS = select(func.count(models.Student.id))
+EMAIL_TAKEN = select(literal(1)).where(models.Student.email == bindparam("email")).limit(1)
+ARCHIVED_EMAIL_TAKEN = select(literal(1)).where(models.ArchivedStudent.email == bindparam("email")).limit(1)
+
+# Columns shared by students and students_archive, for listings that span both
+LISTING_COLUMNS = ("id", "name", "age", "email", "version", "inactive_since")
+
+def get_active_student(db: Session, student_id: int):
+    return db.execute(STUDENT_BY_ID, {"student_id": student_id}).scalar_one_or_none()
+
+@traced
 def get_student(db: Session, student_id: int):
-    return db.query(models.Student).filter(models.Student.id == student_id).first()
+    # Archived students are read-only, so only reads fall back to the archive
+    db_student = get_active_student(db, student_id)
+    if db_student is None:
+        db_student = db.execute(ARCHIVED_STUDENT_BY_ID, {"student_id": student_id}).scalar_one_or_none()
+    return db_student
+
+@traced
+def get_students_by_ids(db: Session, student_ids: list):
+    # Returns (found, missing); found keeps the order of `student_ids`, cache hits skip the query.
+    student_ids = list(dict.fromkeys(student_ids))
+    generation = student_cache.generation
+    found = student_cache.get_many(student_ids)
+    misses = [student_id for student_id in student_ids if student_id not in found]
+
+    # Active rows first; only ids missing there are looked up in the archive
+    for model in (models.Student, models.ArchivedStudent):
+        if not misses:
+            break
+        if db.get_bind().dialect.name == "postgresql":
+            # One bound array parameter keeps the statement text identical for any number of ids.
+            condition = model.id == any_(bindparam("ids", misses, type_=postgresql.ARRAY(Integer)))
+        else:
+            condition = model.id.in_(misses)
+        for db_student in db.query(model).filter(condition):
+            student = schemas.Student.model_validate(db_student)
+            student_cache.put(student.id, student, generation)
+            found[student.id] = student
+        misses = [student_id for student_id in misses if student_id not in found]
+    students = [found[student_id] for student_id in student_ids if student_id in found]
+    missing = [student_id for student_id in student_ids if student_id not in found]
+    return students, missing
+
+# Sort keys each filter combination can be served in straight from an index:
+# `id` from the primary key, `age` from ix_students_age_id and `name` from ix_students_name.
+# Every order gets `id` appended as a tiebreaker so pages are stable.
+INDEXED_SORTS = {
+    (False, False): ("id", "age", "name"),
+    (True, False): ("age",),
+    (False, True): ("name",),
+    (True, True): ("age", "name"),
+}
+
+def parse_sort(sort: str, has_age_filter: bool, has_name_filter: bool):
+    allowed = INDEXED_SORTS[(has_age_filter, has_name_filter)]
+    if not sort:
+        return allowed[0], False
+    keys = [key.strip() for key in sort.split(",") if key.strip()]
+    descending = keys[0].startswith("-")
+    field = keys[0].lstrip("-")
+    # A trailing id in the same direction is the tiebreaker we add anyway
+    if len(keys) == 2 and field != "id" and keys[1] == ("-id" if descending else "id"):
+        keys = keys[:1]
+    if len(keys) != 1 or field not in allowed:
+        options = ", ".join(f"{key}, -{key}" for key in allowed)
+        raise ValueError(f"Unsupported sort '{sort}' for these filters; use one of: {options}")
+    return field, descending
+
+@traced
+def filter_students(db: Session, filters: schemas.StudentFilter = None, model=models.Student):
+    query = db.query(model)
+    if filters is None:
+        return query
+    if filters.age_min is not None:
+        query = query.filter(model.age >= filters.age_min)
+    if filters.age_max is not None:
+        query = query.filter(model.age <= filters.age_max)
+    if filters.name_prefix:
+        if db.get_bind().dialect.name == "postgresql":
+            # Served by the text_pattern_ops index regardless of the database collation
+            pattern = filters.name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.filter(model.name.like(pattern + "%", escape="\\"))
+        else:
+            # Binary collation: a half-open range is equivalent to the prefix and uses the name index
+            upper = filters.name_prefix[:-1] + chr(ord(filters.name_prefix[-1]) + 1)
+            query = query.filter(model.name >= filters.name_prefix, model.name < upper)
+    return query
+
+@traced
+def get_students(
+    db: Session, skip: int = 0, limit: int = 100, filters: schemas.StudentFilter = None, with_enrollments: bool = False,
+):
+    query = filter_students(db, filters)
+    has_age_filter = filters is not None and (filters.age_min is not None or filters.age_max is not None)
+    has_name_filter = filters is not None and bool(filters.name_prefix)
+    field, descending = parse_sort(filters.sort if filters else None, has_age_filter, has_name_filter)
+    if filters is not None and filters.include_archived:
+        if with_enrollments:
+            raise ValueError("Enrollments cannot be embedded when including archived students")
+        return _get_students_with_archive(db, skip, limit, filters, field, descending)
+    if with_enrollments:
+        # One extra query for all enrollments of the page (joined with their courses),
+        # rather than a join that repeats every student row per enrollment
+        query = query.options(selectinload(models.Student.enrollments).joinedload(models.Enrollment.course))
+    columns = [getattr(models.Student, field)]
+    if field != "id":
+        columns.append(models.Student.id)
+    query = query.order_by(*[column.desc() if descending else column for column in columns])
+    return query.offset(skip).limit(limit).all()
+
+def _get_students_with_archive(db: Session, skip: int, limit: int, filters, field: str, descending: bool):
+    # Each side is ordered by its own index, so the database can merge the two instead of sorting
+    parts = []
+    for model, archived in ((models.Student, False), (models.ArchivedStudent, True)):
+        columns = [getattr(model, name) for name in LISTING_COLUMNS]
+        parts.append(
+            filter_students(db, filters, model)
+            .with_entities(*columns, literal(archived).label("archived"))
+            .statement
+        )
+    combined = union_all(*parts).subquery()
+    columns = [combined.c[field]]
+    if field != "id":
+        columns.append(combined.c.id)
+    rows = db.execute(
+        select(combined)
+        .order_by(*[column.desc() if descending else column for column in columns])
+        .offset(skip)
+        .limit(limit)
+    ).mappings()
+    return [dict(row, active=row["inactive_since"] is None) for row in rows]
+
+@traced
+def count_students(db: Session, filters: schemas.StudentFilter = None):
+    if filters is None or not filters.is_filtered:
+        total = db.scalar(COUNT_STUDENTS)
+    else:
+        total = filter_students(db, filters).with_entities(func.count(models.Student.id)).scalar()
+    if filters is not None and filters.include_archived:
+        total += filter_students(db, filters, models.ArchivedStudent).with_entities(
+            func.count(models.ArchivedStudent.id)
+        ).scalar()
+    return total
 
-def get_students(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Student).offset(skip).limit(limit).all()
+@traced
+def estimate_student_count(db: Session, filters: schemas.StudentFilter = None):
+    total = _estimate_count(db, filters, models.Student)
+    if filters is not None and filters.include_archived:
+        total += _estimate_count(db, filters, models.ArchivedStudent)
+    return total
 
-def create_student(db: Session, student: schemas.StudentCreate):
+def _estimate_count(db: Session, filters, model):
+    estimate = _planner_estimate(db, filters, model)
+    # Stale statistics (never analyzed, or drifted summaries) can say 0 for a table with rows;
+    # one indexed row lookup tells, and then only an exact count is trustworthy
+    if estimate == 0 and filter_students(db, filters, model).with_entities(model.id).first() is not None:
+        return filter_students(db, filters, model).with_entities(func.count(model.id)).scalar()
+    return estimate
+
+def _planner_estimate(db: Session, filters, model):
+    postgres = db.get_bind().dialect.name == "postgresql"
+    if filters is not None and filters.is_filtered:
+        query = filter_students(db, filters, model)
+        if postgres:
+            compiled = query.with_entities(model.id).statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+            plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+            return int(plan[0]["Plan"]["Plan Rows"])
+        return query.with_entities(func.count(model.id)).scalar()
+    # Planner statistics cost one catalog lookup; the maintained summary count is the fallback
+    # for tables that were never analyzed (reltuples = -1) and for other databases.
+    if postgres:
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": model.__tablename__},
+        ).scalar()
+        if estimate is not None and estimate >= 0:
+            return estimate
+    if model is models.Student:
+        return stats.summary(db)["count"]
+    return db.query(func.count(model.id)).scalar()
+
+@traced
+def email_taken(db: Session, email: str):
+    return db.execute(EMAIL_TAKEN, {"email": email}).first() is not None or archived_email_taken(db, email)
+
+def archived_email_taken(db: Session, email: str):
+    # Archived students keep their email, so reads that fall back to the archive never
+    # return two students with one email and a restore never collides
+    return db.execute(ARCHIVED_EMAIL_TAKEN, {"email": email}).first() is not None
+
+def _check_archived_email(db: Session, email: str):
+    # `students` enforces uniqueness itself; the archive is a separate table
+    if email is not None and archived_email_taken(db, email):
+        raise AlreadyExists(f"Student with email {email} already exists")
+
+@traced
+def create_student(db: Session, student: schemas.StudentCreate, commit: bool = True):
+    _check_archived_email(db, student.email)
     db_student = models.Student(**student.model_dump())
     db.add(db_student)
-    db.commit()
-    db.refresh(db_student)
+    stats.record_change(db, new=(db_student.age, db_student.name))
+    if commit:
+        db.commit()
+        db.refresh(db_student)
+    else:
+        db.flush()
+    payload = schemas.Student.model_validate(db_student).model_dump()
+    _after_commit(
+        db, commit,
+        lambda: email_filter.add(payload["email"]),
+        lambda: changes.emit("create", payload["id"], payload),
+    )
     return db_student
 
-def update_student(db: Session, student_id: int, student: schemas.StudentUpdate):
-    db_student = db.query(models.Student).filter(models.Student.id == student_id).first()
+@traced
+def update_student(
+    db: Session, student_id: int, student: schemas.StudentUpdate, expected_version: Union[int, Tuple[int, ...]] = None, commit: bool = True,
+):
+    db_student = get_active_student(db, student_id)
     if db_student:
-        for key, value in student.model_dump(exclude_none=True).items():
+        if not _version_matches(db_student.version, expected_version):
+            raise VersionConflict(student_id, db_student.version)
+        old = (db_student.age, db_student.name)
+        update_data = student.model_dump(exclude_none=True)
+        if update_data.get("email", db_student.email) != db_student.email:
+            _check_archived_email(db, update_data["email"])
+        active = update_data.pop("active", None)
+        if active is not None and active != db_student.active:
+            db_student.inactive_since = None if active else datetime.utcnow()
+        for key, value in update_data.items():
             setattr(db_student, key, value)
-        db.commit()
-        db.refresh(db_student)
+        stats.record_change(db, old=old, new=(db_student.age, db_student.name))
+        if commit:
+            _commit_versioned(db, student_id)
+            db.refresh(db_student)
+        else:
+            _flush_versioned(db, student_id)
+        payload = schemas.Student.model_validate(db_student).model_dump()
+        effects = [lambda: student_cache.invalidate(student_id)]
+        if "email" in update_data:
+            effects.append(lambda: email_filter.add(payload["email"]))
+        effects.append(lambda: changes.emit("update", student_id, payload))
+        _after_commit(db, commit, *effects)
     return db_student
 
-def delete_student(db: Session, student_id: int):
-    db_student = db.query(models.Student).filter(models.Student.id == student_id).first()
+@traced
+def delete_student(db: Session, student_id: int, expected_version: Union[int, Tuple[int, ...]] = None, commit: bool = True):
+    db_student = get_active_student(db, student_id)
     if db_student:
+        if not _version_matches(db_student.version, expected_version):
+            raise VersionConflict(student_id, db_student.version)
         db.delete(db_student)
+        db.query(models.Enrollment).filter(models.Enrollment.student_id == student_id).delete(synchronize_session=False)
+        stats.record_change(db, old=(db_student.age, db_student.name))
+        if commit:
+            _commit_versioned(db, student_id)
+        else:
+            _flush_versioned(db, student_id)
+        _after_commit(
+            db, commit,
+            lambda: student_cache.invalidate(student_id),
+            lambda: changes.emit("delete", student_id),
+        )
+    return db_student
+
+class AlreadyExists(Exception):
+    pass
+
+@traced
+def get_courses(db: Session, skip: int = 0, limit: int = 100):
+    return db.query(models.Course).order_by(models.Course.id).offset(skip).limit(limit).all()
+
+@traced
+def get_course(db: Session, course_id: int):
+    return db.get(models.Course, course_id)
+
+@traced
+def create_course(db: Session, course: schemas.CourseCreate):
+    db_course = models.Course(**course.model_dump())
+    db.add(db_course)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise AlreadyExists(f"Course {course.code} already exists")
+    db.refresh(db_course)
+    return db_course
+
+@traced
+def get_student_enrollments(db: Session, student_id: int):
+    # A single student's enrollments and courses come back in one joined query
+    return (
+        db.query(models.Enrollment)
+        .options(joinedload(models.Enrollment.course))
+        .filter(models.Enrollment.student_id == student_id)
+        .order_by(models.Enrollment.enrolled_at, models.Enrollment.id)
+        .all()
+    )
+
+@traced
+def get_course_students(db: Session, course_id: int, skip: int = 0, limit: int = 100):
+    return (
+        db.query(models.Student)
+        .join(models.Enrollment, models.Enrollment.student_id == models.Student.id)
+        .filter(models.Enrollment.course_id == course_id)
+        .order_by(models.Student.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+@traced
+def enroll_student(db: Session, student_id: int, course_id: int):
+    db_enrollment = models.Enrollment(student_id=student_id, course_id=course_id)
+    db.add(db_enrollment)
+    try:
         db.commit()
-    return db_student
\ No newline at end of file
+    except IntegrityError:
+        db.rollback()
+        raise AlreadyExists(f"Student {student_id} is already enrolled in course {course_id}")
+    return (
+        db.query(models.Enrollment)
+        .options(joinedload(models.Enrollment.course))
+        .filter(models.Enrollment.id == db_enrollment.id)
+        .one()
+    )
+
+@traced
+def unenroll_student(db: Session, student_id: int, course_id: int):
+    deleted = db.query(models.Enrollment).filter(
+        models.Enrollment.student_id == student_id, models.Enrollment.course_id == course_id,
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted > 0
@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+
+from sqlalchemy import event
+
+# Safe with WAL: a power loss can drop the last commits but never corrupts the database
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+# How long a writer waits for another process's write transaction before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_WRITER_LOCK = os.getenv("SQLITE_WRITER_LOCK", "1") == "1"
+
+WRITE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def is_memory(url):
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def connect_args():
+    # Pooled connections move between threads (FastAPI's threadpool, background jobs); the pool
+    # guarantees only one thread uses a connection at a time
+    return {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+
+
+def pragmas(url):
+    statements = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA foreign_keys = ON",
+    ]
+    if not is_memory(url):
+        statements += [
+            # Readers never block the writer and the writer never blocks readers
+            "PRAGMA journal_mode = WAL",
+            f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+            f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        ]
+    return statements
+
+
+class WriterLock:
+    """Serializes write transactions within the process.
+
+    SQLite allows one writer at a time; without this, concurrent writers poll in SQLite's busy
+    handler and the unlucky ones time out. Threads queue here instead, in arrival order, while
+    readers keep using the other pooled connections. The lock is taken at a connection's first
+    write statement and released when its transaction ends. Writers in other processes are
+    still arbitrated by busy_timeout.
+    """
+
+    def __init__(self, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000):
+        self.lock = threading.Lock()
+        self.timeout = timeout
+
+    def acquire(self, info):
+        if info.get("writer_lock"):
+            return
+        # On timeout (e.g. one thread writing through two sessions) fall back to busy_timeout
+        info["writer_lock"] = self.lock.acquire(timeout=self.timeout)
+
+    def release(self, info):
+        if info.pop("writer_lock", False):
+            self.lock.release()
+
+
+def install(engine, url):
+    """Apply pragmas to every new connection and, for file databases, the writer lock."""
+    statements = pragmas(url)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+        # pysqlite only issues BEGIN before DML, so a SAVEPOINT would open the transaction itself
+        # and its RELEASE would commit it; transactions are begun explicitly below instead
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+            conn.exec_driver_sql("BEGIN")
+
+    if is_memory(url) or not SQLITE_WRITER_LOCK:
+        return None
+    writer_lock = WriterLock()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def take_writer_lock(conn, cursor, statement, parameters, context, executemany):
+        if WRITE.match(statement):
+            writer_lock.acquire(conn.info)
+
+    @event.listens_for(engine, "commit")
+    def release_on_commit(conn):
+        writer_lock.release(conn.info)
+
+    @event.listens_for(engine, "rollback")
+    def release_on_rollback(conn):
+        writer_lock.release(conn.info)
+
+    @event.listens_for(engine, "checkin")
+    def release_on_checkin(dbapi_connection, connection_record):
+        # A connection returned mid-transaction is rolled back by the pool
+        writer_lock.release(connection_record.info)
+
+    return writer_lock
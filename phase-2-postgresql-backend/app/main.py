@@ -1,54 +1,514 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from enum import Enum
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 
-from app.db.session import SessionLocal, engine
+from app.db.session import SessionLocal, background_session, db_slots, engine
 from app.db.base import Base
 from app import models, schemas, crud
+from app.api import admin
+from app.services import archive, batch, changes, deadlines, formats, hotkeys, jobs, profiler, search, stats, tracing
+from app.services.bloom import email_filter
+from app.services.cache import student_cache
+from app.services.hotkeys import hot_keys
+from app.services.metrics import instrument_engine, metrics
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+search.install(engine)
+instrument_engine(engine)
+deadlines.instrument_sessions(SessionLocal)
 
-app = FastAPI(title="Student Management API", version="2.0.0")
+MAX_BATCH_IDS = 1000
+# Reject writes without If-Match (428) instead of falling back to last-write-wins
+REQUIRE_IF_MATCH = os.getenv("REQUIRE_IF_MATCH", "0") == "1"
+
+# Exports and imports run here, sharing the request connection budget
+job_runner = jobs.JobRunner(SessionLocal, db_slots)
+
+# Keep the per-id cache coherent with writes made by other workers
+changes.feed.add_listener(student_cache.on_change)
+changes.feed.add_listener(email_filter.on_change)
+email_filter.install_metrics()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with background_session() as db:
+        stats.ensure_built(db)
+    changes.feed.bind(asyncio.get_running_loop())
+    backend = changes.configure(engine)
+    backend.start()
+    archiver = archive.ArchiveJob(background_session)
+    archiver.start()
+    job_runner.start()
+    email_filter.start(background_session)
+    if profiler.PROFILE_CONTINUOUS:
+        profiler.start_continuous()
+    if hotkeys.enabled():
+        # Before yield, so the worker only reports ready once last run's hot students are cached
+        await run_in_threadpool(hot_keys.preload, background_session)
+        hot_keys.start()
+    yield
+    hot_keys.stop()
+    profiler.stop_continuous()
+    job_runner.stop()
+    email_filter.stop()
+    archiver.stop()
+    backend.stop()
+
+app = FastAPI(
+    title="Student Management API",
+    version="2.0.0",
+    lifespan=lifespan,
+    dependencies=[Depends(deadlines.request_deadline())],
+)
+app.include_router(admin.router)
+
+# Route classes must be set before the routes below are declared
+app.router.route_class = formats.NegotiatedRoute
+
+if tracing.TRACING_ENABLED:
+    app.router.route_class = type("TracedRoute", (tracing.TracedRoute, formats.NegotiatedRoute), {})
+    tracing.setup(app, engine)
+
+# Only installed when configured, so unprofiled deployments skip it entirely
+if profiler.enabled(admin.ADMIN_TOKEN):
+    app.router.route_class = type("ProfiledRoute", (profiler.ProfiledRoute, app.router.route_class), {})
+    app.add_middleware(profiler.ProfilerMiddleware, token=admin.ADMIN_TOKEN)
+
+class TotalMode(str, Enum):
+    none = "none"
+    exact = "exact"
+    approx = "approx"
+
+def etag(version: int):
+    return f'"{version}"'
+
+def expected_version(if_match: Optional[str]):
+    """Versions allowed by an If-Match header, any of which may match; None means any version may be overwritten."""
+    if if_match is None:
+        if REQUIRE_IF_MATCH:
+            raise HTTPException(status_code=428, detail="If-Match header required")
+        return None
+    if if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            # Weak tags never match under If-Match's strong comparison
+            continue
+        try:
+            versions.append(int(tag.strip('"')))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="If-Match must contain ETags returned by this API")
+    if not versions:
+        raise HTTPException(status_code=412, detail="If-Match does not match the current version")
+    return tuple(versions)
 
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    deadline = getattr(request.state, "deadline", None)
+    with tracing.span("get_db"):
+        timeout = max(deadline.remaining(), 0) if deadline is not None else None
+        if not db_slots.acquire(timeout=timeout):
+            raise deadlines.DeadlineExceeded("Timed out waiting for a database connection")
+        db = SessionLocal()
+        db.info["deadline"] = deadline
     try:
         yield db
     finally:
         db.close()
+        db_slots.release()
+
+@app.exception_handler(deadlines.DeadlineExceeded)
+def deadline_exceeded(request: Request, exc: deadlines.DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@app.exception_handler(crud.VersionConflict)
+def version_conflict(request: Request, exc: crud.VersionConflict):
+    headers = {"ETag": etag(exc.current_version)} if exc.current_version is not None else None
+    return JSONResponse(status_code=412, content={"detail": "Student was modified, re-read it and retry"}, headers=headers)
+
+@app.exception_handler(crud.AlreadyExists)
+def already_exists(request: Request, exc: crud.AlreadyExists):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(jobs.JobsBusy)
+def jobs_busy(request: Request, exc: jobs.JobsBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "30"})
+
+@app.exception_handler(OperationalError)
+def database_timeout(request: Request, exc: OperationalError):
+    if not deadlines.is_timeout_error(exc):
+        raise exc
+    return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
 
 @app.get("/")
 def read_root():
     return {"message": "PostgreSQL Backend API"}
 
-@app.get("/students/", response_model=List[schemas.Student])
-def read_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    students = crud.get_students(db, skip=skip, limit=limit)
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return metrics.render()
+
+@app.get("/students/", response_model=Union[List[schemas.Student], schemas.StudentPage])
+def read_students(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    age_min: Optional[int] = None,
+    age_max: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    sort: Optional[str] = Query(None, description="One indexed sort key, e.g. age or -name"),
+    include_archived: bool = False,
+    total: TotalMode = TotalMode.none,
+    envelope: bool = False,
+    db: Session = Depends(get_db),
+):
+    try:
+        filters = schemas.StudentFilter(
+            age_min=age_min, age_max=age_max, name_prefix=name_prefix, sort=sort, include_archived=include_archived,
+        )
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False, include_input=False))
+    try:
+        students = crud.get_students(db, skip=skip, limit=limit, filters=filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    count = None
+    if total == TotalMode.exact:
+        count = crud.count_students(db, filters)
+    elif total == TotalMode.approx:
+        count = crud.estimate_student_count(db, filters)
+    if count is not None:
+        response.headers["X-Total-Count"] = str(count)
+        response.headers["X-Total-Count-Mode"] = total.value
+    if envelope:
+        return {"total": count, "items": students}
     return students
 
-@app.get("/students/{student_id}", response_model=schemas.Student)
-def read_student(student_id: int, db: Session = Depends(get_db)):
-    db_student = crud.get_student(db, student_id=student_id)
-    if db_student is None:
-        raise HTTPException(status_code=404, detail="Student not found")
-    return db_student
+def parse_ids(ids: str):
+    try:
+        return [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+
+def read_batch(db: Session, student_ids: List[int]):
+    if len(student_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    students, missing = crud.get_students_by_ids(db, student_ids)
+    return {"students": students, "missing": missing}
+
+@app.get("/students/with-enrollments", response_model=List[schemas.StudentWithEnrollments])
+def read_students_with_enrollments(
+    skip: int = 0,
+    limit: int = 100,
+    age_min: Optional[int] = None,
+    age_max: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    sort: Optional[str] = Query(None, description="One indexed sort key, e.g. age or -name"),
+    db: Session = Depends(get_db),
+):
+    try:
+        filters = schemas.StudentFilter(age_min=age_min, age_max=age_max, name_prefix=name_prefix, sort=sort)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False, include_input=False))
+    try:
+        return crud.get_students(db, skip=skip, limit=limit, filters=filters, with_enrollments=True)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@app.get("/students/batch", response_model=schemas.StudentBatch, dependencies=[Depends(deadlines.request_deadline(5))])
+def read_students_batch(ids: str = Query(..., description="Comma separated student ids"), db: Session = Depends(get_db)):
+    return read_batch(db, parse_ids(ids))
+
+@app.post("/students/batch", response_model=schemas.StudentBatch, dependencies=[Depends(deadlines.request_deadline(5))])
+def read_students_batch_post(request: schemas.StudentBatchRequest, db: Session = Depends(get_db)):
+    return read_batch(db, request.ids)
+
+@app.get("/students/search", response_model=schemas.StudentSearchPage, dependencies=[Depends(deadlines.request_deadline(2))])
+def search_students(
+    q: str = Query(..., min_length=search.MIN_QUERY_LENGTH, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        results, next_cursor = search.search_students(db, q, limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    items = [
+        schemas.StudentSearchResult(**schemas.Student.model_validate(student).model_dump(), rank=rank, score=score)
+        for student, rank, score in results
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/students/email-available", response_model=schemas.EmailAvailability, dependencies=[Depends(deadlines.request_deadline(1))])
+def read_email_available(email: str = Query(..., min_length=1, max_length=320), db: Session = Depends(get_db)):
+    # Most emails typed into a signup form are free, and the Bloom filter answers those alone
+    hit = email_filter.might_contain(email)
+    if hit is False:
+        email_filter.record("negative")
+        return {"email": email, "available": True}
+    taken = crud.email_taken(db, email)
+    email_filter.record("unbuilt" if hit is None else "confirmed" if taken else "false_positive")
+    return {"email": email, "available": not taken}
+
+@app.get("/students/stats", response_model=schemas.StudentStats)
+def read_student_stats(db: Session = Depends(get_db)):
+    return stats.summary(db)
+
+@app.get("/students/stats/ages", response_model=List[schemas.AgeCount])
+def read_student_age_histogram(db: Session = Depends(get_db)):
+    return stats.age_histogram(db)
+
+@app.get("/students/stats/name-prefixes", response_model=List[schemas.NamePrefixCount])
+def read_student_name_prefixes(db: Session = Depends(get_db)):
+    return stats.name_prefixes(db)
+
+@app.get("/students/changes")
+async def stream_student_changes(
+    request: Request,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    resume_from = last_event_id_header if last_event_id_header is not None else last_event_id
+
+    async def events():
+        queue = changes.feed.subscribe()
+        resume_seq = None
+        try:
+            if resume_from is not None:
+                missed = changes.feed.replay(resume_from)
+                if missed is None:
+                    # The events after `resume_from` were dropped from the buffer, the client must re-read.
+                    yield "event: reset\ndata: {}\n\n"
+                else:
+                    for event in missed:
+                        yield changes.format_sse(event)
+                    resume_seq = missed[-1]["seq"] if missed else resume_from
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is changes.RESET:
+                    yield "event: reset\ndata: {}\n\n"
+                    continue
+                if resume_seq is not None and event["seq"] <= resume_seq:
+                    continue
+                yield changes.format_sse(event)
+        finally:
+            changes.feed.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/students/changes/ws")
+async def student_changes_ws(websocket: WebSocket, last_event_id: Optional[int] = None):
+    await websocket.accept()
+    queue = changes.feed.subscribe()
+    try:
+        resume_seq = None
+        if last_event_id is not None:
+            missed = changes.feed.replay(last_event_id)
+            if missed is None:
+                await websocket.send_json({"op": "reset"})
+            else:
+                for event in missed:
+                    await websocket.send_json(event)
+                resume_seq = missed[-1]["seq"] if missed else last_event_id
+        while True:
+            event = await queue.get()
+            if event is changes.RESET:
+                await websocket.send_json(event)
+                continue
+            if resume_seq is not None and event["seq"] <= resume_seq:
+                continue
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        changes.feed.unsubscribe(queue)
+
+@app.get("/students/{student_id}", response_model=schemas.Student, dependencies=[Depends(deadlines.request_deadline(2))])
+def read_student(student_id: int, response: Response, db: Session = Depends(get_db)):
+    hot_keys.record(student_id)
+    generation = student_cache.generation
+    student = student_cache.get(student_id)
+    if student is None:
+        db_student = crud.get_student(db, student_id=student_id)
+        if db_student is None:
+            raise HTTPException(status_code=404, detail="Student not found")
+        student = schemas.Student.model_validate(db_student)
+        student_cache.put(student_id, student, generation)
+    response.headers["ETag"] = etag(student.version)
+    return student
 
 @app.post("/students/", response_model=schemas.Student)
-def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db)):
-    return crud.create_student(db=db, student=student)
+def create_student(student: schemas.StudentCreate, response: Response, db: Session = Depends(get_db)):
+    db_student = crud.create_student(db=db, student=student)
+    response.headers["ETag"] = etag(db_student.version)
+    return db_student
 
 @app.put("/students/{student_id}", response_model=schemas.Student)
-def update_student(student_id: int, student: schemas.StudentUpdate, db: Session = Depends(get_db)):
-    db_student = crud.update_student(db=db, student_id=student_id, student=student)
+def update_student(
+    student_id: int,
+    student: schemas.StudentUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    version = expected_version(if_match)
+    db_student = crud.update_student(db=db, student_id=student_id, student=student, expected_version=version)
     if db_student is None:
         raise HTTPException(status_code=404, detail="Student not found")
+    response.headers["ETag"] = etag(db_student.version)
     return db_student
 
 @app.delete("/students/{student_id}")
-def delete_student(student_id: int, db: Session = Depends(get_db)):
-    db_student = crud.delete_student(db=db, student_id=student_id)
+def delete_student(student_id: int, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    version = expected_version(if_match)
+    db_student = crud.delete_student(db=db, student_id=student_id, expected_version=version)
     if db_student is None:
         raise HTTPException(status_code=404, detail="Student not found")
-    return {"message": "Student deleted successfully"}
\ No newline at end of file
+    return {"message": "Student deleted successfully"}
+
+@app.post("/students/{student_id}/restore", response_model=schemas.Student)
+def restore_student(student_id: int, response: Response, db: Session = Depends(get_db)):
+    db_student = archive.restore(db, student_id)
+    if db_student is None:
+        raise HTTPException(status_code=404, detail="Archived student not found")
+    response.headers["ETag"] = etag(db_student.version)
+    return db_student
+
+@app.post("/batch", response_model=schemas.BatchResponse)
+def run_batch(request: schemas.BatchRequest, response: Response, db: Session = Depends(get_db)):
+    """Run student operations in order over one transaction; `version` plays the role of If-Match."""
+    result, status = batch.run(db, request, require_version=REQUIRE_IF_MATCH)
+    response.status_code = status
+    return result
+
+@app.get("/students/{student_id}/enrollments", response_model=List[schemas.Enrollment])
+def read_student_enrollments(student_id: int, db: Session = Depends(get_db)):
+    if crud.get_student(db, student_id=student_id) is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return crud.get_student_enrollments(db, student_id=student_id)
+
+@app.post("/students/{student_id}/enrollments", response_model=schemas.Enrollment)
+def enroll_student(student_id: int, enrollment: schemas.EnrollmentCreate, db: Session = Depends(get_db)):
+    if crud.get_active_student(db, student_id) is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    if crud.get_course(db, course_id=enrollment.course_id) is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return crud.enroll_student(db, student_id=student_id, course_id=enrollment.course_id)
+
+@app.delete("/students/{student_id}/enrollments/{course_id}")
+def unenroll_student(student_id: int, course_id: int, db: Session = Depends(get_db)):
+    if not crud.unenroll_student(db, student_id=student_id, course_id=course_id):
+        raise HTTPException(status_code=404, detail="Enrollment not found")
+    return {"message": "Enrollment deleted successfully"}
+
+@app.get("/courses/", response_model=List[schemas.Course])
+def read_courses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return crud.get_courses(db, skip=skip, limit=limit)
+
+@app.post("/courses/", response_model=schemas.Course)
+def create_course(course: schemas.CourseCreate, db: Session = Depends(get_db)):
+    return crud.create_course(db=db, course=course)
+
+@app.get("/courses/{course_id}", response_model=schemas.Course)
+def read_course(course_id: int, db: Session = Depends(get_db)):
+    db_course = crud.get_course(db, course_id=course_id)
+    if db_course is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return db_course
+
+@app.get("/courses/{course_id}/students", response_model=List[schemas.Student])
+def read_course_students(course_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    if crud.get_course(db, course_id=course_id) is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return crud.get_course_students(db, course_id=course_id, skip=skip, limit=limit)
+
+def submit_job(db: Session, kind: str, params: dict, response: Response, job_id: str = None):
+    job = jobs.create_job(db, kind, params, job_id=job_id)
+    try:
+        job_runner.submit(job.id)
+    except jobs.JobsBusy:
+        db.delete(job)
+        db.commit()
+        raise
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+@app.post("/jobs/export", response_model=schemas.Job, status_code=202)
+def create_export_job(export: schemas.ExportJobCreate, response: Response, db: Session = Depends(get_db)):
+    return submit_job(db, "export", export.model_dump(), response)
+
+@app.post("/jobs/import", response_model=schemas.Job, status_code=202)
+async def create_import_job(request: Request, response: Response, format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    """Upload students as the raw request body (CSV with a header row, or NDJSON) and import them in the background."""
+    job_id = uuid.uuid4().hex
+    path = jobs.upload_path(job_id, format)
+    size = 0
+    # Spooled to disk before taking a database connection, however slow the upload.
+    # File calls go to the threadpool so a slow disk does not stall the event loop.
+    f = await run_in_threadpool(open, path, "wb")
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > jobs.JOB_MAX_IMPORT_BYTES:
+                raise HTTPException(status_code=413, detail="Import file too large")
+            await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(os.remove, path)
+        raise
+    await run_in_threadpool(f.close)
+
+    def submit():
+        with job_runner.batch() as db:
+            return schemas.Job.model_validate(submit_job(db, "import", {"format": format}, response, job_id=job_id))
+
+    try:
+        return await run_in_threadpool(submit)
+    except Exception:
+        await run_in_threadpool(os.remove, path)
+        raise
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+def read_job(job_id: str, db: Session = Depends(get_db)):
+    job = jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+def read_job_result(job_id: str, db: Session = Depends(get_db)):
+    job = jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.result_url is None or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=409, detail=f"Job has no result (status: {job.status})")
+    filename = os.path.basename(job.result_path)
+    media_type = "application/json" if job.kind == "import" else jobs.FORMATS[json.loads(job.params)["format"]]
+    return FileResponse(job.result_path, media_type=media_type, filename=filename)
+
+@app.post("/jobs/{job_id}/cancel", response_model=schemas.Job)
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    job = jobs.cancel_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in ("succeeded", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return job
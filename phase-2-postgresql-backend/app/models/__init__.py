@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import relationship
 from app.db.base import Base
 
 class Student(Base):
@@ -7,4 +9,120 @@ class Student(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     age = Column(Integer)
-    email = Column(String, unique=True, index=True)
\ No newline at end of file
+    email = Column(String, unique=True, index=True)
+    # Bumped on every write; UPDATE and DELETE only match the version that was read
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Set when the student becomes inactive; the archival job moves such rows to students_archive
+    inactive_since = Column(DateTime, nullable=True)
+
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        # Age range filters and age ordering, with id as the tiebreaker
+        Index("ix_students_age_id", "age", "id"),
+        # Prefix LIKE on PostgreSQL; other databases use ix_students_name for prefix ranges
+        Index("ix_students_name_pattern", "name", postgresql_ops={"name": "text_pattern_ops"}).ddl_if(dialect="postgresql"),
+        # Only the few inactive rows are indexed, for the archival job
+        Index(
+            "ix_students_inactive_since", "inactive_since",
+            postgresql_where=inactive_since.isnot(None), sqlite_where=inactive_since.isnot(None),
+        ),
+    )
+
+    # lazy="raise": enrollments must be loaded explicitly, so a listing can never fall into N+1
+    enrollments = relationship(
+        "Enrollment",
+        primaryjoin="Student.id == foreign(Enrollment.student_id)",
+        viewonly=True,
+        lazy="raise",
+    )
+
+    @property
+    def active(self):
+        return self.inactive_since is None
+
+    archived = False
+
+class ArchivedStudent(Base):
+    __tablename__ = "students_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, index=True)
+    age = Column(Integer)
+    email = Column(String, index=True)
+    version = Column(Integer, nullable=False)
+    inactive_since = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_students_archive_age_id", "age", "id"),
+        Index("ix_students_archive_name_pattern", "name", postgresql_ops={"name": "text_pattern_ops"}).ddl_if(dialect="postgresql"),
+    )
+
+    enrollments = relationship(
+        "Enrollment",
+        primaryjoin="ArchivedStudent.id == foreign(Enrollment.student_id)",
+        viewonly=True,
+        lazy="raise",
+    )
+
+    active = False
+    archived = True
+
+class Course(Base):
+    __tablename__ = "courses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True, nullable=False)
+    title = Column(String, nullable=False)
+
+class Enrollment(Base):
+    __tablename__ = "enrollments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: enrollments stay attached when a student moves to students_archive
+    student_id = Column(Integer, nullable=False, index=True)
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False, index=True)
+    enrolled_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    course = relationship("Course", lazy="raise")
+
+    __table_args__ = (
+        UniqueConstraint("student_id", "course_id", name="uq_enrollments_student_course"),
+    )
+
+class StudentAgeCount(Base):
+    __tablename__ = "student_age_counts"
+
+    age = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class StudentNamePrefixCount(Base):
+    __tablename__ = "student_name_prefix_counts"
+
+    prefix = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String, nullable=False)
+    # queued, running, succeeded, failed or cancelled
+    status = Column(String, nullable=False, default="queued", index=True)
+    params = Column(Text, nullable=False, default="{}")
+    processed = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    result_path = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    # Checked by the worker between batches, so any API worker can cancel a job
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Touched after every batch; a running job that stops touching it was lost with its process
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    @property
+    def result_url(self):
+        return f"/jobs/{self.id}/result" if self.status == "succeeded" and self.result_path else None
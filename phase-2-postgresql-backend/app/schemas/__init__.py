@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
 
 class StudentBase(BaseModel):
     name: str
@@ -13,9 +14,143 @@ class StudentUpdate(BaseModel):
     name: Optional[str] = None
     age: Optional[int] = None
     email: Optional[str] = None
+    active: Optional[bool] = None
 
 class Student(StudentBase):
     id: int
+    version: int = 1
+    active: bool = True
+    archived: bool = False
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class CourseBase(BaseModel):
+    code: str
+    title: str
+
+class CourseCreate(CourseBase):
+    pass
+
+class Course(CourseBase):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+class EnrollmentCreate(BaseModel):
+    course_id: int
+
+class Enrollment(BaseModel):
+    course: Course
+    enrolled_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class StudentWithEnrollments(Student):
+    enrollments: List[Enrollment] = []
+
+class StudentFilter(BaseModel):
+    age_min: Optional[int] = Field(None, ge=0)
+    age_max: Optional[int] = Field(None, ge=0)
+    name_prefix: Optional[str] = Field(None, min_length=1, max_length=100)
+    sort: Optional[str] = None
+    include_archived: bool = False
+
+    @model_validator(mode="after")
+    def check_age_range(self):
+        if self.age_min is not None and self.age_max is not None and self.age_min > self.age_max:
+            raise ValueError("age_min must not be greater than age_max")
+        return self
+
+    @property
+    def is_filtered(self):
+        return self.age_min is not None or self.age_max is not None or bool(self.name_prefix)
+
+class StudentPage(BaseModel):
+    total: Optional[int] = None
+    items: List[Student]
+
+class StudentSearchResult(Student):
+    rank: int
+    score: float
+
+class StudentSearchPage(BaseModel):
+    items: List[StudentSearchResult]
+    next_cursor: Optional[str] = None
+
+class StudentBatchRequest(BaseModel):
+    ids: List[int]
+
+class StudentBatch(BaseModel):
+    students: List[Student]
+    missing: List[int]
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete", "get"]
+    id: Optional[int] = None
+    # StudentCreate for create, StudentUpdate for update; validated per operation
+    data: Optional[dict] = None
+    # Same as If-Match on the single-student routes
+    version: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if self.op != "create" and self.id is None:
+            raise ValueError(f"{self.op} needs an id")
+        if self.op in ("create", "update") and self.data is None:
+            raise ValueError(f"{self.op} needs data")
+        return self
+
+class BatchRequest(BaseModel):
+    # atomic: all or nothing; savepoint: each operation succeeds or fails on its own
+    mode: Literal["atomic", "savepoint"] = "atomic"
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=100)
+
+class BatchResult(BaseModel):
+    status: int
+    student: Optional[Student] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult]
+
+class EmailAvailability(BaseModel):
+    email: str
+    available: bool
+
+class StudentStats(BaseModel):
+    count: int
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    avg_age: Optional[float] = None
+
+class AgeCount(BaseModel):
+    age: int
+    count: int
+
+class NamePrefixCount(BaseModel):
+    prefix: str
+    count: int
+
+class ExportJobCreate(BaseModel):
+    format: Literal["csv", "ndjson"] = "csv"
+    filters: Optional[StudentFilter] = None
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str
+    processed: int
+    total: Optional[int] = None
+    error: Optional[str] = None
+    cancel_requested: bool
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result_url: Optional[str] = None
+
+    class Config:
+        from_attributes = True
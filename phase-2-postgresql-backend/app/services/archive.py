@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.services import changes, stats
+from app.services.cache import student_cache
+
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# How long a student stays inactive in the primary table before being archived
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# Seconds between archival runs in each worker; 0 disables the background job
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "0"))
+
+ARCHIVED_COLUMNS = ("id", "name", "age", "email", "version", "inactive_since")
+
+
+def archive_batch(db: Session, batch_size: int = ARCHIVE_BATCH_SIZE, after_days: float = ARCHIVE_AFTER_DAYS):
+    """Move up to `batch_size` long-inactive students to students_archive; returns how many moved."""
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    query = (
+        db.query(models.Student)
+        .filter(models.Student.inactive_since.isnot(None), models.Student.inactive_since <= cutoff)
+        .order_by(models.Student.inactive_since)
+        .limit(batch_size)
+    )
+    postgres = db.get_bind().dialect.name == "postgresql"
+    if postgres:
+        # Rows being edited stay put, and concurrent jobs in other workers take different rows
+        query = query.with_for_update(skip_locked=True)
+    rows = query.all()
+    if not rows:
+        db.rollback()
+        return 0
+    if postgres:
+        # Lets the change-feed trigger report these deletes as archivals
+        db.execute(text("SET LOCAL students.change_op = 'archive'"))
+    now = datetime.utcnow()
+    archived = []
+    for row in rows:
+        archived.append(models.ArchivedStudent(
+            **{name: getattr(row, name) for name in ARCHIVED_COLUMNS}, archived_at=now,
+        ))
+        stats.record_change(db, old=(row.age, row.name))
+    ids = [row.id for row in rows]
+    db.add_all(archived)
+    db.flush()
+    payloads = [schemas.Student.model_validate(student).model_dump() for student in archived]
+    db.query(models.Student).filter(models.Student.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    for payload in payloads:
+        student_cache.invalidate(payload["id"])
+        changes.emit("archive", payload["id"], payload)
+    return len(payloads)
+
+
+def restore(db: Session, student_id: int):
+    """Move an archived student back to `students` as active; returns it, or None if it is not archived."""
+    archived = db.get(models.ArchivedStudent, student_id)
+    if archived is None:
+        return None
+    values = {name: getattr(archived, name) for name in ARCHIVED_COLUMNS if name != "inactive_since"}
+    # A Core insert keeps the version counting on; the ORM would start it over at 1 and let
+    # an ETag from before the archival match again
+    values["version"] += 1
+    db.execute(insert(models.Student).values(values))
+    db.delete(archived)
+    stats.record_change(db, new=(values["age"], values["name"]))
+    db.commit()
+    student = db.get(models.Student, student_id)
+    payload = schemas.Student.model_validate(student).model_dump()
+    student_cache.invalidate(student_id)
+    changes.emit("create", student_id, payload)
+    return student
+
+
+def archive_all(session_scope, batch_size: int = ARCHIVE_BATCH_SIZE, after_days: float = ARCHIVE_AFTER_DAYS):
+    # Short transactions per batch keep locks and WAL bursts small on large backlogs
+    total = 0
+    while True:
+        with session_scope() as db:
+            moved = archive_batch(db, batch_size, after_days)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+class ArchiveJob:
+    """Runs archive_all every `interval` seconds on a daemon thread."""
+
+    def __init__(self, session_scope, interval=ARCHIVE_INTERVAL):
+        self.session_scope = session_scope
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self.thread = threading.Thread(target=self._run, name="student-archiver", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                archive_all(self.session_scope)
+            except Exception:
+                # Try again next interval; a failed batch was rolled back
+                pass
+
+
+def main(argv):
+    from app.db.base import Base
+    from app.db.session import background_session, engine
+
+    after_days = float(argv[0]) if argv else ARCHIVE_AFTER_DAYS
+    Base.metadata.create_all(bind=engine)
+    print(f"archived {archive_all(background_session, after_days=after_days)} students")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,81 @@
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+
+NOT_EXECUTED = schemas.BatchResult(status=424, error="Not executed: an earlier operation failed")
+
+
+class OperationFailed(Exception):
+    def __init__(self, status, error):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+def _validation_error(exc: ValidationError):
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'data'}: {e['msg']}" for e in exc.errors())
+
+
+def execute(db: Session, operation: schemas.BatchOperation, require_version=False):
+    """Run one operation in the caller's transaction; returns its result or raises OperationFailed."""
+    try:
+        if operation.op == "get":
+            student = crud.get_student(db, operation.id)
+        elif operation.op == "create":
+            student = crud.create_student(db, schemas.StudentCreate.model_validate(operation.data), commit=False)
+        else:
+            if require_version and operation.version is None:
+                raise OperationFailed(428, "version required")
+            if operation.op == "update":
+                update = schemas.StudentUpdate.model_validate(operation.data)
+                student = crud.update_student(db, operation.id, update, expected_version=operation.version, commit=False)
+            else:
+                student = crud.delete_student(db, operation.id, expected_version=operation.version, commit=False)
+                if student is not None:
+                    return schemas.BatchResult(status=200)
+    except ValidationError as exc:
+        raise OperationFailed(422, _validation_error(exc))
+    except crud.VersionConflict as exc:
+        raise OperationFailed(412, str(exc))
+    except (IntegrityError, crud.AlreadyExists):
+        raise OperationFailed(409, "Student with this email already exists")
+    if student is None:
+        raise OperationFailed(404, "Student not found")
+    return schemas.BatchResult(status=201 if operation.op == "create" else 200, student=schemas.Student.model_validate(student))
+
+
+def run(db: Session, request: schemas.BatchRequest, require_version=False):
+    """Run all operations over one session and one commit.
+
+    In atomic mode the first failure rolls everything back and later operations are skipped; in
+    savepoint mode each operation runs in its own savepoint and failures only undo themselves.
+    Returns the response and the HTTP status: 200, or the failing operation's status when an
+    atomic batch was rolled back.
+    """
+    results = []
+    try:
+        for index, operation in enumerate(request.operations):
+            if request.mode == "savepoint":
+                try:
+                    with db.begin_nested():
+                        results.append(execute(db, operation, require_version))
+                except OperationFailed as exc:
+                    results.append(schemas.BatchResult(status=exc.status, error=exc.error))
+                continue
+            try:
+                results.append(execute(db, operation, require_version))
+            except OperationFailed as exc:
+                db.rollback()
+                crud.discard_after_commit(db)
+                results.append(schemas.BatchResult(status=exc.status, error=exc.error))
+                results.extend(NOT_EXECUTED for _ in request.operations[index + 1:])
+                return schemas.BatchResponse(committed=False, results=results), exc.status
+        db.commit()
+    except BaseException:
+        db.rollback()
+        crud.discard_after_commit(db)
+        raise
+    crud.run_after_commit(db)
+    return schemas.BatchResponse(committed=True, results=results), 200
@@ -0,0 +1,163 @@
+import hashlib
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import select
+
+from app import models
+from app.services.metrics import metrics
+
+# Target false-positive rate at the sized capacity; every false positive costs one index probe
+EMAIL_BLOOM_FP_RATE = float(os.getenv("EMAIL_BLOOM_FP_RATE", "0.01"))
+# Seconds between rebuilds, which drop deleted emails and resize for growth; 0 disables them
+EMAIL_BLOOM_REBUILD_INTERVAL = float(os.getenv("EMAIL_BLOOM_REBUILD_INTERVAL", "3600"))
+# Capacity as a multiple of the emails present at build time, so inserts until the next rebuild
+# do not push the false-positive rate over target
+EMAIL_BLOOM_HEADROOM = 1.5
+MIN_CAPACITY = 1024
+BUILD_BATCH_SIZE = 10000
+
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate):
+        self.capacity = max(capacity, 1)
+        self.fp_rate = fp_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Kirsch-Mitzenmacher: k positions from the two halves of one 128-bit digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def expected_fp_rate(self):
+        # Counts re-added values (e.g. an update that keeps the email) twice, so slightly pessimistic
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class EmailFilter:
+    """Per-worker Bloom filter of `students.email`.
+
+    A miss means the email is certainly free; a hit must be confirmed by the database. Until the
+    first build finishes every check goes to the database.
+    """
+
+    def __init__(self, fp_rate=EMAIL_BLOOM_FP_RATE, rebuild_interval=EMAIL_BLOOM_REBUILD_INTERVAL):
+        self.session_scope = None
+        self.fp_rate = fp_rate
+        self.rebuild_interval = rebuild_interval
+        self.filter = None
+        # Emails added while a rebuild streams the table, replayed into the new filter
+        self.pending = None
+        self.built_at = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self, session_scope):
+        """Build the filter in the background, then rebuild it every `rebuild_interval` seconds."""
+        self.session_scope = session_scope
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="email-bloom", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                self.rebuild()
+            except Exception:
+                # Checks keep using the old filter, or the database if there is none yet
+                pass
+            if self.rebuild_interval <= 0 or self.stopping.wait(self.rebuild_interval):
+                return
+
+    def rebuild(self):
+        with self.lock:
+            self.pending = []
+        with self.session_scope() as db:
+            # Archived students keep their email reserved
+            count = db.query(models.Student).count() + db.query(models.ArchivedStudent).count()
+            bloom = BloomFilter(max(int(count * EMAIL_BLOOM_HEADROOM), MIN_CAPACITY), self.fp_rate)
+            for model in (models.Student, models.ArchivedStudent):
+                emails = db.execute(select(model.email).execution_options(yield_per=BUILD_BATCH_SIZE))
+                for email in emails.scalars():
+                    if email is not None:
+                        bloom.add(email)
+        with self.lock:
+            for email in self.pending:
+                bloom.add(email)
+            self.pending = None
+            self.filter = bloom
+            self.built_at = time.time()
+        metrics.inc("email_bloom_rebuilds_total")
+        return bloom
+
+    def add(self, email):
+        if not email:
+            return
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(email)
+            if self.pending is not None:
+                self.pending.append(email)
+
+    def might_contain(self, email):
+        """False if the email is certainly not taken; None when the filter is not built yet."""
+        bloom = self.filter
+        if bloom is None:
+            return None
+        return email in bloom
+
+    def record(self, result):
+        # negative: answered by the filter; confirmed or false_positive: checked in the database
+        metrics.inc("email_bloom_checks_total", result=result)
+
+    def observed_fp_rate(self):
+        false_positives = metrics.value("email_bloom_checks_total", result="false_positive")
+        negatives = metrics.value("email_bloom_checks_total", result="negative")
+        # Only emails that are really free can be false positives
+        return false_positives / (false_positives + negatives) if false_positives + negatives else 0.0
+
+    def stats(self):
+        bloom = self.filter
+        return {
+            "ready": bloom is not None,
+            "built_at": self.built_at,
+            "items": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "size_bytes": len(bloom.bits) if bloom else 0,
+            "hashes": bloom.hashes if bloom else 0,
+            "target_fp_rate": self.fp_rate,
+            "expected_fp_rate": bloom.expected_fp_rate() if bloom else None,
+            "observed_fp_rate": self.observed_fp_rate(),
+        }
+
+    def on_change(self, event):
+        # Emails taken through other workers reach us through the change feed
+        if event["op"] in ("create", "update") and event.get("student"):
+            self.add(event["student"].get("email"))
+
+    def install_metrics(self):
+        metrics.gauge("email_bloom_items", lambda: self.filter.count if self.filter else 0)
+        metrics.gauge("email_bloom_expected_fp_rate", lambda: self.filter.expected_fp_rate() if self.filter else 0)
+        metrics.gauge("email_bloom_observed_fp_rate", self.observed_fp_rate)
+
+
+email_filter = EmailFilter()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class StudentCache:
+    """Per-worker LRU cache of serialized students keyed by id."""
+
+    def __init__(self, maxsize=10000, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by every invalidation. Readers take it before querying and pass it to put,
+        # so a row read before a concurrent write is not cached after the write invalidated it.
+        self.generation = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, student_id):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(student_id)
+            if entry is None:
+                return None
+            expires, student = entry
+            if expires < now:
+                del self.entries[student_id]
+                return None
+            self.entries.move_to_end(student_id)
+            return student
+
+    def get_many(self, student_ids):
+        found = {}
+        for student_id in student_ids:
+            student = self.get(student_id)
+            if student is not None:
+                found[student_id] = student
+        return found
+
+    def put(self, student_id, student, generation=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[student_id] = (time.monotonic() + self.ttl, student)
+            self.entries.move_to_end(student_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, student_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(student_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def on_change(self, event):
+        # Writes made by other workers reach us through the change feed.
+        self.invalidate(event["id"])
+
+
+student_cache = StudentCache(
+    maxsize=int(os.getenv("STUDENT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("STUDENT_CACHE_TTL", "60")),
+)
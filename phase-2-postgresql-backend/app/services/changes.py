@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import select
+import tempfile
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import text
+
+from app import schemas
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, so make sure yourself that a single worker runs
+    fcntl = None
+
+CHANNEL = "students_changes"
+BUFFER_SIZE = int(os.getenv("CHANGE_FEED_BUFFER", "1000"))
+# Events a subscriber may fall behind by before its backlog is dropped and it is sent a reset
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_SUBSCRIBER_QUEUE", "1000"))
+# Queued in place of the events a slow subscriber missed
+RESET = {"op": "reset"}
+
+# Fields of schemas.Student that are not columns of `students`, as SQL over the changed row
+COMPUTED_FIELDS = {
+    "active": "op <> 'archive' AND row_data.inactive_since IS NULL",
+    "archived": "op = 'archive'",
+}
+# The trigger builds the same student object the API and the local backend return, nothing more
+STUDENT_JSON = "json_build_object({})".format(", ".join(
+    f"'{name}', {COMPUTED_FIELDS.get(name, f'row_data.{name}')}" for name in schemas.Student.model_fields
+))
+
+# Postgres side of the feed: every write to `students` sends one NOTIFY with a
+# globally increasing sequence number, so all workers see the same event ids.
+TRIGGER_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS students_change_seq",
+    f"""
+    CREATE OR REPLACE FUNCTION students_notify_change() RETURNS trigger AS $$
+    DECLARE
+        row_data record;
+        -- Writers can name the operation, e.g. the archival job marks its deletes as 'archive'
+        op text := coalesce(nullif(current_setting('students.change_op', true), ''), lower(TG_OP));
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            row_data := OLD;
+        ELSE
+            row_data := NEW;
+        END IF;
+        PERFORM pg_notify('{CHANNEL}', json_build_object(
+            'seq', nextval('students_change_seq'),
+            'op', op,
+            'id', row_data.id,
+            'student', CASE WHEN op = 'delete' THEN NULL ELSE {STUDENT_JSON} END
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS students_notify_change ON students",
+    """
+    CREATE TRIGGER students_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON students
+    FOR EACH ROW EXECUTE FUNCTION students_notify_change()
+    """,
+]
+
+OPS = {"insert": "create", "update": "update", "delete": "delete"}
+
+
+class ChangeFeed:
+    """Fans change events out to every subscriber of this worker."""
+
+    def __init__(self, buffer_size=BUFFER_SIZE, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.buffer = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def bind(self, loop):
+        self.loop = loop
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.add(queue)
+        return queue
+
+    def add_listener(self, callback):
+        # Synchronous callbacks run on the publishing thread, before subscribers are woken.
+        self.listeners.append(callback)
+
+    def unsubscribe(self, queue):
+        with self.lock:
+            self.subscribers.discard(queue)
+
+    def replay(self, last_event_id):
+        """Return buffered events after `last_event_id`, or None if this worker cannot tell what was missed.
+
+        That covers events already dropped from the buffer, and ids this worker has not seen at all:
+        ids from before a restart, or from another worker before this one started listening.
+        """
+        with self.lock:
+            events = list(self.buffer)
+        if not events or last_event_id < events[0]["seq"] - 1 or last_event_id > events[-1]["seq"]:
+            return None
+        return [event for event in events if event["seq"] > last_event_id]
+
+    def publish(self, event):
+        # Called from the listener thread or from request threads, never from the loop itself.
+        with self.lock:
+            self.buffer.append(event)
+            subscribers = list(self.subscribers)
+        for callback in self.listeners:
+            callback(event)
+        if self.loop is None:
+            return
+        for queue in subscribers:
+            self.loop.call_soon_threadsafe(self.deliver, queue, event)
+
+    def deliver(self, queue, event):
+        # Runs on the loop. A subscriber that cannot keep up loses its backlog and must re-read.
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESET)
+
+
+class LocalBackend:
+    """In-process stand-in for LISTEN/NOTIFY, used with SQLite and in tests.
+
+    It only sees this process's writes, so the per-worker state it keeps in step (the student cache,
+    the email filter) would go stale with a second worker. start() refuses to run as one.
+    """
+
+    def __init__(self, feed, lock_path=None):
+        self.feed = feed
+        # Microseconds since the epoch, so ids keep growing across restarts instead of reusing 1, 2, ...
+        self.seq = itertools.count(time.time_ns() // 1000)
+        self.lock = threading.Lock()
+        self.lock_path = lock_path
+        self.lock_file = None
+
+    def start(self):
+        if self.lock_path is None or fcntl is None:
+            return
+        lock_file = open(self.lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Another worker already uses the local change feed for this database ({self.lock_path}). "
+                "Run a single worker, or use PostgreSQL for several."
+            )
+        self.lock_file = lock_file
+
+    def stop(self):
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def emit(self, op, student_id, student=None):
+        with self.lock:
+            event = {"seq": next(self.seq), "op": op, "id": student_id, "student": student}
+            self.feed.publish(event)
+
+
+class PostgresBackend:
+    """One LISTEN connection per worker, shared by all subscribers."""
+
+    def __init__(self, feed, engine, poll_interval=5.0):
+        self.feed = feed
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.engine.begin() as conn:
+            for statement in TRIGGER_DDL:
+                conn.execute(text(statement))
+        self.thread = threading.Thread(target=self._listen, name="students-change-listener", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.poll_interval + 1)
+
+    def emit(self, op, student_id, student=None):
+        # The trigger on `students` publishes the change once the transaction commits.
+        pass
+
+    def _connect(self):
+        # A dedicated DBAPI connection outside the pool so the listener never holds a pool slot.
+        cargs, cparams = self.engine.dialect.create_connect_args(self.engine.url)
+        conn = self.engine.dialect.loaded_dbapi.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _listen(self):
+        backoff = 1
+        while not self.stopping.is_set():
+            try:
+                conn = self._connect()
+            except Exception:
+                self.stopping.wait(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+            try:
+                while not self.stopping.is_set():
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        event = json.loads(notify.payload)
+                        event["op"] = OPS.get(event["op"], event["op"])
+                        self.feed.publish(event)
+            except Exception:
+                pass
+            finally:
+                conn.close()
+
+
+feed = ChangeFeed()
+backend = None
+
+
+def _lock_path(engine):
+    # One lock per database: next to an SQLite file, in the temp directory for anything else
+    url = engine.url
+    if url.get_backend_name() == "sqlite":
+        if not url.database or url.database == ":memory:":
+            # Every process has its own in-memory database, and sees all of its writes
+            return None
+        return url.database + ".feed.lock"
+    digest = hashlib.sha256(url.render_as_string(hide_password=False).encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"students-feed-{digest}.lock")
+
+
+def configure(engine):
+    global backend
+    name = os.getenv("CHANGE_FEED_BACKEND")
+    if name is None:
+        name = "postgres" if engine.dialect.name == "postgresql" else "local"
+    if name == "postgres":
+        backend = PostgresBackend(feed, engine)
+    else:
+        backend = LocalBackend(feed, _lock_path(engine))
+    return backend
+
+
+def emit(op, student_id, student=None):
+    if backend is not None:
+        backend.emit(op, student_id, student)
+
+
+def format_sse(event):
+    return f"id: {event['seq']}\nevent: {event['op']}\ndata: {json.dumps(event)}\n\n"
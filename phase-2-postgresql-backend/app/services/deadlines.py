@@ -0,0 +1,83 @@
+import os
+import time
+from typing import Optional
+
+from fastapi import Header, HTTPException
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from starlette.requests import HTTPConnection
+
+# Budget for routes without their own default, and the most a client may ask for
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+MAX_REQUEST_TIMEOUT = float(os.getenv("MAX_REQUEST_TIMEOUT", "60"))
+# Statements are never given less than this, so a nearly spent budget still fails fast and cleanly
+MIN_STATEMENT_TIMEOUT_MS = 10
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.seconds:g}s exceeded")
+
+
+def parse_timeout(value: str):
+    """Parse `X-Request-Timeout`: seconds, or milliseconds with an `ms` suffix."""
+    value = value.strip().lower()
+    try:
+        seconds = float(value[:-2]) / 1000 if value.endswith("ms") else float(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be seconds or a value like 500ms")
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout must be positive")
+    return min(seconds, MAX_REQUEST_TIMEOUT)
+
+
+def request_deadline(default: float = REQUEST_TIMEOUT):
+    """Dependency that sets `connection.state.deadline` from the header or the route default.
+
+    Declared app-wide with the global default, and again on routes that need a different one.
+    """
+    async def dependency(connection: HTTPConnection, x_request_timeout: Optional[str] = Header(None)):
+        seconds = parse_timeout(x_request_timeout) if x_request_timeout else default
+        connection.state.deadline = Deadline(seconds)
+
+    return dependency
+
+
+def is_timeout_error(exc: OperationalError):
+    # 57014 is PostgreSQL's query_canceled; SQLite reports an aborted progress handler as interrupted
+    return getattr(exc.orig, "pgcode", None) == "57014" or "interrupted" in str(exc.orig)
+
+
+def instrument_sessions(session_factory):
+    """Give every transaction of a session with a deadline the remaining budget as its timeout."""
+
+    @event.listens_for(session_factory, "after_begin")
+    def apply_deadline(session, transaction, connection):
+        deadline = session.info.get("deadline")
+        dialect = connection.dialect.name
+        if dialect == "postgresql":
+            if deadline is None:
+                return
+            deadline.check()
+            ms = max(int(deadline.remaining() * 1000), MIN_STATEMENT_TIMEOUT_MS)
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {ms}")
+        elif dialect == "sqlite":
+            dbapi_connection = connection.connection.driver_connection
+            if deadline is None:
+                # Clear a handler left behind by the previous user of this pooled connection
+                dbapi_connection.set_progress_handler(None, 0)
+                return
+            deadline.check()
+            dbapi_connection.set_progress_handler(lambda: deadline.remaining() <= 0, 1000)
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from sqlalchemy import event, inspect
+
+# Statements at least this slow get their plan captured; 0 disables capture
+EXPLAIN_SLOW_MS = float(os.getenv("EXPLAIN_SLOW_MS", "0"))
+# Fraction of slow statements considered for capture
+EXPLAIN_SAMPLE_RATE = float(os.getenv("EXPLAIN_SAMPLE_RATE", "1"))
+# A statement shape is re-explained at most this often; occurrences are still counted in between
+EXPLAIN_INTERVAL = float(os.getenv("EXPLAIN_INTERVAL", "60"))
+EXPLAIN_MAX_PLANS = int(os.getenv("EXPLAIN_MAX_PLANS", "200"))
+# Upper bound for a single EXPLAIN ANALYZE run on PostgreSQL
+EXPLAIN_TIMEOUT_MS = int(os.getenv("EXPLAIN_TIMEOUT_MS", "30000"))
+
+# Sequential scans on these tables are flagged and get index suggestions
+WATCHED_TABLES = ("students", "students_archive")
+# Scans over fewer rows than this are cheaper than any index, so they are not flagged
+MIN_SCAN_ROWS = 1000
+
+PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|\?|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize(statement):
+    """Collapse whitespace and replace parameters and literals with `?`, so one query shape is one entry."""
+    sql = PLACEHOLDER.sub("?", " ".join(statement.split()))
+    return PLACEHOLDER_LIST.sub("(?, ...)", sql)
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+class PlanStore:
+    """Latest captured plan per normalized statement, most recently seen last."""
+
+    def __init__(self, max_plans=EXPLAIN_MAX_PLANS):
+        self.max_plans = max_plans
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def record_slow(self, normalized, elapsed_ms, interval=EXPLAIN_INTERVAL):
+        """Count a slow run; returns True when the statement is due for a new plan."""
+        key = fingerprint(normalized)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    "fingerprint": key,
+                    "sql": normalized,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "last_seen": None,
+                    "captured_at": None,
+                    "explained_at": 0.0,
+                    "plan": None,
+                    "seq_scans": [],
+                    "suggestions": [],
+                }
+                while len(self.entries) > self.max_plans:
+                    self.entries.popitem(last=False)
+            self.entries.move_to_end(key)
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["last_seen"] = now
+            if now - entry["explained_at"] < interval:
+                return False
+            entry["explained_at"] = now
+            return True
+
+    def store_plan(self, normalized, plan, seq_scans, suggestions):
+        with self.lock:
+            entry = self.entries.get(fingerprint(normalized))
+            if entry is not None:
+                entry.update(plan=plan, seq_scans=seq_scans, suggestions=suggestions, captured_at=time.time())
+
+    def list(self, flagged_only=False):
+        with self.lock:
+            entries = [dict(entry) for entry in self.entries.values()]
+        if flagged_only:
+            entries = [entry for entry in entries if entry["seq_scans"]]
+        entries.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return [_public(entry) for entry in entries]
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return _public(dict(entry)) if entry is not None else None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _public(entry):
+    entry.pop("explained_at")
+    entry["total_ms"] = round(entry["total_ms"], 3)
+    entry["max_ms"] = round(entry["max_ms"], 3)
+    return entry
+
+
+plans = PlanStore()
+
+
+def _walk(node, parent=None):
+    yield node, parent
+    for child in node.get("Plans", ()):
+        yield from _walk(child, node)
+
+
+def _columns_in(text, columns):
+    found = []
+    for column in columns:
+        if re.search(rf"\b{re.escape(column)}\b", text) and column not in found:
+            found.append(column)
+    return found
+
+
+def _pattern(condition):
+    # PostgreSQL shows ILIKE as ~~* and LIKE as ~~
+    if "~~*" in condition:
+        return "ilike"
+    if "~~" in condition:
+        return "like"
+    return None
+
+
+def postgres_seq_scans(plan, table_columns):
+    """Sequential scans on watched tables in an `EXPLAIN (FORMAT JSON)` plan."""
+    scans = []
+    for node, parent in _walk(plan["Plan"]):
+        table = node.get("Relation Name")
+        if node.get("Node Type") != "Seq Scan" or table not in WATCHED_TABLES:
+            continue
+        rows = node.get("Actual Rows", node.get("Plan Rows", 0)) + node.get("Rows Removed by Filter", 0)
+        condition = node.get("Filter", "")
+        sort_key = " ".join(parent.get("Sort Key", ())) if parent and parent.get("Node Type") == "Sort" else ""
+        scans.append({
+            "table": table,
+            "rows": rows,
+            "filter": condition or None,
+            "filter_columns": _columns_in(condition, table_columns.get(table, ())),
+            "sort_columns": _columns_in(sort_key, table_columns.get(table, ())),
+            "pattern": _pattern(condition),
+        })
+    return scans
+
+
+def _clause(sql, keyword, stop):
+    match = re.search(rf"\b{keyword}\b(.*?)(?:\b(?:{stop})\b|$)", sql, re.IGNORECASE)
+    return match.group(1) if match else ""
+
+
+def sqlite_seq_scans(rows, sql, table_columns):
+    """Full table scans on watched tables in `EXPLAIN QUERY PLAN` output.
+
+    SQLite's plan does not show the scan's filter, so the columns come from the statement itself.
+    """
+    where = _clause(sql, "WHERE", "GROUP BY|ORDER BY|LIMIT|UNION")
+    order_by = _clause(sql, "ORDER BY", "LIMIT|OFFSET|UNION")
+    temp_sort = any("TEMP B-TREE FOR ORDER BY" in row[-1] for row in rows)
+    scans = []
+    for row in rows:
+        # SCAN is a full pass over the table or one of its indexes; SEARCH would be a lookup
+        match = re.match(r"SCAN (?:TABLE )?(\w+)\b", row[-1])
+        if match is None or match.group(1) not in WATCHED_TABLES:
+            continue
+        table = match.group(1)
+        columns = table_columns.get(table, ())
+        if not where and not temp_sort and re.search(r"\bLIMIT\b", sql, re.IGNORECASE):
+            # Rows are read in the order wanted and the scan stops at the limit
+            continue
+        scans.append({
+            "table": table,
+            "rows": None,
+            "filter": where.strip() or None,
+            "filter_columns": _columns_in(where, columns),
+            "sort_columns": _columns_in(order_by, columns) if temp_sort else [],
+            "pattern": "like" if re.search(r"\bLIKE\b", where, re.IGNORECASE) else None,
+        })
+    return scans
+
+
+def suggest(scan, indexes, dialect):
+    """An index that would let the planner avoid `scan`, or why the scan is probably fine."""
+    table = scan["table"]
+    if scan["rows"] is not None and scan["rows"] < MIN_SCAN_ROWS:
+        return f"{table}: scanned only {scan['rows']} rows; an index would not help yet"
+    columns = scan["filter_columns"] + [c for c in scan["sort_columns"] if c not in scan["filter_columns"]]
+    if not columns:
+        return f"{table}: unfiltered scan; add a WHERE clause or LIMIT with an indexed ORDER BY"
+    for index in indexes.get(table, ()):
+        if index["column_names"][:len(columns)] == columns:
+            return (f"{table}: index {index['name']} already covers ({', '.join(columns)}); "
+                    f"the planner chose a scan, so run ANALYZE {table} and check the filter is sargable")
+    name = f"ix_{table}_{'_'.join(columns)}"
+    if dialect == "postgresql":
+        if scan["pattern"] == "ilike":
+            return (f"CREATE INDEX CONCURRENTLY {table}_{columns[0]}_trgm ON {table} "
+                    f"USING gin ({columns[0]} gin_trgm_ops)")
+        if scan["pattern"] == "like" and len(columns) == 1:
+            return f"CREATE INDEX CONCURRENTLY {name}_pattern ON {table} ({columns[0]} text_pattern_ops)"
+        return f"CREATE INDEX CONCURRENTLY {name} ON {table} ({', '.join(columns)})"
+    return f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+
+
+def _is_explainable(statement):
+    return statement.lstrip()[:6].upper() in ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")
+
+
+class Explainer:
+    """Explains captured statements on a separate connection from a background thread.
+
+    Running EXPLAIN ANALYZE inline would double the latency of a request that is already slow.
+    """
+
+    def __init__(self, engine, store=plans, slots=None):
+        self.engine = engine
+        self.store = store
+        # Held while explaining, so the extra connection counts against the request budget
+        self.slots = slots if slots is not None else nullcontext()
+        self.queue = queue.Queue(maxsize=100)
+        self.thread = threading.Thread(target=self._run, name="explain-capture", daemon=True)
+        self.thread.start()
+
+    def submit(self, statement, parameters, normalized):
+        try:
+            self.queue.put_nowait((statement, parameters, normalized))
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            statement, parameters, normalized = self.queue.get()
+            try:
+                self.explain(statement, parameters, normalized)
+            except Exception:
+                # The statement may depend on state of the original transaction; keep the counts only
+                pass
+
+    def explain(self, statement, parameters, normalized):
+        with self.slots, self.engine.connect() as conn:
+            table_columns = {}
+            indexes = {}
+            inspector = inspect(conn)
+            for table in WATCHED_TABLES:
+                if inspector.has_table(table):
+                    table_columns[table] = [c["name"] for c in inspector.get_columns(table)]
+                    indexes[table] = inspector.get_indexes(table)
+            dialect = conn.dialect.name
+            if dialect == "postgresql":
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+                # ANALYZE executes the statement, so writes are only planned
+                options = "ANALYZE, BUFFERS, FORMAT JSON" if statement.lstrip()[:6].upper() == "SELECT" else "FORMAT JSON"
+                result = conn.exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters).scalar()
+                plan = (json.loads(result) if isinstance(result, str) else result)[0]
+                scans = postgres_seq_scans(plan, table_columns)
+            else:
+                rows = [tuple(row) for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+                plan = [row[-1] for row in rows]
+                scans = sqlite_seq_scans(rows, statement, table_columns)
+            conn.rollback()
+        suggestions = [suggest(scan, indexes, dialect) for scan in scans]
+        self.store.store_plan(normalized, plan, scans, suggestions)
+
+
+def instrument_engine(engine, slow_ms=EXPLAIN_SLOW_MS, sample_rate=EXPLAIN_SAMPLE_RATE, slots=None):
+    """Capture plans of statements slower than `slow_ms` into `plans`."""
+    if slow_ms <= 0:
+        return None
+    explainer = Explainer(engine, slots=slots)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("explain_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def capture_slow(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["explain_started"].pop()) * 1000
+        # The explainer's own statements (catalog reads, EXPLAIN ANALYZE itself) are never captured
+        if elapsed_ms < slow_ms or executemany or threading.current_thread() is explainer.thread:
+            return
+        if not _is_explainable(statement) or random.random() >= sample_rate:
+            return
+        normalized = normalize(statement)
+        if plans.record_slow(normalized, elapsed_ms):
+            explainer.submit(statement, parameters, normalized)
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(context):
+        started = context.connection.info.get("explain_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    return explainer
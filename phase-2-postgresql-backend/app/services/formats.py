@@ -0,0 +1,151 @@
+import functools
+import json
+
+from fastapi import HTTPException, Request
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class MessagePackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content):
+        return msgpack.packb(content)
+
+
+class CBORResponse(Response):
+    media_type = "application/cbor"
+
+    def render(self, content):
+        return cbor2.dumps(content)
+
+
+# Canonical media type -> (aliases, response class, decoder); codecs that are not installed are left out
+CODECS = {}
+if msgpack is not None:
+    CODECS["application/msgpack"] = (
+        ("application/x-msgpack", "application/vnd.msgpack"),
+        MessagePackResponse,
+        functools.partial(msgpack.unpackb, raw=False),
+    )
+if cbor2 is not None:
+    CODECS["application/cbor"] = ((), CBORResponse, cbor2.loads)
+
+MEDIA_TYPES = {alias: media_type for media_type, (aliases, _, _) in CODECS.items() for alias in (media_type, *aliases)}
+JSON_MEDIA_TYPES = ("application/json", "application/*", "*/*")
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate(accept):
+    """Binary media type preferred by an Accept header, or None for JSON.
+
+    The highest q wins and the earlier entry wins a tie. Headers that accept nothing we produce
+    also get JSON, as before negotiation existed.
+    """
+    best, best_q = None, 0.0
+    for entry in accept.split(","):
+        media_type, *params = entry.split(";")
+        media_type = media_type.strip().lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in MEDIA_TYPES:
+            candidate = MEDIA_TYPES[media_type]
+        elif media_type in JSON_MEDIA_TYPES:
+            candidate = None
+        else:
+            continue
+        if q > best_q:
+            best, best_q = candidate, q
+    return best
+
+
+def is_json(content_type):
+    return content_type == "application/json" or content_type.endswith("+json")
+
+
+async def decode_body(request: Request, takes_body=True):
+    """The request with a MessagePack or CBOR body re-encoded as JSON for FastAPI to parse.
+
+    The JSON goes in through the request's ASGI receive channel, the same way a client would send
+    it, so FastAPI's own body handling and validation apply unchanged. Bodies of other types are
+    refused with 415 on routes that take a body.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    media_type = MEDIA_TYPES.get(content_type)
+    if media_type is None:
+        # No Content-Type at all is read as JSON, as FastAPI does
+        if takes_body and content_type and not is_json(content_type):
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Type {content_type}")
+        return request
+    body = await request.body()
+    if not body:
+        return request
+    try:
+        encoded = json.dumps(CODECS[media_type][2](body)).encode()
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Request body is not valid {media_type}")
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            # Later reads wait for the disconnect, as they would on the original channel
+            return await request.receive()
+        sent = True
+        return {"type": "http.request", "body": encoded, "more_body": False}
+
+    headers = [(name, value) for name, value in request.scope["headers"] if name not in (b"content-type", b"content-length")]
+    headers += [(b"content-type", b"application/json"), (b"content-length", str(len(encoded)).encode())]
+    # Shares scope["state"], so dependencies still see what middleware stored on request.state
+    return Request(dict(request.scope, headers=headers), receive)
+
+
+class NegotiatedRoute(APIRoute):
+    """Serves MessagePack or CBOR instead of JSON when the Accept header prefers it, and accepts
+    request bodies in either format.
+
+    Binary responses skip JSON entirely: the response model is validated and dumped to Python
+    values once, then packed. Errors and endpoints that return a Response themselves stay as they are.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        handlers = {None: handler}
+        if isinstance(self.response_class, DefaultPlaceholder):
+            default_class = self.response_class
+            try:
+                for media_type, (_, response_class, _) in CODECS.items():
+                    self.response_class = response_class
+                    handlers[media_type] = super().get_route_handler()
+            finally:
+                # Keeps the JSON response in the OpenAPI schema
+                self.response_class = default_class
+        takes_body = self.body_field is not None
+
+        async def negotiated_handler(request: Request):
+            request = await decode_body(request, takes_body)
+            if len(handlers) == 1:
+                return await handler(request)
+            accept = request.headers.get("accept")
+            response = await handlers[negotiate(accept) if accept else None](request)
+            response.headers.add_vary_header("Accept")
+            return response
+
+        return negotiated_handler
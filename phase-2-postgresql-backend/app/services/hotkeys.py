@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from app import crud
+from app.services.metrics import metrics
+
+# Fraction of student reads counted; the sketch only needs relative frequencies
+HOT_SAMPLE_RATE = float(os.getenv("HOT_SAMPLE_RATE", "0.1"))
+# Students preloaded at startup and written to HOT_KEYS_FILE
+HOT_TOP_K = int(os.getenv("HOT_TOP_K", "1000"))
+HOT_KEYS_FILE = os.getenv("HOT_KEYS_FILE", "hot_students.json")
+# Seconds between saves of the hot set; 0 disables tracking and preloading
+HOT_PERSIST_INTERVAL = float(os.getenv("HOT_PERSIST_INTERVAL", "60"))
+# All counts are halved this often, so the hot set follows what is read now
+HOT_DECAY_INTERVAL = float(os.getenv("HOT_DECAY_INTERVAL", "3600"))
+PRELOAD_BATCH_SIZE = 1000
+
+
+class CountMinSketch:
+    """Approximate counts in fixed memory; estimates never undercount."""
+
+    def __init__(self, width=8192, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def _columns(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[8 * i:8 * i + 8], "little") % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Conservative update: only the counters at the current minimum grow. Returns the new estimate."""
+        columns = self._columns(key)
+        estimate = min(row[column] for row, column in zip(self.rows, columns)) + count
+        for row, column in zip(self.rows, columns):
+            if row[column] < estimate:
+                row[column] = estimate
+        return estimate
+
+    def estimate(self, key):
+        return min(row[column] for row, column in zip(self.rows, self._columns(key)))
+
+    def decay(self):
+        for row in self.rows:
+            for column in range(self.width):
+                row[column] >>= 1
+
+
+class HotKeys:
+    """Sampled per-worker read counts with the current top-K students."""
+
+    def __init__(self, top_k=HOT_TOP_K, sample_rate=HOT_SAMPLE_RATE, path=HOT_KEYS_FILE):
+        self.top_k = top_k
+        self.sample_rate = sample_rate
+        self.path = path
+        self.sketch = CountMinSketch()
+        # Candidates for the top K with their latest estimates; pruned back to top_k when it doubles
+        self.top = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def record(self, student_id):
+        if self.thread is None or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        self.count(student_id)
+
+    def count(self, student_id):
+        with self.lock:
+            self.top[student_id] = self.sketch.add(student_id)
+            if len(self.top) > 2 * self.top_k:
+                self._prune()
+
+    def _prune(self):
+        keep = sorted(self.top.items(), key=lambda item: item[1], reverse=True)[:self.top_k]
+        self.top = dict(keep)
+
+    def hottest(self):
+        with self.lock:
+            self._prune()
+            return list(self.top.items())
+
+    def decay(self):
+        with self.lock:
+            self.sketch.decay()
+            self.top = {student_id: count >> 1 for student_id, count in self.top.items() if count > 1}
+
+    def save(self):
+        hottest = self.hottest()
+        if not hottest:
+            return
+        # Written whole and renamed, so a crash never leaves a truncated file for the next start
+        partial = f"{self.path}.{os.getpid()}.tmp"
+        with open(partial, "w") as f:
+            json.dump({"saved_at": time.time(), "students": [[sid, count] for sid, count in hottest]}, f)
+        os.replace(partial, self.path)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return [student_id for student_id, _ in json.load(f)["students"]][:self.top_k]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def preload(self, session_scope):
+        """Read the saved hot set into the student cache; returns how many students were loaded.
+
+        The reads also pull the rows' heap and index pages into the database's buffer cache.
+        """
+        student_ids = self.load()
+        loaded = 0
+        with session_scope() as db:
+            for start in range(0, len(student_ids), PRELOAD_BATCH_SIZE):
+                students, _ = crud.get_students_by_ids(db, student_ids[start:start + PRELOAD_BATCH_SIZE])
+                loaded += len(students)
+                db.expunge_all()
+        # Carry the saved ranking over, so a quiet first interval does not overwrite it with nothing
+        with self.lock:
+            for rank, student_id in enumerate(student_ids):
+                self.top.setdefault(student_id, self.sketch.add(student_id, len(student_ids) - rank))
+        metrics.inc("hot_keys_preloaded_total", loaded)
+        return loaded
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="hot-keys", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+            try:
+                self.save()
+            except OSError:
+                pass
+
+    def _run(self):
+        last_decay = time.monotonic()
+        while not self.stopping.wait(HOT_PERSIST_INTERVAL):
+            try:
+                self.save()
+            except OSError:
+                pass
+            if HOT_DECAY_INTERVAL > 0 and time.monotonic() - last_decay >= HOT_DECAY_INTERVAL:
+                self.decay()
+                last_decay = time.monotonic()
+
+
+def enabled():
+    return HOT_PERSIST_INTERVAL > 0 and HOT_TOP_K > 0
+
+
+hot_keys = HotKeys()
@@ -0,0 +1,334 @@
+import csv
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.services import changes, stats
+
+JOB_DIR = os.getenv("JOB_DIR", "jobs")
+# Jobs running at once in each worker; each holds at most one database connection, per batch
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Queued plus running jobs accepted by each worker before new ones are refused
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "20"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "1000"))
+JOB_MAX_IMPORT_BYTES = int(os.getenv("JOB_MAX_IMPORT_MB", "100")) * 1024 * 1024
+# Jobs, queued or running, with no heartbeat for this long are marked failed at startup
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "300"))
+
+EXPORT_COLUMNS = ("id", "name", "age", "email", "version", "active", "archived")
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Import errors kept in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class JobsBusy(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def create_job(db: Session, kind, params, job_id=None):
+    job = models.Job(id=job_id or uuid.uuid4().hex, kind=kind, params=json.dumps(params), heartbeat_at=datetime.utcnow())
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id):
+    return db.get(models.Job, job_id)
+
+
+def cancel_job(db: Session, job_id):
+    job = db.get(models.Job, job_id)
+    if job is None or job.status in FINISHED:
+        return job
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    job.cancel_requested = True
+    db.commit()
+    return job
+
+
+def fail_stale(db: Session, stale_after=JOB_STALE_AFTER):
+    """Mark jobs whose process went away (no heartbeat for `stale_after` seconds) as failed.
+
+    A live runner keeps the heartbeats of its queued jobs fresh too (see JobRunner.progress),
+    so jobs waiting behind others on another worker are left alone.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    stale = db.query(models.Job).filter(
+        models.Job.status.in_(("queued", "running")),
+        (models.Job.heartbeat_at < cutoff) | models.Job.heartbeat_at.is_(None) & (models.Job.created_at < cutoff),
+    ).all()
+    for job in stale:
+        job.status = "failed"
+        job.error = "Interrupted: the worker running this job stopped"
+        job.finished_at = datetime.utcnow()
+    db.commit()
+    return len(stale)
+
+
+def upload_path(job_id, format):
+    return os.path.join(JOB_DIR, f"{job_id}.upload.{format}")
+
+
+class JobRunner:
+    """Runs jobs on a small thread pool, outside any request.
+
+    Jobs take a database slot (the same semaphore as requests) only for one batch at a time,
+    so at most JOB_WORKERS connections go to jobs and interactive requests get the rest.
+    """
+
+    def __init__(self, session_factory, slots, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING):
+        self.session_factory = session_factory
+        self.slots = slots
+        self.workers = workers
+        self.pending = threading.BoundedSemaphore(max_pending)
+        # Submitted here and not started yet; their heartbeats ride on the running jobs' progress
+        self.queued = set()
+        self.stopping = threading.Event()
+        self.executor = None
+
+    def start(self):
+        os.makedirs(JOB_DIR, exist_ok=True)
+        with self.batch() as db:
+            fail_stale(db)
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="job")
+
+    def stop(self):
+        # Running jobs stop at their next batch and are reported as interrupted
+        self.stopping.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, job_id):
+        if not self.pending.acquire(blocking=False):
+            raise JobsBusy(f"More than {JOB_MAX_PENDING} jobs pending, retry later")
+        self.queued.add(job_id)
+        self.executor.submit(self._run, job_id)
+
+    @contextmanager
+    def batch(self):
+        with self.slots:
+            db = self.session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+    def progress(self, db: Session, job_id, processed, total=None):
+        """Record progress and heartbeat, and stop the job if it was cancelled."""
+        job = db.get(models.Job, job_id)
+        job.processed = processed
+        if total is not None:
+            job.total = total
+        job.heartbeat_at = datetime.utcnow()
+        queued = list(self.queued)
+        if queued:
+            db.query(models.Job).filter(models.Job.id.in_(queued), models.Job.status == "queued").update(
+                {"heartbeat_at": job.heartbeat_at}, synchronize_session=False,
+            )
+        db.commit()
+        if job.cancel_requested:
+            raise JobCancelled()
+        if self.stopping.is_set():
+            raise RuntimeError("Interrupted: the server shut down while this job was running")
+
+    def _run(self, job_id):
+        self.queued.discard(job_id)
+        try:
+            with self.batch() as db:
+                job = db.get(models.Job, job_id)
+                if job is None or job.status != "queued":
+                    return
+                job.status = "running"
+                job.started_at = job.heartbeat_at = datetime.utcnow()
+                db.commit()
+                kind, params = job.kind, json.loads(job.params)
+            status, error, result_path = "succeeded", None, None
+            try:
+                result_path = HANDLERS[kind](self, job_id, params)
+            except JobCancelled:
+                status = "cancelled"
+            except Exception as exc:
+                status, error = "failed", str(exc) or type(exc).__name__
+            with self.batch() as db:
+                job = db.get(models.Job, job_id)
+                job.status = status
+                job.error = error
+                job.result_path = result_path
+                job.finished_at = datetime.utcnow()
+                db.commit()
+        finally:
+            self.pending.release()
+
+
+def _write_rows(out, format, rows, writer):
+    for row in rows:
+        if format == "csv":
+            writer.writerow([row[column] for column in EXPORT_COLUMNS])
+        else:
+            out.write(json.dumps(row) + "\n")
+
+
+def run_export(runner: JobRunner, job_id, params):
+    format = params["format"]
+    filters = schemas.StudentFilter(**params["filters"]) if params.get("filters") else None
+    sources = [models.Student]
+    if filters is not None and filters.include_archived:
+        sources.append(models.ArchivedStudent)
+    path = os.path.join(JOB_DIR, f"{job_id}.{format}")
+    partial = path + ".part"
+    processed = 0
+    try:
+        with open(partial, "w", newline="") as out:
+            writer = csv.writer(out) if format == "csv" else None
+            if writer is not None:
+                writer.writerow(EXPORT_COLUMNS)
+            with runner.batch() as db:
+                total = sum(crud.filter_students(db, filters, model).count() for model in sources)
+                runner.progress(db, job_id, 0, total)
+            for model in sources:
+                last_id = 0
+                while True:
+                    # Keyset batches in short transactions: no long-held connection or snapshot
+                    with runner.batch() as db:
+                        rows = (
+                            crud.filter_students(db, filters, model)
+                            .filter(model.id > last_id)
+                            .order_by(model.id)
+                            .limit(JOB_BATCH_SIZE)
+                            .all()
+                        )
+                        _write_rows(out, format, (schemas.Student.model_validate(r).model_dump() for r in rows), writer)
+                        processed += len(rows)
+                        if rows:
+                            last_id = rows[-1].id
+                        runner.progress(db, job_id, processed)
+                    if len(rows) < JOB_BATCH_SIZE:
+                        break
+        os.replace(partial, path)
+        return path
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _read_upload(path, format):
+    with open(path, newline="", encoding="utf-8") as f:
+        if format == "csv":
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, row
+        else:
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError:
+                        yield line, None
+
+
+def _insert(db: Session, students):
+    """Insert a batch in one transaction, or row by row to skip duplicates if that fails.
+
+    Returns the inserted students as API payloads, taken before commit expires them.
+    """
+    archived = {
+        email for (email,) in db.query(models.ArchivedStudent.email)
+        .filter(models.ArchivedStudent.email.in_([student.email for _, student in students]))
+    }
+    failed = [
+        {"line": line, "error": f"Student with email {student.email} already exists"}
+        for line, student in students if student.email in archived
+    ]
+    students = [(line, student) for line, student in students if student.email not in archived]
+    rows = [models.Student(**student.model_dump()) for _, student in students]
+    db.add_all(rows)
+    for row in rows:
+        stats.record_change(db, new=(row.age, row.name))
+    try:
+        db.flush()
+        payloads = [schemas.Student.model_validate(row).model_dump() for row in rows]
+        db.commit()
+        return payloads, failed
+    except IntegrityError:
+        db.rollback()
+    payloads = []
+    for line, student in students:
+        row = models.Student(**student.model_dump())
+        try:
+            with db.begin_nested():
+                db.add(row)
+                db.flush()
+                stats.record_change(db, new=(row.age, row.name))
+            payloads.append(schemas.Student.model_validate(row).model_dump())
+        except IntegrityError:
+            failed.append({"line": line, "error": f"Student with email {student.email} already exists"})
+    db.commit()
+    return payloads, failed
+
+
+def run_import(runner: JobRunner, job_id, params):
+    format = params["format"]
+    upload = upload_path(job_id, format)
+    path = os.path.join(JOB_DIR, f"{job_id}.report.json")
+    processed = imported = failed = 0
+    errors = []
+
+    def record(batch_errors):
+        nonlocal failed
+        failed += len(batch_errors)
+        errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    def flush(batch):
+        nonlocal imported
+        payloads, batch_errors = [], []
+        with runner.batch() as db:
+            if batch:
+                payloads, batch_errors = _insert(db, batch)
+            runner.progress(db, job_id, processed)
+        imported += len(payloads)
+        record(batch_errors)
+        for payload in payloads:
+            changes.emit("create", payload["id"], payload)
+
+    try:
+        batch = []
+        for line, row in _read_upload(upload, format):
+            processed += 1
+            try:
+                if row is None:
+                    raise ValueError("Invalid JSON")
+                batch.append((line, schemas.StudentCreate.model_validate(row)))
+            except (ValidationError, ValueError) as exc:
+                if isinstance(exc, ValidationError):
+                    message = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())
+                else:
+                    message = str(exc)
+                record([{"line": line, "error": message}])
+            if len(batch) >= JOB_BATCH_SIZE:
+                flush(batch)
+                batch = []
+        flush(batch)
+        with open(path, "w") as f:
+            json.dump({"processed": processed, "imported": imported, "failed": failed, "errors": errors}, f)
+        return path
+    finally:
+        os.remove(upload)
+
+
+HANDLERS = {"export": run_export, "import": run_import}
@@ -0,0 +1,170 @@
+import gc
+import itertools
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+# Frames kept per allocation; more frames give better tracebacks but cost memory and CPU
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+# Snapshots kept per worker; the oldest is dropped when a new one is taken
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "5"))
+
+GROUPINGS = ("lineno", "filename", "traceback")
+# Allocations made by the tracer itself and the import system are noise in every snapshot
+IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+snapshots = OrderedDict()
+snapshot_ids = itertools.count(1)
+lock = threading.Lock()
+
+
+class NotTracing(Exception):
+    pass
+
+
+def _max_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def rss_bytes():
+    # Current RSS from /proc where available; otherwise the peak, which is all getrusage offers
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return _max_rss()
+
+
+def status():
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "max_rss_bytes": _max_rss(),
+        "tracing": tracemalloc.is_tracing(),
+        "traceback_frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        "gc": {
+            "enabled": gc.isenabled(),
+            "counts": gc.get_count(),
+            "thresholds": gc.get_threshold(),
+            "generations": gc.get_stats(),
+            "uncollectable": len(gc.garbage),
+        },
+        "snapshots": list_snapshots(),
+    }
+
+
+def object_counts(limit=30):
+    """Live gc-tracked objects by type, most common first; walks the whole heap, so it is slow."""
+    counts = Counter(f"{type(o).__module__}.{type(o).__qualname__}" for o in gc.get_objects())
+    return [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+
+
+def start(frames=MEMORY_TRACE_FRAMES):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop():
+    tracemalloc.stop()
+    with lock:
+        snapshots.clear()
+
+
+def take_snapshot():
+    if not tracemalloc.is_tracing():
+        raise NotTracing("tracemalloc is not running; start it first")
+    snapshot = tracemalloc.take_snapshot().filter_traces(IGNORED)
+    current, peak = tracemalloc.get_traced_memory()
+    entry = {
+        "id": next(snapshot_ids),
+        "taken_at": time.time(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "rss_bytes": rss_bytes(),
+    }
+    with lock:
+        snapshots[entry["id"]] = (entry, snapshot)
+        while len(snapshots) > MEMORY_MAX_SNAPSHOTS:
+            snapshots.popitem(last=False)
+    return entry
+
+
+def list_snapshots():
+    with lock:
+        return [entry for entry, _ in snapshots.values()]
+
+
+def get_snapshot(snapshot_id):
+    with lock:
+        return snapshots.get(snapshot_id)
+
+
+def delete_snapshot(snapshot_id):
+    with lock:
+        return snapshots.pop(snapshot_id, None) is not None
+
+
+def _snapshot(snapshot_id):
+    found = get_snapshot(snapshot_id)
+    if found is None:
+        raise KeyError(f"Snapshot {snapshot_id} not found in worker {os.getpid()}")
+    return found
+
+
+def _frames(traceback):
+    return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+
+
+def top(snapshot_id, group_by="lineno", limit=50):
+    entry, snapshot = _snapshot(snapshot_id)
+    stats = snapshot.statistics(group_by)
+    return {
+        "snapshot": entry,
+        "group_by": group_by,
+        "total_bytes": sum(stat.size for stat in stats),
+        "stats": [
+            {"where": _frames(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in stats[:limit]
+        ],
+    }
+
+
+def diff(base_id, target_id, group_by="lineno", limit=50):
+    """Allocations that grew most between two snapshots, by absolute size change."""
+    base_entry, base = _snapshot(base_id)
+    target_entry, target = _snapshot(target_id)
+    stats = target.compare_to(base, group_by)
+    return {
+        "base": base_entry,
+        "target": target_entry,
+        "group_by": group_by,
+        "size_diff_bytes": sum(stat.size_diff for stat in stats),
+        "stats": [
+            {
+                "where": _frames(stat.traceback),
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[:limit]
+        ],
+    }
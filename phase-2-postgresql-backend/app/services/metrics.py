@@ -0,0 +1,67 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+
+class Metrics:
+    """Per-worker counters and gauges rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def gauge(self, name, callback):
+        # `callback` is evaluated on every scrape
+        self.gauges[name] = callback
+
+    def value(self, name, **labels):
+        with self.lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        with self.lock:
+            samples = sorted(self.counters.items())
+        lines = []
+        for (name, labels), value in samples:
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for name, callback in sorted(self.gauges.items()):
+            lines.append(f"{name} {callback():g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+
+
+def compiled_cache_hit_ratio():
+    hits = metrics.value("sqlalchemy_compiled_cache_total", result="hit")
+    misses = metrics.value("sqlalchemy_compiled_cache_total", result="miss")
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "after_cursor_execute")
+    def count_compiled_cache(conn, cursor, statement, parameters, context, executemany):
+        if context is None:
+            return
+        if context.cache_hit == CACHE_HIT:
+            metrics.inc("sqlalchemy_compiled_cache_total", result="hit")
+        elif context.cache_hit == CACHE_MISS:
+            metrics.inc("sqlalchemy_compiled_cache_total", result="miss")
+        else:
+            metrics.inc("sqlalchemy_compiled_cache_total", result="uncached")
+
+    metrics.gauge("sqlalchemy_compiled_cache_hit_ratio", compiled_cache_hit_ratio)
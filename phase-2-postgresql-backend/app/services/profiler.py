@@ -0,0 +1,234 @@
+import contextvars
+import functools
+import hmac
+import inspect
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi.routing import APIRoute
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Fraction of requests profiled without the admin header, e.g. 0.001
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "collapsed")
+PROFILE_CONTINUOUS = os.getenv("PROFILE_CONTINUOUS", "0") == "1"
+PROFILE_HEADER = b"x-profile"
+
+current_recording = contextvars.ContextVar("profile_recording", default=None)
+
+# Threads parked in these files are idle (thread pool queue, event loop selector, locks)
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collect(skip_thread):
+    """(thread id, frames innermost first, collapsed stack) of every busy thread"""
+    stacks = []
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == skip_thread:
+            continue
+        if frame.f_code.co_filename.endswith(IDLE_FILES):
+            continue
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        stacks.append((thread_id, frames, ";".join(_frame_label(f.f_code) for f in reversed(frames))))
+    return stacks
+
+
+class Recording:
+    """Samples of one profile. With a `frame`, only the threads working for that request are sampled:
+    the event loop while it runs code under `frame`, and the threads in `threads`.
+    """
+
+    def __init__(self, frame=None):
+        self.samples = Counter()
+        self.frame = frame
+        # Thread pool threads running this request's sync endpoint, registered by ProfiledRoute
+        self.threads = set()
+
+    def add(self, stacks):
+        for thread_id, frames, stack in stacks:
+            if self.frame is None or thread_id in self.threads or self.frame in frames:
+                self.samples[stack] += 1
+
+
+class Sampler:
+    """Statistical sampler over busy threads, running only while someone is recording."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.recordings = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start_recording(self, frame=None):
+        recording = Recording(frame)
+        with self.lock:
+            self.recordings[id(recording)] = recording
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+                self.thread.start()
+        return recording
+
+    def stop_recording(self, recording):
+        with self.lock:
+            self.recordings.pop(id(recording), None)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            stacks = _collect(me)
+            with self.lock:
+                if not self.recordings:
+                    self.thread = None
+                    return
+                for recording in self.recordings.values():
+                    recording.add(stacks)
+            # Frames keep their locals alive; drop them before sleeping
+            del stacks
+            time.sleep(self.interval)
+
+
+sampler = Sampler()
+continuous = None
+
+
+def start_continuous():
+    global continuous
+    if continuous is None:
+        continuous = sampler.start_recording()
+    return continuous
+
+
+def continuous_snapshot():
+    with sampler.lock:
+        return Counter(continuous.samples) if continuous is not None else Counter()
+
+
+def stop_continuous():
+    global continuous
+    if continuous is not None:
+        sampler.stop_recording(continuous)
+        continuous = None
+
+
+def to_collapsed(samples):
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+def to_speedscope(samples, name, interval=PROFILE_INTERVAL):
+    frames, index = [], {}
+    sampled, weights = [], []
+    for stack, count in samples.items():
+        ids = []
+        for label in stack.split(";"):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            ids.append(index[label])
+        sampled.append(ids)
+        weights.append(count * interval * 1000)
+    return json.dumps({
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": sampled,
+            "weights": weights,
+        }],
+    })
+
+
+def write_profile(samples, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-") + f"-{random.randrange(16 ** 6):06x}"
+    if PROFILE_FORMAT == "speedscope":
+        path = os.path.join(PROFILE_DIR, f"{slug}.speedscope.json")
+        content = to_speedscope(samples, name)
+    else:
+        path = os.path.join(PROFILE_DIR, f"{slug}.folded")
+        content = to_collapsed(samples)
+    with open(path, "w") as f:
+        f.write(content)
+    return path
+
+
+class ProfilerMiddleware:
+    """Profiles a request when it carries the admin profile header or is picked by the sample rate.
+
+    Only installed when profiling is configured, so disabled deployments pay nothing.
+    """
+
+    def __init__(self, app, token=None, sample_rate=PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+
+    def _wanted(self, scope):
+        if self.token is not None:
+            for key, value in scope["headers"]:
+                if key == PROFILE_HEADER and hmac.compare_digest(value, self.token):
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        # Everything this request runs on the event loop runs under this coroutine's frame
+        recording = sampler.start_recording(sys._getframe())
+        token = current_recording.set(recording)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_recording.reset(token)
+            sampler.stop_recording(recording)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            name = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{scope['path']}-{elapsed_ms:.0f}ms"
+            if recording.samples:
+                write_profile(recording.samples, name)
+
+
+class ProfiledRoute(APIRoute):
+    """Registers the thread pool thread running a sync endpoint with the request's recording.
+
+    The thread pool copies the request's context into the thread, so the recording set by the
+    middleware is visible there.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        wrapped = endpoint
+        if not inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            def wrapped(*args, **kw):
+                recording = current_recording.get()
+                if recording is None:
+                    return endpoint(*args, **kw)
+                thread_id = threading.get_ident()
+                recording.threads.add(thread_id)
+                try:
+                    return endpoint(*args, **kw)
+                finally:
+                    recording.threads.discard(thread_id)
+        super().__init__(path, wrapped, **kwargs)
+
+
+def enabled(token):
+    return bool(token) or PROFILE_SAMPLE_RATE > 0
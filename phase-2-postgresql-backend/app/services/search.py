@@ -0,0 +1,186 @@
+import base64
+import json
+import os
+import re
+from decimal import Decimal
+
+from sqlalchemy import Float, Numeric, case, cast, func, or_, select, text, tuple_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, aliased
+
+from app import models
+
+# Minimum trigram similarity for a typo-tolerant match (pg_trgm's default threshold)
+SIMILARITY_THRESHOLD = 0.3
+# One trigram; shorter queries would match most of the table by substring
+MIN_QUERY_LENGTH = 3
+# Most matching names ranked per search, taken most similar first from the index
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "5000"))
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # GiST rather than GIN: it also serves `<->` ordering, so candidates come out most similar first
+    "DROP INDEX IF EXISTS ix_students_name_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_trgm_gist ON students USING gist (name gist_trgm_ops)",
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE students_fts USING fts5(
+        name, content='students', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER students_fts_insert AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER students_fts_delete AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER students_fts_update AFTER UPDATE OF name ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO students_fts(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    "INSERT INTO students_fts(students_fts) VALUES ('rebuild')",
+]
+
+fts_available = False
+
+
+def install(engine):
+    global fts_available
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+    elif engine.dialect.name == "sqlite":
+        try:
+            with engine.begin() as conn:
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_fts'")
+                ).first()
+                if exists is None:
+                    for statement in SQLITE_DDL:
+                        conn.execute(text(statement))
+            fts_available = True
+        except OperationalError:
+            # SQLite built without FTS5 or the trigram tokenizer (3.34+): fall back to LIKE scans
+            fts_available = False
+
+
+def encode_cursor(rank, score, student_id):
+    raw = json.dumps([rank, str(score), student_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, score, student_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(rank), Decimal(score), int(student_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def trigrams(value):
+    # Same shape as pg_trgm: lowercased words padded with two spaces in front and one behind
+    grams = set()
+    for word in re.findall(r"\w+", value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    left, right = trigrams(a), trigrams(b)
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def search_students(db: Session, q: str, limit: int = 20, cursor: str = None):
+    """Return (results, next_cursor); results are (student, rank, score) ordered best first.
+
+    rank is 2 for a prefix match, 1 for a substring match and 0 for a fuzzy match.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    if db.get_bind().dialect.name == "postgresql":
+        results = _search_postgres(db, q, limit, after)
+    else:
+        results = _search_local(db, q, limit, after)
+    next_cursor = None
+    if len(results) == limit:
+        student, rank, score = results[-1]
+        next_cursor = encode_cursor(rank, score, student.id)
+    return results, next_cursor
+
+
+def _search_postgres(db: Session, q: str, limit: int, after):
+    pattern = escape_like(q)
+    name = models.Student.name
+    rank = case(
+        (name.ilike(pattern + "%", escape="\\"), 2),
+        (name.ilike("%" + pattern + "%", escape="\\"), 1),
+        else_=0,
+    ).label("rank")
+    # Rounded to numeric so the cursor round-trips exactly
+    score = func.round(cast(func.similarity(name, q), Numeric), 4).label("score")
+    matches = (
+        select(models.Student, rank, score)
+        .where(or_(name.ilike("%" + pattern + "%", escape="\\"), name.op("%")(q)))
+        # Common queries: a KNN scan of the GiST index stops at the limit. Rare ones: the few matches are top-N sorted
+        .order_by(name.op("<->", return_type=Float)(q))
+        .limit(SEARCH_CANDIDATE_LIMIT)
+        .subquery()
+    )
+    student = aliased(models.Student, matches)
+    query = db.query(student, matches.c.rank, matches.c.score)
+    if after is not None:
+        query = query.filter(tuple_(matches.c.rank, matches.c.score, matches.c.id) < tuple_(*after))
+    query = query.order_by(matches.c.rank.desc(), matches.c.score.desc(), matches.c.id.desc())
+    return [tuple(row) for row in query.limit(limit).all()]
+
+
+def _candidate_ids(db: Session, q: str):
+    if fts_available:
+        grams = {q.lower()[i:i + 3] for i in range(len(q) - 2)}
+        if grams:
+            match = " OR ".join('"' + gram.replace('"', '""') + '"' for gram in sorted(grams))
+            # bm25 puts names sharing more (and rarer) trigrams with q first, so the limit keeps the best
+            rows = db.execute(
+                text("SELECT rowid FROM students_fts WHERE students_fts MATCH :match ORDER BY rank LIMIT :limit"),
+                {"match": match, "limit": SEARCH_CANDIDATE_LIMIT},
+            )
+            return [row[0] for row in rows]
+    # No FTS5: substring matches only; of two names containing q the shorter is the more similar
+    rows = db.query(models.Student.id).filter(
+        models.Student.name.ilike("%" + escape_like(q) + "%", escape="\\")
+    ).order_by(func.length(models.Student.name), models.Student.id).limit(SEARCH_CANDIDATE_LIMIT)
+    return [row[0] for row in rows]
+
+
+def _search_local(db: Session, q: str, limit: int, after):
+    ids = _candidate_ids(db, q)
+    if not ids:
+        return []
+    needle = q.lower()
+    scored = []
+    for student in db.query(models.Student).filter(models.Student.id.in_(ids)):
+        lowered = (student.name or "").lower()
+        rank = 2 if lowered.startswith(needle) else 1 if needle in lowered else 0
+        score = Decimal(str(round(similarity(student.name or "", q), 4)))
+        if rank == 0 and score < Decimal(str(SIMILARITY_THRESHOLD)):
+            continue
+        if after is not None and (rank, score, student.id) >= after:
+            continue
+        scored.append((student, rank, score))
+    scored.sort(key=lambda item: (item[1], item[2], item[0].id), reverse=True)
+    return scored[:limit]
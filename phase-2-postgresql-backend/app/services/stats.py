@@ -0,0 +1,153 @@
+import logging
+import os
+import sys
+from collections import Counter
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Summary tables are kept up to date by the crud write paths, inside the same
+# transaction as the write, so reads never have to scan `students`.
+
+# Compare the summaries with a full recount at startup and log any drift; a full scan of `students`
+STATS_CHECK_ON_STARTUP = os.getenv("STATS_CHECK_ON_STARTUP", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+def name_prefix(name):
+    return name[:1].lower() if name else ""
+
+def _bump(db: Session, model, key_column, key, delta):
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(model).values({key_column.name: key, "count": delta})
+        statement = statement.on_conflict_do_update(
+            index_elements=[key_column],
+            set_={"count": model.count + delta},
+        )
+        db.execute(statement)
+        return
+    row = db.get(model, key)
+    if row is None:
+        db.add(model(**{key_column.name: key, "count": delta}))
+    else:
+        row.count += delta
+
+def record_change(db: Session, old=None, new=None):
+    """Apply one student write to the summaries; `old`/`new` are (age, name) or None."""
+    if old is not None and new is not None:
+        if old[0] != new[0]:
+            _bump(db, models.StudentAgeCount, models.StudentAgeCount.age, old[0], -1)
+            _bump(db, models.StudentAgeCount, models.StudentAgeCount.age, new[0], 1)
+        if name_prefix(old[1]) != name_prefix(new[1]):
+            _bump(db, models.StudentNamePrefixCount, models.StudentNamePrefixCount.prefix, name_prefix(old[1]), -1)
+            _bump(db, models.StudentNamePrefixCount, models.StudentNamePrefixCount.prefix, name_prefix(new[1]), 1)
+        return
+    delta, (age, name) = (1, new) if new is not None else (-1, old)
+    _bump(db, models.StudentAgeCount, models.StudentAgeCount.age, age, delta)
+    _bump(db, models.StudentNamePrefixCount, models.StudentNamePrefixCount.prefix, name_prefix(name), delta)
+
+def age_histogram(db: Session):
+    rows = (
+        db.query(models.StudentAgeCount)
+        .filter(models.StudentAgeCount.count > 0)
+        .order_by(models.StudentAgeCount.age)
+        .all()
+    )
+    return [{"age": row.age, "count": row.count} for row in rows]
+
+def name_prefixes(db: Session):
+    rows = (
+        db.query(models.StudentNamePrefixCount)
+        .filter(models.StudentNamePrefixCount.count > 0)
+        .order_by(models.StudentNamePrefixCount.prefix)
+        .all()
+    )
+    return [{"prefix": row.prefix, "count": row.count} for row in rows]
+
+def summary(db: Session):
+    # The age histogram has one row per distinct age, so this is cheap at any table size.
+    histogram = age_histogram(db)
+    count = sum(row["count"] for row in histogram)
+    if count == 0:
+        return {"count": 0, "min_age": None, "max_age": None, "avg_age": None}
+    return {
+        "count": count,
+        "min_age": histogram[0]["age"],
+        "max_age": histogram[-1]["age"],
+        "avg_age": sum(row["age"] * row["count"] for row in histogram) / count,
+    }
+
+def compute(db: Session):
+    """Recompute the summaries from `students` with a full scan."""
+    ages = Counter(dict(
+        db.query(models.Student.age, func.count()).group_by(models.Student.age).all()
+    ))
+    prefixes = Counter()
+    first_letter = func.substr(models.Student.name, 1, 1)
+    for letter, count in db.query(first_letter, func.count()).group_by(first_letter):
+        prefixes[name_prefix(letter)] += count
+    return ages, prefixes
+
+def check(db: Session):
+    """Return the differences between the stored summaries and a full recompute."""
+    ages, prefixes = compute(db)
+    stored_ages = Counter({row["age"]: row["count"] for row in age_histogram(db)})
+    stored_prefixes = Counter({row["prefix"]: row["count"] for row in name_prefixes(db)})
+    diff = {}
+    for key in set(ages) | set(stored_ages):
+        if ages[key] != stored_ages[key]:
+            diff[f"age:{key}"] = {"stored": stored_ages[key], "actual": ages[key]}
+    for key in set(prefixes) | set(stored_prefixes):
+        if prefixes[key] != stored_prefixes[key]:
+            diff[f"prefix:{key}"] = {"stored": stored_prefixes[key], "actual": prefixes[key]}
+    return diff
+
+def rebuild(db: Session):
+    ages, prefixes = compute(db)
+    db.query(models.StudentAgeCount).delete()
+    db.query(models.StudentNamePrefixCount).delete()
+    db.add_all(models.StudentAgeCount(age=age, count=count) for age, count in ages.items())
+    db.add_all(models.StudentNamePrefixCount(prefix=prefix, count=count) for prefix, count in prefixes.items())
+    db.commit()
+
+def ensure_built(db: Session, check_drift=STATS_CHECK_ON_STARTUP):
+    # Backfill once when the summary tables are introduced on an existing database.
+    if db.query(models.StudentAgeCount).first() is None and db.query(models.Student).first() is not None:
+        rebuild(db)
+        return
+    # Writes made outside the API (psql, restores) bypass the crud functions and are not counted
+    if check_drift:
+        diff = check(db)
+        if diff:
+            logger.warning(
+                "%d student summary rows differ from a recount; run `python -m app.services.stats rebuild`",
+                len(diff),
+            )
+
+def main(argv):
+    from app.db.base import Base
+    from app.db.session import background_session, engine
+
+    if len(argv) != 1 or argv[0] not in ("check", "rebuild"):
+        print("usage: python -m app.services.stats check|rebuild")
+        return 2
+    Base.metadata.create_all(bind=engine)
+    with background_session() as db:
+        diff = check(db)
+        for key, counts in sorted(diff.items()):
+            print(f"{key}: stored={counts['stored']} actual={counts['actual']}")
+        if argv[0] == "check":
+            print("summaries are consistent" if not diff else f"{len(diff)} mismatched summary rows")
+            return 1 if diff else 0
+        rebuild(db)
+        print("summaries rebuilt")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
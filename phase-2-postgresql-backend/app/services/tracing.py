@@ -0,0 +1,291 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# Head sampling: fraction of new traces kept up front (an incoming sampled traceparent is always kept)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# Tail sampling: traces slower than this, or that failed, are kept regardless of the head decision
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "500"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "student-api")
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds and status codes
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.error = False
+        self.spans = []
+        self.serialize_span = None
+
+
+class Span:
+    def __init__(self, trace, name, parent_id=None, kind=KIND_INTERNAL, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.status = STATUS_OK
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_error(self, exc=None):
+        self.status = STATUS_ERROR
+        self.trace.error = True
+        if exc is not None:
+            self.attributes["exception.type"] = type(exc).__name__
+            self.attributes["exception.message"] = str(exc)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.spans.append(self)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def start_span(name, kind=KIND_INTERNAL, attributes=None):
+    parent = current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+
+class span:
+    """Context manager for a child span of the current span; a no-op outside a trace."""
+
+    def __init__(self, name, kind=KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span = start_span(self.name, self.kind, self.attributes)
+        if self.span is not None:
+            self.token = current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            if exc is not None:
+                self.span.set_error(exc)
+            self.span.end()
+            current_span.reset(self.token)
+        return False
+
+
+def traced(func):
+    """Run `func` in a child span named after it."""
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if current_span.get() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class FileExporter:
+    """Writes one OTLP/JSON `resourceSpans` document per kept trace, from a background thread."""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self.queue = queue.Queue(maxsize=10000)
+        self.thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self.thread.start()
+
+    def export(self, trace):
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while True:
+                trace = self.queue.get()
+                document = {
+                    "resourceSpans": [{
+                        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                        "scopeSpans": [{
+                            "scope": {"name": "app.services.tracing"},
+                            "spans": [s.to_otlp() for s in trace.spans],
+                        }],
+                    }],
+                }
+                f.write(json.dumps(document) + "\n")
+                if self.queue.empty():
+                    f.flush()
+
+
+exporter = None
+
+
+def parse_traceparent(value):
+    match = TRACEPARENT.match(value or "")
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class TracingMiddleware:
+    """Starts the root span of every request and decides whether to keep the trace."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        incoming = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id, sampled = f"{random.getrandbits(128):032x}", None, None
+        if sampled is None:
+            sampled = random.random() < TRACE_SAMPLE_RATE
+        trace = Trace(trace_id, sampled)
+        root = Span(trace, f"{scope['method']} {scope['path']}", parent_id, KIND_SERVER, {
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+        })
+        token = current_span.set(root)
+        flags = "01" if sampled else "00"
+        traceparent = f"00-{trace_id}-{root.span_id}-{flags}".encode()
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                if trace.serialize_span is not None:
+                    trace.serialize_span.end()
+                status = message["status"]
+                root.attributes["http.response.status_code"] = status
+                if status >= 500:
+                    root.set_error()
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"traceparent", traceparent)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except Exception as exc:
+            root.set_error(exc)
+            raise
+        finally:
+            current_span.reset(token)
+            root.end()
+            slow = (root.end_ns - root.start_ns) / 1e6 >= TRACE_SLOW_MS
+            if trace.sampled or trace.error or slow:
+                exporter.export(trace)
+
+
+class TracedRoute(APIRoute):
+    """Wraps each endpoint in a span and opens a serialization span when it returns.
+
+    FastAPI validates and serializes the return value after the endpoint; that span is closed
+    by the middleware when the response starts.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        name = f"endpoint {endpoint.__name__}"
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapped(*args, **kw):
+                with span(name) as endpoint_span:
+                    result = await endpoint(*args, **kw)
+                _start_serialize(endpoint_span)
+                return result
+        else:
+            @functools.wraps(endpoint)
+            def wrapped(*args, **kw):
+                with span(name) as endpoint_span:
+                    result = endpoint(*args, **kw)
+                _start_serialize(endpoint_span)
+                return result
+        super().__init__(path, wrapped, **kwargs)
+
+
+def _start_serialize(endpoint_span):
+    if endpoint_span is not None:
+        endpoint_span.trace.serialize_span = Span(endpoint_span.trace, "serialize", endpoint_span.parent_id)
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_sql_span(conn, cursor, statement, parameters, context, executemany):
+        sql_span = start_span("sql", KIND_CLIENT, {
+            "db.system": engine.dialect.name,
+            "db.statement": statement[:2000],
+        })
+        conn.info.setdefault("trace_spans", []).append(sql_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_sql_span(conn, cursor, statement, parameters, context, executemany):
+        sql_span = conn.info["trace_spans"].pop()
+        if sql_span is not None:
+            sql_span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def fail_sql_span(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            sql_span = spans.pop()
+            if sql_span is not None:
+                sql_span.set_error(context.original_exception)
+                sql_span.end()
+
+
+def setup(app, engine):
+    global exporter
+    exporter = FileExporter()
+    instrument_engine(engine)
+    app.add_middleware(TracingMiddleware)
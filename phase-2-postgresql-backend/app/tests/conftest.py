@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+import pytest
+
+# The engine and services read their configuration at import, so this must run before app is imported
+DATA_DIR = tempfile.mkdtemp(prefix="studentdb-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/test.db"
+os.environ["JOB_DIR"] = os.path.join(DATA_DIR, "jobs")
+os.environ["HOT_PERSIST_INTERVAL"] = "0"
+os.environ.pop("TRACING_ENABLED", None)
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,54 @@
+import pytest
+
+from app.db.session import SessionLocal
+from app.services import archive
+
+
+@pytest.fixture
+def archived(client):
+    student = client.post("/students/", json={"name": "Archived", "age": 80, "email": "archived@example.com"}).json()
+    client.put(f"/students/{student['id']}", json={"active": False})
+    db = SessionLocal()
+    try:
+        assert archive.archive_batch(db, after_days=0) >= 1
+    finally:
+        db.close()
+    yield student
+    client.post(f"/students/{student['id']}/restore")
+    client.delete(f"/students/{student['id']}")
+
+
+def test_reads_fall_back_to_the_archive(client, archived):
+    response = client.get(f"/students/{archived['id']}")
+    assert response.status_code == 200
+    assert response.json()["archived"] is True
+    assert client.get("/students/batch", params={"ids": str(archived["id"])}).json()["missing"] == []
+    assert client.put(f"/students/{archived['id']}", json={"age": 81}).status_code == 404
+
+    listed = [s["id"] for s in client.get("/students/", params={"age_min": 80, "age_max": 80}).json()]
+    assert archived["id"] not in listed
+    listed = client.get("/students/", params={"age_min": 80, "age_max": 80, "include_archived": True}).json()
+    assert archived["id"] in [s["id"] for s in listed]
+
+
+def test_archived_email_stays_reserved(client, archived):
+    assert client.post("/students/", json={"name": "Taker", "age": 20, "email": archived["email"]}).status_code == 409
+    other = client.post("/students/", json={"name": "Other", "age": 20, "email": "other-archived@example.com"}).json()
+    assert client.put(f"/students/{other['id']}", json={"email": archived["email"]}).status_code == 409
+    assert client.get("/students/email-available", params={"email": archived["email"]}).json()["available"] is False
+    batch = client.post("/batch", json={"mode": "savepoint", "operations": [
+        {"op": "create", "data": {"name": "Taker", "age": 20, "email": archived["email"]}},
+    ]}).json()
+    assert batch["results"][0]["status"] == 409
+    client.delete(f"/students/{other['id']}")
+
+
+def test_restore(client, archived):
+    response = client.post(f"/students/{archived['id']}/restore")
+    assert response.status_code == 200, response.text
+    restored = response.json()
+    assert (restored["archived"], restored["active"], restored["email"]) == (False, True, archived["email"])
+    assert restored["version"] > archived["version"]
+    assert client.get(f"/students/{archived['id']}").json()["archived"] is False
+    assert client.put(f"/students/{archived['id']}", json={"age": 81}).status_code == 200
+    assert client.post(f"/students/{archived['id']}/restore").status_code == 404
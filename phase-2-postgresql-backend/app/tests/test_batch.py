@@ -0,0 +1,79 @@
+import pytest
+
+from app import crud, schemas
+from app.db.session import SessionLocal
+
+
+@pytest.fixture
+def student(client):
+    response = client.post("/students/", json={"name": "Batcher", "age": 40, "email": "batcher@example.com"})
+    yield response.json()
+    client.delete(f"/students/{response.json()['id']}")
+
+
+def run(client, mode, operations):
+    return client.post("/batch", json={"mode": mode, "operations": operations})
+
+
+def create(email):
+    return {"op": "create", "data": {"name": "Batch New", "age": 20, "email": email}}
+
+
+def mixed(student):
+    # The second operation reuses an existing email and fails with 409
+    return [
+        create("batch-first@example.com"),
+        create(student["email"]),
+        {"op": "update", "id": student["id"], "data": {"age": 41}},
+        create("batch-last@example.com"),
+    ]
+
+
+def cleanup(client, *emails):
+    for email in emails:
+        for row in client.get("/students/search?q=Batch New").json()["items"]:
+            if row["email"] == email:
+                client.delete(f"/students/{row['id']}")
+
+
+def test_failed_atomic_batch_leaves_the_table_unchanged(client, student):
+    count = client.get("/students/stats").json()["count"]
+    response = run(client, "atomic", mixed(student))
+
+    assert response.status_code == 409
+    body = response.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [201, 409, 424, 424]
+    assert client.get("/students/stats").json()["count"] == count
+    assert client.get(f"/students/{student['id']}").json()["age"] == 40
+
+
+def test_savepoint_batch_commits_only_what_succeeded(client, student):
+    count = client.get("/students/stats").json()["count"]
+    response = run(client, "savepoint", mixed(student))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == [201, 409, 200, 201]
+    assert client.get("/students/stats").json()["count"] == count + 2
+    assert client.get(f"/students/{student['id']}").json()["age"] == 41
+    for result in (body["results"][0], body["results"][3]):
+        assert client.get(f"/students/{result['student']['id']}").status_code == 200
+    cleanup(client, "batch-first@example.com", "batch-last@example.com")
+
+
+def test_released_savepoint_is_undone_by_the_outer_rollback(client):
+    # pysqlite does not BEGIN before a SAVEPOINT, so RELEASE would commit on its own
+    db = SessionLocal()
+    try:
+        with db.begin_nested():
+            created = crud.create_student(
+                db, schemas.StudentCreate(name="Batch New", age=20, email="batch-released@example.com"), commit=False,
+            )
+        student_id = created.id
+        db.rollback()
+        crud.discard_after_commit(db)
+    finally:
+        db.close()
+    assert client.get(f"/students/{student_id}").status_code == 404
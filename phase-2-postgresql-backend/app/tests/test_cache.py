@@ -0,0 +1,36 @@
+from app import crud
+from app.db.session import SessionLocal
+from app.services.cache import StudentCache, student_cache
+
+
+def test_put_is_skipped_after_a_concurrent_invalidate():
+    cache = StudentCache()
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.put(1, "stale", generation)
+    assert cache.get(1) is None
+
+    cache.put(1, "fresh", cache.generation)
+    assert cache.get(1) == "fresh"
+
+
+def test_batch_read_does_not_cache_a_row_invalidated_while_reading(client, monkeypatch):
+    student = client.post("/students/", json={"name": "Cached", "age": 50, "email": "cached@example.com"}).json()
+    student_cache.invalidate(student["id"])
+    get_many = student_cache.get_many
+
+    def write_during_read(student_ids):
+        # Stands in for a write that commits between our cache check and our query
+        found = get_many(student_ids)
+        student_cache.invalidate(student["id"])
+        return found
+
+    monkeypatch.setattr(student_cache, "get_many", write_during_read)
+    db = SessionLocal()
+    try:
+        students, _ = crud.get_students_by_ids(db, [student["id"]])
+    finally:
+        db.close()
+    assert [s.id for s in students] == [student["id"]]
+    assert student_cache.get(student["id"]) is None
+    client.delete(f"/students/{student['id']}")
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from app import schemas
+from app.services.changes import RESET, STUDENT_JSON, TRIGGER_DDL, ChangeFeed, LocalBackend
+
+
+def test_replay_returns_events_after_the_id():
+    feed = ChangeFeed()
+    backend = LocalBackend(feed)
+    for student_id in range(3):
+        backend.emit("create", student_id)
+    seqs = [event["seq"] for event in feed.buffer]
+
+    assert [event["seq"] for event in feed.replay(seqs[0])] == seqs[1:]
+    assert feed.replay(seqs[-1]) == []
+
+
+def test_replay_resets_for_ids_it_cannot_account_for():
+    feed = ChangeFeed(buffer_size=2)
+    backend = LocalBackend(feed)
+    assert feed.replay(1) is None
+    for student_id in range(3):
+        backend.emit("create", student_id)
+    first, last = feed.buffer[0]["seq"], feed.buffer[-1]["seq"]
+
+    # Dropped from the buffer
+    assert feed.replay(first - 2) is None
+    # Never seen by this worker
+    assert feed.replay(last + 1) is None
+
+
+def test_local_ids_grow_across_restarts():
+    before = ChangeFeed()
+    LocalBackend(before).emit("create", 1)
+    time.sleep(0.001)
+    after = ChangeFeed()
+    LocalBackend(after).emit("create", 1)
+
+    assert after.buffer[0]["seq"] > before.buffer[0]["seq"]
+    assert after.replay(before.buffer[0]["seq"]) is None
+
+
+def test_trigger_payload_has_the_student_schema_fields():
+    for name in schemas.Student.model_fields:
+        assert f"'{name}', " in STUDENT_JSON
+    assert "row_to_json" not in TRIGGER_DDL[1]
+
+
+def test_local_backend_refuses_a_second_worker(tmp_path):
+    lock_path = str(tmp_path / "students.db.feed.lock")
+    first = LocalBackend(ChangeFeed(), lock_path)
+    second = LocalBackend(ChangeFeed(), lock_path)
+    first.start()
+    try:
+        with pytest.raises(RuntimeError):
+            second.start()
+    finally:
+        first.stop()
+    second.start()
+    second.stop()
+
+
+def test_a_subscriber_that_falls_behind_is_reset():
+    async def scenario():
+        feed = ChangeFeed(queue_size=2)
+        feed.bind(asyncio.get_running_loop())
+        slow = feed.subscribe()
+        backend = LocalBackend(feed)
+        for student_id in range(3):
+            backend.emit("create", student_id)
+        await asyncio.sleep(0)
+        assert slow.get_nowait() is RESET
+        assert slow.empty()
+
+        backend.emit("create", 3)
+        await asyncio.sleep(0)
+        assert slow.get_nowait()["id"] == 3
+
+    asyncio.run(scenario())
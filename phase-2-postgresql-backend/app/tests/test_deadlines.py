@@ -0,0 +1,85 @@
+import time
+from contextlib import contextmanager
+
+import pytest
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal, background_session, db_slots, engine
+from app.main import app, get_db
+from app.services import deadlines
+
+# Counts to a billion; far longer than any budget below unless it is interrupted
+SLOW_QUERY = text(
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) SELECT count(*) FROM n"
+)
+
+
+def slow_query(db: Session = Depends(get_db)):
+    return {"count": db.execute(SLOW_QUERY).scalar()}
+
+
+app.add_api_route("/_tests/slow", slow_query)
+
+
+@contextmanager
+def held_slots():
+    """Take every free db slot; yields how many were taken."""
+    taken = 0
+    while db_slots.acquire(blocking=False):
+        taken += 1
+    try:
+        yield taken
+    finally:
+        for _ in range(taken):
+            db_slots.release()
+
+
+@pytest.mark.parametrize("value", ["abc", "0", "-1", "ms"])
+def test_invalid_timeout_header_is_rejected(client, value):
+    response = client.get("/students/", headers={"X-Request-Timeout": value})
+    assert response.status_code == 400
+
+
+def test_timeout_header_accepts_milliseconds(client):
+    assert client.get("/students/", headers={"X-Request-Timeout": "5000ms"}).status_code == 200
+
+
+def test_expired_deadline_interrupts_the_query(client):
+    started = time.monotonic()
+    response = client.get("/_tests/slow", headers={"X-Request-Timeout": "200ms"})
+    assert response.status_code == 504
+    assert time.monotonic() - started < 5
+
+
+def test_waiting_for_a_slot_is_bounded_by_the_deadline(client):
+    with held_slots():
+        started = time.monotonic()
+        response = client.get("/students/", headers={"X-Request-Timeout": "200ms"})
+    assert response.status_code == 504
+    assert time.monotonic() - started < 5
+    assert client.get("/students/").status_code == 200
+
+
+def test_background_sessions_hold_a_slot():
+    with held_slots() as free:
+        pass
+    with background_session():
+        with held_slots() as free_inside:
+            pass
+    assert free_inside == free - 1
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="statement_timeout is PostgreSQL only")
+def test_statement_timeout_is_the_remaining_budget():
+    db = SessionLocal()
+    try:
+        db.info["deadline"] = deadlines.Deadline(2)
+        timeout = db.execute(text("SHOW statement_timeout")).scalar()
+        assert timeout.endswith("ms") and 0 < int(timeout[:-2]) <= 2000
+        db.rollback()
+        db.info["deadline"] = None
+        assert db.execute(text("SHOW statement_timeout")).scalar() != timeout
+    finally:
+        db.close()
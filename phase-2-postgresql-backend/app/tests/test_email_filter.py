@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+
+from app import crud
+from app.db.session import background_session
+from app.services.bloom import EmailFilter, email_filter
+from app.services.metrics import metrics
+
+
+def test_emails_added_during_a_rebuild_are_kept():
+    bloom = EmailFilter(rebuild_interval=0)
+
+    @contextmanager
+    def scope_with_concurrent_write():
+        # A create commits while the rebuild is streaming the table
+        bloom.add("during-rebuild@example.com")
+        with background_session() as db:
+            yield db
+
+    bloom.session_scope = scope_with_concurrent_write
+    bloom.rebuild()
+    assert bloom.might_contain("during-rebuild@example.com") is True
+    assert bloom.pending is None
+
+
+def test_definitely_available_emails_skip_the_database(client, monkeypatch):
+    deadline = time.monotonic() + 10
+    while email_filter.filter is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    email = "never-used-anywhere@example.com"
+    assert email_filter.might_contain(email) is False
+
+    def no_database(db, email):
+        raise AssertionError("the filter should have answered")
+
+    monkeypatch.setattr(crud, "email_taken", no_database)
+    negatives = metrics.value("email_bloom_checks_total", result="negative")
+    response = client.get("/students/email-available", params={"email": email})
+    assert response.json() == {"email": email, "available": True}
+    assert metrics.value("email_bloom_checks_total", result="negative") == negatives + 1
+
+
+def test_taken_emails_are_confirmed_by_the_database(client):
+    student = client.post("/students/", json={"name": "Filtered", "age": 33, "email": "filtered@example.com"}).json()
+    assert email_filter.might_contain("filtered@example.com") is not False
+    assert client.get("/students/email-available", params={"email": "filtered@example.com"}).json()["available"] is False
+    client.delete(f"/students/{student['id']}")
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import event
+
+from app.db import session
+
+
+@pytest.fixture
+def statements():
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # Transaction control is not a query (SQLite sessions issue their own BEGIN)
+        if statement != "BEGIN":
+            executed.append(statement)
+
+    event.listen(session.engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(session.engine, "before_cursor_execute", record)
+
+
+@pytest.fixture(scope="module")
+def enrolled(client):
+    courses = [client.post("/courses/", json={"code": f"Q{i}", "title": f"Course {i}"}).json() for i in range(5)]
+    for i in range(200):
+        student = client.post("/students/", json={"name": f"Enrolled {i}", "age": 18 + i % 10, "email": f"enrolled{i}@example.com"}).json()
+        for course in courses[: i % 5 + 1]:
+            client.post(f"/students/{student['id']}/enrollments", json={"course_id": course["id"]})
+    return courses
+
+
+def count_statements(client, statements, url):
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    return len(statements), response.json()
+
+
+def test_with_enrollments_query_count_is_constant(client, enrolled, statements):
+    one, page = count_statements(client, statements, "/students/with-enrollments?limit=1")
+    many, full_page = count_statements(client, statements, "/students/with-enrollments?limit=200")
+    assert len(page) == 1
+    assert len(full_page) == 200
+    assert sum(len(student["enrollments"]) for student in full_page) > 200
+    # One query for the page of students and one for all of their enrollments with courses
+    assert one == many == 2
@@ -0,0 +1,61 @@
+import cbor2
+import msgpack
+import pytest
+
+from app.services.formats import negotiate
+
+CODECS = {
+    "application/msgpack": (msgpack.packb, lambda body: msgpack.unpackb(body, raw=False)),
+    "application/cbor": (cbor2.dumps, cbor2.loads),
+}
+
+
+@pytest.mark.parametrize("media_type", sorted(CODECS))
+def test_binary_request_and_response(client, media_type):
+    encode, decode = CODECS[media_type]
+    body = {"name": "Packed", "age": 22, "email": f"packed@{media_type.split('/')[1]}.example.com"}
+    response = client.post(
+        "/students/", content=encode(body), headers={"Content-Type": media_type, "Accept": media_type},
+    )
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == media_type
+    assert "Accept" in response.headers["vary"]
+    student = decode(response.content)
+    assert {key: student[key] for key in body} == body
+    client.delete(f"/students/{student['id']}")
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("application/msgpack", "application/msgpack"),
+    ("application/x-msgpack", "application/msgpack"),
+    ("application/json;q=0.5, application/cbor", "application/cbor"),
+    ("application/msgpack;q=0.5, application/json", None),
+    # A tie goes to the entry listed first
+    ("application/json, application/msgpack", None),
+    ("application/cbor, application/msgpack", "application/cbor"),
+    ("application/msgpack;q=0", None),
+    ("text/html", None),
+])
+def test_accept_q_values(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_json_is_served_when_the_accept_header_prefers_it(client):
+    response = client.get("/students/", headers={"Accept": "application/msgpack;q=0.1, */*"})
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_unsupported_content_type_is_refused(client):
+    response = client.post("/students/", content=b"name=x", headers={"Content-Type": "application/x-www-form-urlencoded"})
+    assert response.status_code == 415
+
+
+def test_malformed_binary_body_is_a_bad_request(client):
+    response = client.post("/students/", content=b"\xc1", headers={"Content-Type": "application/msgpack"})
+    assert response.status_code == 400
+
+
+def test_binary_body_is_validated_like_json(client):
+    body = msgpack.packb({"name": "Invalid", "age": "old", "email": "invalid@example.com"})
+    response = client.post("/students/", content=body, headers={"Content-Type": "application/msgpack"})
+    assert response.status_code == 422
@@ -0,0 +1,71 @@
+import json
+
+from app.db.session import background_session
+from app.services.cache import student_cache
+from app.services.hotkeys import CountMinSketch, HotKeys
+
+
+def colliding_keys(sketch):
+    # Two keys that share their first-row counter but not their second-row one
+    seen = {}
+    for key in range(100000):
+        first, second = sketch._columns(key)
+        for other, (other_first, other_second) in seen.items():
+            if first == other_first and second != other_second:
+                return other, key
+        seen[key] = (first, second)
+
+
+def test_conservative_update_only_grows_the_minimum():
+    sketch = CountMinSketch(width=16, depth=2)
+    hot, cold = colliding_keys(sketch)
+    for _ in range(5):
+        sketch.add(hot)
+    assert sketch.add(cold) == 1
+    # A plain count-min sketch would have pushed the shared counter to 6
+    assert sketch.rows[0][sketch._columns(hot)[0]] == 5
+    assert (sketch.estimate(hot), sketch.estimate(cold)) == (5, 1)
+
+
+def test_top_k_keeps_the_most_read(tmp_path):
+    keys = HotKeys(top_k=2, path=str(tmp_path / "hot.json"))
+    for student_id, reads in [(1, 1), (2, 5), (3, 2), (4, 4)]:
+        for _ in range(reads):
+            keys.count(student_id)
+    # Candidates are only pruned once there are more than twice top_k
+    assert len(keys.top) == 4
+    keys.count(5)
+    assert keys.top == {2: 5, 4: 4}
+    assert keys.hottest() == [(2, 5), (4, 4)]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "hot.json"
+    keys = HotKeys(top_k=3, path=str(path))
+    for student_id, reads in [(7, 3), (8, 1), (9, 2)]:
+        for _ in range(reads):
+            keys.count(student_id)
+    keys.save()
+    assert [sid for sid, _ in json.loads(path.read_text())["students"]] == [7, 9, 8]
+    assert HotKeys(top_k=2, path=str(path)).load() == [7, 9]
+    assert HotKeys(path=str(tmp_path / "missing.json")).load() == []
+
+
+def test_preload_fills_the_student_cache(client, tmp_path):
+    students = [
+        client.post("/students/", json={"name": f"Hot {i}", "age": 44, "email": f"hot{i}@example.com"}).json()
+        for i in range(2)
+    ]
+    ids = [student["id"] for student in students]
+    path = tmp_path / "hot.json"
+    path.write_text(json.dumps({"saved_at": 0, "students": [[ids[1], 9], [ids[0], 3], [999999, 1]]}))
+    for student_id in ids:
+        student_cache.invalidate(student_id)
+
+    keys = HotKeys(path=str(path))
+    assert keys.preload(background_session) == 2
+    assert [student_cache.get(student_id).id for student_id in ids] == ids
+    # The saved ranking carries over until live reads replace it
+    assert [sid for sid, _ in keys.hottest()] == [ids[1], ids[0], 999999]
+    for student_id in ids:
+        client.delete(f"/students/{student_id}")
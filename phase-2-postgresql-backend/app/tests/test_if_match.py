@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.fixture
+def student(client):
+    response = client.post("/students/", json={"name": "Matcher", "age": 30, "email": "matcher@example.com"})
+    yield response.json()
+    client.delete(f"/students/{response.json()['id']}")
+
+
+def put(client, student, if_match):
+    return client.put(f"/students/{student['id']}", json={"age": 31}, headers={"If-Match": if_match})
+
+
+def test_any_matching_tag_passes(client, student):
+    response = put(client, student, f'"{student["version"] + 5}", "{student["version"]}"')
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == f'"{student["version"] + 1}"'
+
+
+def test_no_matching_tag_fails(client, student):
+    response = put(client, student, f'"{student["version"] + 5}", "{student["version"] + 6}"')
+    assert response.status_code == 412
+    assert response.headers["ETag"] == f'"{student["version"]}"'
+
+
+def test_weak_tags_never_match(client, student):
+    assert put(client, student, f'W/"{student["version"]}"').status_code == 412
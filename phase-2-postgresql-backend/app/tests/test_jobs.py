@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.session import SessionLocal
+from app.services import jobs
+
+
+def wait_for(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in jobs.FINISHED:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish: {job}")
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def test_export(client):
+    created = [
+        client.post("/students/", json={"name": f"Exported {i}", "age": 70, "email": f"exported{i}@example.com"}).json()
+        for i in range(3)
+    ]
+    response = client.post("/jobs/export", json={"format": "csv", "filters": {"age_min": 70, "age_max": 70}})
+    assert response.status_code == 202, response.text
+    assert response.headers["Location"] == f"/jobs/{response.json()['id']}"
+    job = wait_for(client, response.json()["id"])
+    assert job["status"] == "succeeded" and job["processed"] == job["total"] == 3
+
+    rows = list(csv.DictReader(io.StringIO(client.get(job["result_url"]).text)))
+    assert [row["email"] for row in rows] == [student["email"] for student in created]
+    for student in created:
+        client.delete(f"/students/{student['id']}")
+
+
+def test_import_reports_bad_and_duplicate_lines(client):
+    lines = [
+        {"name": "Imported", "age": 71, "email": "imported@example.com"},
+        {"name": "Imported again", "age": 71, "email": "imported@example.com"},
+        {"name": "No age", "email": "noage@example.com"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n{not json\n"
+    response = client.post("/jobs/import?format=ndjson", content=body)
+    assert response.status_code == 202, response.text
+    job = wait_for(client, response.json()["id"])
+    assert job["status"] == "succeeded"
+
+    report = client.get(job["result_url"]).json()
+    assert (report["processed"], report["imported"], report["failed"]) == (4, 1, 3)
+    assert sorted(error["line"] for error in report["errors"]) == [2, 3, 4]
+    imported = client.get("/students/search", params={"q": "Imported"}).json()["items"]
+    for student in imported:
+        client.delete(f"/students/{student['id']}")
+
+
+def test_cancel(client, db):
+    job = jobs.create_job(db, "export", {"format": "csv"})
+    response = client.post(f"/jobs/{job.id}/cancel")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+
+    finished = client.post("/jobs/export", json={"format": "ndjson"}).json()
+    assert wait_for(client, finished["id"])["status"] == "succeeded"
+    assert client.post(f"/jobs/{finished['id']}/cancel").status_code == 409
+    assert client.post("/jobs/missing/cancel").status_code == 404
+
+
+def test_only_jobs_without_a_recent_heartbeat_are_failed(db):
+    waiting = jobs.create_job(db, "export", {"format": "csv"})
+    lost = jobs.create_job(db, "export", {"format": "csv"})
+    # Created long ago, but another live worker kept its heartbeat fresh while it waited
+    waiting.created_at = datetime.utcnow() - timedelta(hours=1)
+    lost.created_at = lost.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+    db.commit()
+
+    assert jobs.fail_stale(db, stale_after=60) == 1
+    db.refresh(waiting)
+    db.refresh(lost)
+    assert (waiting.status, lost.status) == ("queued", "failed")
+    jobs.cancel_job(db, waiting.id)
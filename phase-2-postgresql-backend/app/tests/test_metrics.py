@@ -0,0 +1,14 @@
+from app.services.metrics import metrics
+
+
+def test_repeated_reads_hit_the_compiled_cache(client):
+    student = client.post("/students/", json={"name": "Metered", "age": 55, "email": "metered@example.com"}).json()
+    hits = metrics.value("sqlalchemy_compiled_cache_total", result="hit")
+    client.get("/students/", params={"age_min": 55, "age_max": 55})
+    client.get("/students/", params={"age_min": 55, "age_max": 55})
+    assert metrics.value("sqlalchemy_compiled_cache_total", result="hit") > hits
+
+    body = client.get("/metrics").text
+    assert "sqlalchemy_compiled_cache_total{" in body
+    assert "sqlalchemy_compiled_cache_hit_ratio" in body
+    client.delete(f"/students/{student['id']}")
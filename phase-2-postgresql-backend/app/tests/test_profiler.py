@@ -0,0 +1,57 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import profiler
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def profiled_work():
+    busy(0.2)
+
+
+def unrelated_work(stop):
+    while not stop.is_set():
+        busy(0.01)
+
+
+def make_client():
+    app = FastAPI()
+    app.router.route_class = profiler.ProfiledRoute
+
+    @app.get("/work")
+    def work():
+        profiled_work()
+        return {}
+
+    app.add_middleware(profiler.ProfilerMiddleware, token="secret")
+    return TestClient(app)
+
+
+def test_request_profile_samples_only_the_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    stop = threading.Event()
+    other = threading.Thread(target=unrelated_work, args=(stop,), daemon=True)
+    other.start()
+    try:
+        assert make_client().get("/work", headers={"X-Profile": "secret"}).status_code == 200
+    finally:
+        stop.set()
+        other.join()
+    [profile] = tmp_path.iterdir()
+    content = profile.read_text()
+    assert "profiled_work" in content
+    assert "unrelated_work" not in content
+
+
+def test_wrong_token_is_not_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    assert make_client().get("/work", headers={"X-Profile": "secreT"}).status_code == 200
+    assert list(tmp_path.iterdir()) == []
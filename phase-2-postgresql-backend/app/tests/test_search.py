@@ -0,0 +1,24 @@
+import pytest
+
+from app.services import search
+
+
+@pytest.fixture(scope="module")
+def quixotes(client):
+    # Many weak matches sharing a few trigrams with the query, and one exact name
+    for i in range(40):
+        client.post("/students/", json={"name": f"Quill Oteson {i}", "age": 20, "email": f"quill{i}@example.com"})
+    client.post("/students/", json={"name": "Quixote", "age": 20, "email": "quixote@example.com"})
+
+
+def test_short_queries_are_rejected(client):
+    assert client.get("/students/search?q=qu").status_code == 422
+
+
+def test_candidate_limit_keeps_the_most_similar_names(client, quixotes, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_CANDIDATE_LIMIT", 5)
+    response = client.get("/students/search?q=quixote")
+    assert response.status_code == 200, response.text
+    items = response.json()["items"]
+    assert items[0]["name"] == "Quixote"
+    assert len(items) <= 5
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.db import sqlite
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # A busy timeout this short fails any writer SQLite itself makes wait, so only the lock can serialize
+    monkeypatch.setattr(sqlite, "SQLITE_BUSY_TIMEOUT_MS", 50)
+    url = make_url(f"sqlite:///{tmp_path}/lock.db")
+    engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 0.05})
+    engine.writer_lock = sqlite.install(engine, url)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    yield engine
+    engine.dispose()
+
+
+def write(engine, name, hold=0.0):
+    with Session(engine) as db:
+        db.execute(text("INSERT INTO items (name) VALUES (:name)"), {"name": name})
+        time.sleep(hold)
+        db.commit()
+
+
+def test_concurrent_writers_queue_instead_of_failing(engine):
+    errors = []
+
+    def writer(name, hold):
+        try:
+            write(engine, name, hold)
+        except Exception as exc:
+            errors.append(exc)
+
+    first = threading.Thread(target=writer, args=("first", 0.3))
+    first.start()
+    time.sleep(0.05)
+    seconds = [threading.Thread(target=writer, args=(f"second {i}", 0)) for i in range(3)]
+    for thread in seconds:
+        thread.start()
+    for thread in [first, *seconds]:
+        thread.join()
+
+    assert errors == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM items")).scalar() == 4
+
+
+def test_a_failed_transaction_releases_the_lock(engine):
+    with pytest.raises(RuntimeError):
+        with Session(engine) as db:
+            db.execute(text("INSERT INTO items (name) VALUES ('lost')"))
+            assert engine.writer_lock.lock.locked()
+            raise RuntimeError("handler failed mid-transaction")
+    assert not engine.writer_lock.lock.locked()
+
+    started = time.monotonic()
+    write(engine, "next")
+    assert time.monotonic() - started < 1
+    with engine.connect() as conn:
+        assert [row.name for row in conn.execute(text("SELECT name FROM items"))] == ["next"]
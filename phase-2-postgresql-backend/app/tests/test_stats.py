@@ -0,0 +1,25 @@
+import logging
+
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.services import stats
+
+
+def test_startup_check_logs_drift_and_rebuild_fixes_it(client, caplog):
+    student = client.post("/students/", json={"name": "Drifter", "age": 97, "email": "drifter@example.com"}).json()
+    db = SessionLocal()
+    try:
+        # An out-of-band write the crud functions never see
+        db.execute(text("UPDATE students SET age = 98 WHERE id = :id"), {"id": student["id"]})
+        db.commit()
+        with caplog.at_level(logging.WARNING, logger=stats.__name__):
+            stats.ensure_built(db, check_drift=True)
+        assert "python -m app.services.stats rebuild" in caplog.text
+        assert set(stats.check(db)) == {"age:97", "age:98"}
+
+        stats.rebuild(db)
+        assert stats.check(db) == {}
+    finally:
+        db.close()
+    client.delete(f"/students/{student['id']}")
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.services import stats
+
+
+@pytest.fixture
+def students(client):
+    created = [
+        client.post("/students/", json={"name": f"Counted {i}", "age": 60 + i, "email": f"counted{i}@example.com"}).json()
+        for i in range(3)
+    ]
+    yield created
+    for student in created:
+        client.delete(f"/students/{student['id']}")
+
+
+def total(client, mode, **params):
+    response = client.get("/students/", params={"total": mode, **params})
+    assert response.status_code == 200, response.text
+    assert response.headers["X-Total-Count-Mode"] == mode
+    return int(response.headers["X-Total-Count"])
+
+
+def test_exact_and_approx_totals_agree(client, students):
+    assert total(client, "approx") == total(client, "exact")
+    assert total(client, "exact", age_min=60, age_max=62) == 3
+    assert total(client, "approx", age_min=60, age_max=62) == 3
+
+
+def test_approx_total_of_zero_for_a_populated_table_falls_back_to_exact(client, students):
+    db = SessionLocal()
+    try:
+        # Summaries emptied behind the API's back, as after an out-of-band restore
+        db.execute(text("DELETE FROM student_age_counts"))
+        db.commit()
+        assert total(client, "approx") == total(client, "exact") > 0
+        stats.rebuild(db)
+    finally:
+        db.close()
@@ -0,0 +1,50 @@
+"""Python-side CPU per student lookup: rebuilt ORM query vs the cached crud statement.
+
+    python -m benchmarks.crud_compile [rows] [iterations]
+
+Runs against an in-memory SQLite database so the numbers are dominated by SQLAlchemy
+construction and compilation rather than by the database.
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud, models
+from app.db.base import Base
+
+
+def orm_query(db, student_id):
+    # What crud.get_student did before: a new Query and filter construct on every call
+    return db.query(models.Student).filter(models.Student.id == student_id).first()
+
+
+def run(label, lookup, db, rows, iterations):
+    start = time.process_time()
+    for i in range(iterations):
+        lookup(db, i % rows + 1)
+        db.expunge_all()
+    elapsed = time.process_time() - start
+    print(f"{label:>12}: {elapsed / iterations * 1e6:8.1f} us CPU per lookup")
+
+
+def main(rows=1000, iterations=20000):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all(models.Student(name=f"Student {i}", age=18 + i % 10, email=f"s{i}@example.com") for i in range(rows))
+    db.commit()
+    # Warm both paths so only steady-state cost is measured
+    run("warmup", orm_query, db, rows, 1000)
+    run("warmup", crud.get_student, db, rows, 1000)
+    run("orm query", orm_query, db, rows, iterations)
+    run("cached stmt", crud.get_student, db, rows, iterations)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,269 @@
+"""Deterministic synthetic students for benchmarks and load tests.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.dataset --rows 10000000 [--truncate]
+
+The same --rows and --seed always produce the same students with the same ids, whatever the
+number of workers or chunk size: every block of 10,000 ids comes from its own seeded RNG.
+Workers load chunks in parallel with COPY on PostgreSQL; on SQLite, which has a single writer,
+they only generate and the main process inserts with executemany.
+
+Secondary indexes and triggers on `students` are dropped or disabled for the load and restored
+afterwards, then the statistics summaries are rebuilt.
+"""
+import argparse
+import io
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.db import sqlite
+from app.db.base import Base
+from app.db.session import DATABASE_URL, SessionLocal, engine
+from app.services import search, stats
+
+COLUMNS = ("id", "name", "age", "email", "version", "inactive_since")
+
+# Roughly Zipf-distributed, as real name frequencies are
+FIRST_NAMES = (
+    "James Mary Michael Patricia John Jennifer Robert Linda David Elizabeth William Barbara "
+    "Richard Susan Joseph Jessica Thomas Sarah Christopher Karen Daniel Lisa Matthew Nancy "
+    "Anthony Sandra Mark Ashley Donald Emily Steven Kimberly Andrew Donna Paul Michelle Joshua "
+    "Carol Kenneth Amanda Kevin Melissa Brian Deborah Timothy Stephanie Ronald Rebecca Jason "
+    "Sharon George Laura Edward Cynthia Jeffrey Amy Ryan Kathleen Jacob Angela Nicholas Shirley "
+    "Gary Brenda Eric Emma Jonathan Anna Larry Pamela Justin Nicole Scott Samantha Brandon Katherine "
+    "Benjamin Christine Samuel Helen Gregory Debra Alexander Rachel Patrick Carolyn Frank Janet "
+    "Raymond Maria Jack Catherine Dennis Heather Jerry Diane Tyler Olivia Aaron Julie Jose Joyce "
+    "Adam Victoria Nathan Ruth Henry Virginia Zachary Lauren Douglas Kelly Peter Christina Kyle "
+    "Joan Noah Evelyn Ethan Judith Jeremy Andrea Christian Hannah Walter Megan Keith Cheryl Austin "
+    "Jacqueline Roger Martha Terry Madison Sean Teresa Gerald Gloria Carl Sara Dylan Janice Harold "
+    "Ann Jordan Kathryn Jesse Abigail Bryan Sophia Lawrence Frances Arthur Jean Gabriel Alice Bruce "
+    "Judy Logan Isabella Billy Julia Joe Grace Alan Amber Juan Denise Elijah Danielle Willie Marilyn "
+    "Albert Beverly Wayne Charlotte Randy Natalie Mason Theresa Vincent Diana Liam Brittany Roy "
+    "Doris Bobby Kayla Caleb Alexis Bradley Lori Russell Marie Lucas Aiko Chen Mohammed Priya "
+    "Wei Fatima Hiroshi Amara Mateo Sofia Luca Yuki Omar Leila Santiago Ingrid Ravi Ngozi"
+).split()
+LAST_NAMES = (
+    "Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez Lopez "
+    "Gonzalez Wilson Anderson Thomas Taylor Moore Jackson Martin Lee Perez Thompson White Harris "
+    "Sanchez Clark Ramirez Lewis Robinson Walker Young Allen King Wright Scott Torres Nguyen Hill "
+    "Flores Green Adams Nelson Baker Hall Rivera Campbell Mitchell Carter Roberts Gomez Phillips "
+    "Evans Turner Diaz Parker Cruz Edwards Collins Reyes Stewart Morris Morales Murphy Cook Rogers "
+    "Gutierrez Ortiz Morgan Cooper Peterson Bailey Reed Kelly Howard Ramos Kim Cox Ward Richardson "
+    "Watson Brooks Chavez Wood James Bennett Gray Mendoza Ruiz Hughes Price Alvarez Castillo "
+    "Sanders Patel Myers Long Ross Foster Jimenez Powell Jenkins Perry Russell Sullivan Bell "
+    "Coleman Butler Henderson Barnes Gonzales Fisher Vasquez Simmons Romero Jordan Patterson "
+    "Alexander Hamilton Graham Reynolds Griffin Wallace Moreno West Cole Hayes Bryant Herrera "
+    "Gibson Ellis Tran Medina Aguilar Stevens Murray Ford Castro Marshall Owens Harrison Fernandez "
+    "McDonald Woods Washington Kennedy Wells Vargas Henry Chen Freeman Webb Tucker Guzman Burns "
+    "Crawford Olson Simpson Porter Hunter Gordon Mendez Silva Shaw Snyder Mason Dixon Munoz Hunt "
+    "Hicks Holmes Palmer Wagner Black Robertson Boyd Rose Stone Salazar Fox Warren Mills Meyer "
+    "Rice Schmidt Garza Daniels Ferguson Nichols Stephens Soto Weaver Ryan Gardner Payne Grant "
+    "Tanaka Okafor Kowalski Yamamoto Novak Haddad Singh Ivanova Larsen Rossi Dubois Muller"
+).split()
+DOMAINS = ("example.com", "mail.example.com", "students.example.edu", "example.org", "example.net")
+
+
+def _zipf_cum_weights(n, exponent=0.9):
+    total, cumulative = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1 / rank ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+FIRST_WEIGHTS = _zipf_cum_weights(len(FIRST_NAMES))
+LAST_WEIGHTS = _zipf_cum_weights(len(LAST_NAMES))
+DOMAIN_WEIGHTS = list(itertools.accumulate((60, 15, 15, 6, 4)))
+# Ids per independently seeded RNG; chunk sizes are rounded to a multiple of it
+BLOCK = 10_000
+# Fixed so inactive_since values do not depend on when the dataset was generated
+EPOCH = datetime(2025, 1, 1)
+
+
+def _block(start_id, count, seed, inactive_rate):
+    rng = random.Random(seed * 1_000_003 + start_id)
+    firsts = rng.choices(FIRST_NAMES, cum_weights=FIRST_WEIGHTS, k=count)
+    lasts = rng.choices(LAST_NAMES, cum_weights=LAST_WEIGHTS, k=count)
+    domains = rng.choices(DOMAINS, cum_weights=DOMAIN_WEIGHTS, k=count)
+    rows = []
+    for offset in range(count):
+        student_id = start_id + offset
+        first, last = firsts[offset], lasts[offset]
+        # Most students are 18-25 with a long tail of mature students
+        age = 18 + min(int(rng.gammavariate(1.6, 3.0)), 62)
+        inactive_since = None
+        if rng.random() < inactive_rate:
+            inactive_since = EPOCH - timedelta(seconds=rng.randrange(180 * 86400))
+        # The id suffix keeps emails unique without a lookup
+        email = f"{first}.{last}.{student_id}@{domains[offset]}".lower()
+        rows.append((student_id, f"{first} {last}", age, email, 1, inactive_since))
+    return rows
+
+
+def generate(start_id, count, seed, inactive_rate=0.02):
+    """Rows for ids start_id .. start_id + count - 1; start_id must be 1 + a multiple of BLOCK."""
+    rows = []
+    for block_start in range(start_id, start_id + count, BLOCK):
+        rows += _block(block_start, min(BLOCK, start_id + count - block_start), seed, inactive_rate)
+    return rows
+
+
+def chunks(rows, chunk_size, seed, inactive_rate):
+    chunk_size = max(BLOCK, chunk_size // BLOCK * BLOCK)
+    for start in range(1, rows + 1, chunk_size):
+        yield start, min(chunk_size, rows + 1 - start), seed, inactive_rate
+
+
+def _generate_chunk(chunk):
+    return generate(*chunk)
+
+
+def _copy_chunk(chunk):
+    rows = generate(*chunk)
+    buffer = io.StringIO()
+    for row in rows:
+        # CSV COPY reads an unquoted empty field as NULL
+        buffer.write(",".join("" if value is None else str(value) for value in row) + "\n")
+    buffer.seek(0)
+    copy_engine = create_engine(DATABASE_URL, poolclass=NullPool)
+    connection = copy_engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        statement = f"COPY students ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(statement, buffer)
+        else:
+            with cursor.copy(statement) as copy:
+                copy.write(buffer.getvalue())
+        connection.commit()
+    finally:
+        connection.close()
+        copy_engine.dispose()
+    return len(rows)
+
+
+def secondary_indexes(conn):
+    if conn.dialect.name == "postgresql":
+        return conn.execute(text(
+            "SELECT i.indexname, i.indexdef FROM pg_indexes i "
+            "LEFT JOIN pg_constraint c ON c.conname = i.indexname "
+            "WHERE i.tablename = 'students' AND c.conname IS NULL"
+        )).all()
+    return conn.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'students' AND sql IS NOT NULL"
+    )).all()
+
+
+def sqlite_triggers(conn):
+    return conn.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'students'"
+    )).all()
+
+
+def truncate(conn):
+    tables = ("enrollments", "students_archive", "student_age_counts", "student_name_prefix_counts", "students")
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY"))
+    else:
+        for table in tables:
+            conn.execute(text(f"DELETE FROM {table}"))
+
+
+def load(rows, seed=42, workers=None, chunk_size=50_000, inactive_rate=0.02, keep_indexes=False):
+    workers = workers or os.cpu_count() or 1
+    postgres = engine.dialect.name == "postgresql"
+    with engine.begin() as conn:
+        indexes = [] if keep_indexes else secondary_indexes(conn)
+        triggers = [] if postgres else sqlite_triggers(conn)
+        for name, _ in indexes:
+            conn.execute(text(f"DROP INDEX {name}"))
+        for name, _ in triggers:
+            conn.execute(text(f"DROP TRIGGER {name}"))
+        if postgres:
+            # The change feed would otherwise send one NOTIFY per row
+            conn.execute(text("ALTER TABLE students DISABLE TRIGGER USER"))
+
+    started = time.perf_counter()
+    loaded = 0
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            work = chunks(rows, chunk_size, seed, inactive_rate)
+            if postgres:
+                for count in pool.imap_unordered(_copy_chunk, work):
+                    loaded += count
+                    print(f"\r{loaded:,} / {rows:,} rows", end="", flush=True)
+            else:
+                connection = engine.raw_connection()
+                try:
+                    cursor = connection.cursor()
+                    cursor.execute("PRAGMA synchronous = OFF")
+                    placeholders = ", ".join("?" * len(COLUMNS))
+                    statement = f"INSERT INTO students ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+                    for batch in pool.imap_unordered(_generate_chunk, work):
+                        cursor.executemany(statement, batch)
+                        connection.commit()
+                        loaded += len(batch)
+                        print(f"\r{loaded:,} / {rows:,} rows", end="", flush=True)
+                    cursor.execute(f"PRAGMA synchronous = {sqlite.SQLITE_SYNCHRONOUS}")
+                finally:
+                    connection.close()
+        elapsed = time.perf_counter() - started
+        print(f"\nloaded {loaded:,} rows in {elapsed:.1f}s ({loaded / elapsed:,.0f} rows/s)")
+    finally:
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            for _, definition in indexes:
+                conn.execute(text(definition))
+            for _, definition in triggers:
+                conn.execute(text(definition))
+            if postgres:
+                conn.execute(text("ALTER TABLE students ENABLE TRIGGER USER"))
+                conn.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('students', 'id'), coalesce(max(id), 1)) FROM students"
+                ))
+            elif search.fts_available:
+                conn.execute(text("INSERT INTO students_fts(students_fts) VALUES ('rebuild')"))
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("ANALYZE students"))
+        print(f"rebuilt {len(indexes)} indexes and {len(triggers)} triggers in {time.perf_counter() - started:.1f}s")
+
+    db = SessionLocal()
+    try:
+        stats.rebuild(db)
+    finally:
+        db.close()
+    return loaded
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.dataset", description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--inactive-rate", type=float, default=0.02, help="fraction of inactive students")
+    parser.add_argument("--truncate", action="store_true", help="empty the student tables first")
+    parser.add_argument("--keep-indexes", action="store_true", help="load with secondary indexes in place")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    search.install(engine)
+    with engine.begin() as conn:
+        if args.truncate:
+            truncate(conn)
+        elif conn.execute(text("SELECT 1 FROM students LIMIT 1")).first() is not None:
+            print("students is not empty; pass --truncate to replace its contents")
+            return 1
+    load(args.rows, args.seed, args.workers, args.chunk_size, args.inactive_rate, args.keep_indexes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
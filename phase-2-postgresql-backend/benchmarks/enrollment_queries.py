@@ -0,0 +1,49 @@
+"""Number of SQL statements per embedded-enrollment request, by page size.
+
+    python -m benchmarks.enrollment_queries
+
+The count must stay the same however many students a page holds; a growing count
+means an N+1 has crept into one of the endpoints.
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/enrollments.db"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.db import session
+from app.main import app
+
+statements = []
+event.listen(session.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+
+def count(client, url):
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+def main():
+    with TestClient(app) as client:
+        courses = [client.post("/courses/", json={"code": f"C{i}", "title": f"Course {i}"}).json() for i in range(5)]
+        for i in range(200):
+            student = client.post("/students/", json={"name": f"Student {i}", "age": 18 + i % 10, "email": f"s{i}@example.com"}).json()
+            for course in courses[: i % 5 + 1]:
+                client.post(f"/students/{student['id']}/enrollments", json={"course_id": course["id"]})
+        print(f"{'endpoint':<45}{'rows':>6}{'queries':>9}")
+        for template in ("/students/with-enrollments?limit={}", f"/courses/{courses[0]['id']}/students?limit={{}}"):
+            counts = set()
+            for limit in (1, 10, 100, 200):
+                url = template.format(limit)
+                counts.add(count(client, url))
+                print(f"{url:<45}{limit:>6}{max(counts):>9}")
+            if len(counts) != 1:
+                raise SystemExit(f"query count grows with page size: {sorted(counts)}")
+
+
+if __name__ == "__main__":
+    main()
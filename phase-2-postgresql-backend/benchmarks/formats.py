@@ -0,0 +1,95 @@
+"""Payload size and encode/decode cost of student lists as JSON, MessagePack and CBOR.
+
+    python -m benchmarks.formats [--sizes 100,1000,10000] [--seconds S]
+
+Encoding measures what the API does per response: validate `schemas.Student` models and
+write bytes. JSON takes FastAPI's path (`dump_json` straight to bytes); the binary formats
+dump to Python values and pack them. Decoding measures the client: bytes back to a list of
+dicts, with `json.loads` and, if installed, orjson for comparison. The gzip column is the
+size on the wire when the response is compressed.
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+
+from pydantic import TypeAdapter
+
+from app import schemas
+from app.services import formats
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def students(count, seed=1):
+    rng = random.Random(seed)
+    first = ["Ada", "Grace", "Alan", "Edsger", "Barbara", "Donald", "Frances", "Ken", "Radia", "Linus"]
+    last = ["Lovelace", "Hopper", "Turing", "Dijkstra", "Liskov", "Knuth", "Allen", "Thompson", "Perlman"]
+    return [
+        schemas.Student(
+            id=i,
+            name=f"{rng.choice(first)} {rng.choice(last)}",
+            age=rng.randint(17, 70),
+            email=f"student{i}@example.edu",
+            version=rng.randint(1, 5),
+            active=rng.random() > 0.1,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def measure(operation, seconds):
+    calls, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        operation()
+        calls += 1
+    return (time.perf_counter() - started) / calls
+
+
+def codecs(adapter):
+    """Name -> (encode models to bytes, decode bytes to Python)."""
+    found = {"json": (adapter.dump_json, json.loads)}
+    if orjson is not None:
+        found["json (orjson decode)"] = (adapter.dump_json, orjson.loads)
+    for media_type, (_, response_class, decode) in formats.CODECS.items():
+        def encode(models, render=response_class.render):
+            return render(None, adapter.dump_python(models, mode="json"))
+        found[media_type.split("/")[1]] = (encode, decode)
+    return found
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.formats")
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--seconds", type=float, default=1)
+    args = parser.parse_args(argv)
+
+    adapter = TypeAdapter(list[schemas.Student])
+    available = codecs(adapter)
+    if len(available) == 1 + (orjson is not None):
+        print("Neither msgpack nor cbor2 is installed; only JSON can be measured", file=sys.stderr)
+
+    print(f"{'students':>8}  {'format':<22}{'bytes':>12}{'gzip':>12}{'encode ms':>12}{'decode ms':>12}")
+    for size in [int(part) for part in args.sizes.split(",")]:
+        models = students(size)
+        expected = adapter.dump_python(models, mode="json")
+        for name, (encode, decode) in available.items():
+            payload = encode(models)
+            if decode(payload) != expected:
+                raise SystemExit(f"{name} did not round-trip")
+            encode_s = measure(lambda: encode(models), args.seconds)
+            decode_s = measure(lambda: decode(payload), args.seconds)
+            print(
+                f"{size:>8}  {name:<22}{len(payload):>12,}{len(gzip.compress(payload)):>12,}"
+                f"{encode_s * 1000:>12.3f}{decode_s * 1000:>12.3f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
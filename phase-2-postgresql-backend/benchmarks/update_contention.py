@@ -0,0 +1,79 @@
+"""Conflict rate of optimistic updates under contention.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.update_contention [threads] [hot_rows] [seconds]
+
+Each thread repeatedly reads a random student from a small hot set and writes it back with
+the version it read, the same as a client doing GET then PUT with If-Match. Conflicts are
+retried after a fresh read. Defaults to a temporary SQLite file when DATABASE_URL is unset.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/contention.db"
+
+from app import crud, schemas
+from app.db.base import Base
+from app.db.session import SessionLocal, engine
+
+
+def worker(hot_ids, stop, results):
+    attempts = conflicts = 0
+    db = SessionLocal()
+    try:
+        while not stop.is_set():
+            student_id = random.choice(hot_ids)
+            db.expire_all()
+            student = crud.get_student(db, student_id)
+            attempts += 1
+            try:
+                crud.update_student(
+                    db, student_id, schemas.StudentUpdate(age=random.randint(18, 30)),
+                    expected_version=student.version,
+                )
+            except crud.VersionConflict:
+                conflicts += 1
+    finally:
+        db.close()
+    results.append((attempts, conflicts))
+
+
+def main(threads=8, hot_rows=4, seconds=5):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    hot_ids = []
+    for i in range(hot_rows):
+        student = crud.create_student(db, schemas.StudentCreate(
+            name=f"Hot {i}", age=20, email=f"hot-{time.time_ns()}-{i}@example.com",
+        ))
+        hot_ids.append(student.id)
+    db.close()
+
+    stop, results = threading.Event(), []
+    pool = [threading.Thread(target=worker, args=(hot_ids, stop, results)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in pool:
+        thread.join()
+
+    attempts = sum(a for a, _ in results)
+    conflicts = sum(c for _, c in results)
+    print(f"threads={threads} hot_rows={hot_rows} dialect={engine.dialect.name}")
+    print(f"attempts: {attempts} ({attempts / seconds:.0f}/s)")
+    print(f"committed: {attempts - conflicts} ({(attempts - conflicts) / seconds:.0f}/s)")
+    print(f"conflicts: {conflicts} ({conflicts / attempts:.1%} of attempts)" if attempts else "conflicts: 0")
+
+    db = SessionLocal()
+    for student_id in hot_ids:
+        crud.delete_student(db, student_id)
+    db.close()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:4]])